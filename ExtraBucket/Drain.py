@@ -13,6 +13,9 @@ import hashlib
 import sys
 from datetime import datetime
 
+from LogBlock.LineSplitter import LineSplitter
+from LogBlock.LogReader import iter_lines
+
 
 class Logcluster:
     def __init__(self, logTemplate='', logIDL=None):
@@ -302,52 +305,33 @@ class LogParser:
         return pd.DataFrame(data=df_events, columns=["EventId", "EventTemplate"])
 
     def load_data(self):
-        headers, regex = self.generate_logformat_regex(self.log_format)
-        self.df_log = self.log_to_dataframe(self.logfile, regex, headers, self.log_format)
+        splitter = LineSplitter(self.log_format)
+        self.df_log = self.log_to_dataframe(self.logfile, splitter, splitter.headers, self.log_format)
 
     def preprocess(self, line):
         for currentRex in self.rex:
             line = re.sub(currentRex, '<*>', line)
         return line
 
-    def log_to_dataframe(self, log_file, regex, headers, logformat, encode='utf-8'):
+    def log_to_dataframe(self, log_file, splitter, headers, logformat):
         """ Function to transform log file to dataframe 
         """
-        try:
-            log_messages = []
-            linecount = 0
-            with open(log_file, 'r', encoding=encode) as fin:
-                for line in fin.readlines():
-                    try:
-                        match = regex.search(line.strip())
-                        message = [match.group(header) for header in headers]
-                        log_messages.append(message)
-                        linecount += 1
-                    except Exception as e:
-                        pass
-            logdf = pd.DataFrame(log_messages, columns=headers)
-            logdf.insert(0, 'LineId', None)
-            logdf['LineId'] = [i + 1 for i in range(linecount)]
-            return logdf
-        except UnicodeError:
-            return self.log_to_dataframe(log_file, regex, headers, logformat, encode="ISO-8859-1")
-
-    def generate_logformat_regex(self, logformat):
-        """ Function to generate regular expression to split log messages
-        """
-        headers = []
-        splitters = re.split(r'(<[^<>]+>)', logformat)
-        regex = ''
-        for k in range(len(splitters)):
-            if k % 2 == 0:
-                splitter = re.sub(' +', '\\\s+', splitters[k])
-                regex += splitter
-            else:
-                header = splitters[k].strip('<').strip('>')
-                regex += '(?P<%s>.*?)' % header
-                headers.append(header)
-        regex = re.compile('^' + regex + '$')
-        return headers, regex
+        log_messages = []
+        linecount = 0
+        for line in iter_lines(log_file):
+            try:
+                message = splitter.split(line.strip())
+                if message is None:
+                    # Lines not matching the log format are left out
+                    continue
+                log_messages.append(message)
+                linecount += 1
+            except Exception as e:
+                pass
+        logdf = pd.DataFrame(log_messages, columns=headers)
+        logdf.insert(0, 'LineId', None)
+        logdf['LineId'] = [i + 1 for i in range(linecount)]
+        return logdf
 
     def get_parameter_list(self, row):
         template_regex = re.sub(r"<.{1,5}>", "<*>", row["EventTemplate"])
@@ -33,12 +33,16 @@ import os
 import io
 import time
 
+from LogBlock.LineSplitter import LineSplitter
+from LogBlock.LogReader import iter_lines
+
 class LogLoader(object):
     def __init__(self, logformat, tmp_dir, n_workers=1):
         if not logformat:
             raise RuntimeError('Logformat is required!')
         self.logformat = logformat.strip()
-        self.headers, self.regex = self._generate_logformat_regex(self.logformat)
+        self.splitter = LineSplitter(self.logformat)
+        self.headers = self.splitter.headers
         self.n_workers = n_workers
         self.tmp_dir = tmp_dir
 
@@ -47,15 +51,17 @@ class LogLoader(object):
         """
         print('Loading log messages to dataframe...')
         t1 = time.time()
-        lines = []
-        with open(log_filepath, 'r', encoding="utf-8", errors="ignore") as fid:
-            lines = fid.readlines()
-        print("Total lines {}".format(len(lines)))
         log_messages = []
         failed_messages = {}
         if self.n_workers == 1: 
-            log_messages, failed_messages = formalize_message(enumerate(lines), self.regex, self.headers)
+            # Parse lines as they are read, without holding them all
+            log_messages, failed_messages, total_lines = formalize_message(enumerate(iter_lines(log_filepath)),
+                                                                           self.splitter, self.headers)
+            print("Total lines {}".format(total_lines))
         else:
+            lines = list(iter_lines(log_filepath))
+            total_lines = len(lines)
+            print("Total lines {}".format(total_lines))
             chunk_size = min(1000000, len(lines) // float(self.n_workers))
             chunks = groupby(enumerate(lines), key=lambda k, line=count(): next(line)//chunk_size)
             log_chunks = [list(chunk) for _, chunk in chunks]
@@ -64,7 +70,7 @@ class LogLoader(object):
             result_chunks = []
             for cidx, chunk in enumerate(log_chunks, 1):
                 result_chunks.append(pool.apply_async(formalize_message,
-                                     args=(chunk, self.regex, self.headers)))
+                                     args=(chunk, self.splitter, self.headers)))
             pool.close()
             pool.join()
             for result in result_chunks:
@@ -75,50 +81,34 @@ class LogLoader(object):
             json.dump(failed_messages, fw)
 
         log_dataframe = pd.DataFrame(log_messages, columns=['LineId'] + self.headers)
-        success_rate = len(log_messages) / float(len(lines))
+        success_rate = len(log_messages) / float(total_lines)
         print('Loading {} messages done, loading rate: {:.1%}, failed lines: {}'.format(len(log_messages), success_rate, len(failed_messages)))
         t2 = time.time()
         print('Time taken {:.2f}s'.format(t2-t1))
         return log_dataframe
 
-    def _generate_logformat_regex(self, logformat):
-        """ Function to generate regular expression to split log messages
-        """
-        headers = []
-        splitters = re.split(r'(<[^<>]+>)', logformat)
-        regex = ''
-        for k in range(len(splitters)):
-            if k % 2 == 0:
-                splitter = re.sub(' +', '\\\s+', splitters[k])
-                regex += splitter
-            else:
-                header = splitters[k].strip('<').strip('>')
-                if k == len(splitters) - 2:
-                    regex += '(?P<%s>.*?)' % header
-                else:
-                    regex += '(?P<%s>.*?)' % header
-                headers.append(header)
-        # print(regex)
-        regex = re.compile('^' + regex + '$')
-        return headers, regex
-
 
-def formalize_message(enumerated_lines, regex, headers):
+def formalize_message(enumerated_lines, splitter, headers):
     print("Worker {} processing.".format(os.getpid()))
     log_messages = []
     failed_messages = {}
+    line_count = -1
     for line_count, line in enumerated_lines:
         line = line.strip()
         if not line:
             continue
-        line = re.sub(r'[^\x00-\x7F]+', '<NASCII>', line)
+        if not line.isascii():
+            line = re.sub(r'[^\x00-\x7F]+', '<NASCII>', line)
         try:
-            match = regex.search(line)
-            message = [match.group(header) for header in headers]
+            message = splitter.split(line)
+            if message is None:
+                failed_messages[line_count] = line
+                continue
             message.insert(0, line_count + 1)
             log_messages.append(message)
         except Exception as e:
             failed_messages[line_count] = line
             pass
     print("Worker {} finish.".format(os.getpid()))
-    return log_messages, failed_messages
\ No newline at end of file
+    # Number of lines up to the last one given, all lines of the file for a single worker
+    return log_messages, failed_messages, line_count + 1
\ No newline at end of file
@@ -0,0 +1,60 @@
+"""
+Aggregations over encoded LogBlock columns
+Counts by value are taken from the payload of a column without rendering its rows: a step1 column is one value and
+a count, a step3 column a dictionary and codes counted at once, a step5 column runs summed per value, and a step4
+column counts its rests before adding the prefix back. Other columns are decoded and counted.
+count and distinct follow from the counts by value.
+"""
+from collections import Counter
+
+import numpy as np
+
+from LogBlock.BlockContainer import KIND_RAW, KIND_UNIQUE, KIND_DICT, KIND_PREFIX, KIND_RLE, KIND_AFFIX, \
+    FLAG_START_WITH_FAIL
+
+# Kinds counted without decoding
+COUNTED_KINDS = {KIND_RAW, KIND_UNIQUE, KIND_DICT, KIND_PREFIX, KIND_RLE, KIND_AFFIX}
+
+
+def payload_counts(kind, flags, payload):
+    """
+    :param kind: see BlockContainer
+    :param flags:
+    :param payload: typed payload of a column
+    :return: Counter of the values of the column, or None if the column has to be decoded
+    """
+    if kind not in COUNTED_KINDS:
+        return None
+    counts = Counter()
+    if kind == KIND_RAW:
+        counts.update(payload)
+    elif kind == KIND_UNIQUE:
+        counts[payload[0]] = payload[1]
+    elif kind == KIND_DICT:
+        values, codes = payload
+        for code, count in enumerate(np.bincount(np.asarray(codes, dtype=np.int64), minlength=len(values))):
+            if count:
+                counts[values[code]] += int(count)
+    elif kind == KIND_RLE:
+        for value, run in zip(*payload):
+            counts[value] += run
+    elif kind == KIND_PREFIX:
+        prefix = payload[0]
+        counts.update({prefix + rest: count for rest, count in Counter(payload[1]).items()})
+    else:
+        prefix, suffix = payload[0], payload[1]
+        counts.update({prefix + rest + suffix: count for rest, count in Counter(payload[2]).items()})
+    if flags & FLAG_START_WITH_FAIL:
+        counts[''] += 1
+    return counts
+
+
+def merge_counts(counts_list):
+    """
+    :param counts_list: Counters of many blocks
+    :return: Counter over all blocks
+    """
+    total = Counter()
+    for counts in counts_list:
+        total.update(counts)
+    return total
@@ -0,0 +1,90 @@
+"""
+Least recently used cache of decoded LogBlock blocks, bounded by the memory they take
+Queries mostly read the same recent blocks again, so a block decoded once is kept, keyed by (segment, block index),
+until newer blocks need its memory. Decoded blocks are shared, callers must not change them.
+"""
+import sys
+from collections import OrderedDict
+
+
+def decoded_size(lines):
+    """
+    :param lines: decoded block, list of str
+    :return: bytes taken by the list and its strings
+    """
+    return sys.getsizeof(lines) + sum(map(sys.getsizeof, lines))
+
+
+class BlockCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024, sizeof=decoded_size):
+        """
+        :param max_bytes: memory budget of the cached blocks
+        :param sizeof: function giving the bytes taken by a cached value
+        """
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        # key -> (value, size), least recently used first
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, load=None):
+        """
+        Counted as a hit or a miss, the caller loading and putting the value itself on a miss when load is None
+        :param key: e.g. (segment path, block index)
+        :param load: function decoding the block, called and its value put on a miss
+        :return: cached or loaded value, None on a miss without load
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[0]
+        self.misses += 1
+        if load is None:
+            return None
+        value = load()
+        self.put(key, value)
+        return value
+
+    def peek(self, key):
+        """
+        :param key:
+        :return: cached value, or None; neither counted as a hit or a miss nor made more recent
+        """
+        entry = self.entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+        if size > self.max_bytes:
+            # Would evict every other block and still not fit
+            return
+        self.entries[key] = (value, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.size -= evicted
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'Blocks': len(self.entries),
+            'Bytes': self.size,
+            'Hits': self.hits,
+            'Misses': self.misses,
+            'Evictions': self.evictions,
+            'HitRate': self.hits / lookups if lookups else 0.0,
+        }
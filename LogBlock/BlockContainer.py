@@ -0,0 +1,408 @@
+"""
+Binary columnar container for LogBlock output
+
+Layout (little-endian):
+    header   magic 'LGBK' | version u8 | column count u16 | table length u32 | table crc32 u32
+    table    per column: frame name | column name | kind u8 | flags u8 | offset u64 | length u64 | crc32 u32
+    payloads one typed payload per column, at offset (from the start of the container)
+
+Names are length-prefixed utf-8; every payload has its own crc32, so one column can be read and checked
+with a single seek, without touching the others.
+"""
+import json
+import struct
+import zlib
+
+import numpy as np
+
+from LogBlock.IntegerCodec import pack_deltas, unpack_deltas, delta_decode, pack_bits, unpack_bits
+from LogBlock.DictCodec import code_width
+from LogBlock.TimeCodec import render
+from LogBlock.PrefixCodec import front_decode
+
+MAGIC = b'LGBK'
+VERSION = 3
+HEADER = struct.Struct('<4sBHII')
+COLUMN_ENTRY = struct.Struct('<BBQQI')
+
+# Payload kinds, one per LogBlock heuristic
+KIND_RAW = 0      # list of str
+KIND_UNIQUE = 1   # (value, count)
+KIND_DELTA = 2    # (printf template, delta order, list of int deltas), zigzag varint or bit-packed
+KIND_DICT = 3     # (list of values, in code order; list of int codes), bit-packed at the width of the largest code
+KIND_PREFIX = 4   # (prefix, list of str)
+KIND_TIME = 5     # (timestamp spec as json, list of empty row indices, list of int deltas), rendered into a group of columns
+KIND_TIME_REF = 6 # (index of the KIND_TIME column in the frame, position of this column in its group)
+KIND_RLE = 7      # (list of values, list of int run lengths)
+KIND_AFFIX = 8    # (prefix, suffix, list of str)
+KIND_FRONT = 9    # (suffix, list of int lengths shared with the previous value, list of str rests)
+
+# Flags
+FLAG_START_WITH_FAIL = 1
+
+
+class ContainerError(Exception):
+    pass
+
+
+def write_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def read_varint(buf, pos):
+    n = 0
+    shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+def write_str(out, s):
+    b = s.encode('utf-8')
+    write_varint(out, len(b))
+    out += b
+
+
+def read_str(buf, pos):
+    n, pos = read_varint(buf, pos)
+    return buf[pos:pos + n].decode('utf-8'), pos + n
+
+
+def write_str_list(out, values):
+    write_varint(out, len(values))
+    for s in values:
+        write_str(out, s)
+
+
+def read_str_list(buf, pos):
+    n, pos = read_varint(buf, pos)
+    values = []
+    for _ in range(n):
+        s, pos = read_str(buf, pos)
+        values.append(s)
+    return values, pos
+
+
+def write_int_list(out, values):
+    write_varint(out, len(values))
+    for n in values:
+        write_varint(out, n)
+
+
+def read_int_list(buf, pos):
+    n, pos = read_varint(buf, pos)
+    values = []
+    for _ in range(n):
+        v, pos = read_varint(buf, pos)
+        values.append(v)
+    return values, pos
+
+
+def write_deltas(out, deltas):
+    packing, width, data = pack_deltas(deltas)
+    write_varint(out, packing)
+    write_varint(out, width)
+    write_varint(out, len(deltas))
+    out += data
+
+
+def read_deltas(buf, pos):
+    # Packed deltas always end the payload
+    packing, pos = read_varint(buf, pos)
+    width, pos = read_varint(buf, pos)
+    count, pos = read_varint(buf, pos)
+    return unpack_deltas(packing, width, count, buf[pos:])
+
+
+def write_codes(out, codes, cardinality):
+    width = code_width(cardinality)
+    write_varint(out, len(codes))
+    out += pack_bits(np.asarray(codes, dtype=np.uint64), width)
+
+
+def read_codes(buf, pos, cardinality):
+    # Packed codes always end the payload
+    count, pos = read_varint(buf, pos)
+    return unpack_bits(buf[pos:], count, code_width(cardinality)).astype(np.int64)
+
+
+def pack_payload(kind, payload):
+    out = bytearray()
+    if kind == KIND_RAW:
+        write_str_list(out, payload)
+    elif kind == KIND_UNIQUE:
+        write_str(out, payload[0])
+        write_varint(out, payload[1])
+    elif kind == KIND_DELTA:
+        write_str(out, payload[0])
+        write_varint(out, payload[1])
+        write_deltas(out, payload[2])
+    elif kind == KIND_DICT:
+        write_str_list(out, payload[0])
+        write_codes(out, payload[1], len(payload[0]))
+    elif kind == KIND_PREFIX:
+        write_str(out, payload[0])
+        write_str_list(out, payload[1])
+    elif kind == KIND_TIME:
+        write_str(out, payload[0])
+        write_int_list(out, payload[1])
+        write_deltas(out, payload[2])
+    elif kind == KIND_TIME_REF:
+        write_varint(out, payload[0])
+        write_varint(out, payload[1])
+    elif kind == KIND_RLE:
+        write_str_list(out, payload[0])
+        write_int_list(out, payload[1])
+    elif kind == KIND_AFFIX:
+        write_str(out, payload[0])
+        write_str(out, payload[1])
+        write_str_list(out, payload[2])
+    elif kind == KIND_FRONT:
+        write_str(out, payload[0])
+        write_int_list(out, payload[1])
+        write_str_list(out, payload[2])
+    else:
+        raise ContainerError('Unknown column kind %s' % kind)
+    return bytes(out)
+
+
+def unpack_payload(kind, buf):
+    if kind == KIND_RAW:
+        return read_str_list(buf, 0)[0]
+    elif kind == KIND_UNIQUE:
+        value, pos = read_str(buf, 0)
+        return value, read_varint(buf, pos)[0]
+    elif kind == KIND_DELTA:
+        template, pos = read_str(buf, 0)
+        order, pos = read_varint(buf, pos)
+        return template, order, read_deltas(buf, pos)
+    elif kind == KIND_DICT:
+        values, pos = read_str_list(buf, 0)
+        return values, read_codes(buf, pos, len(values))
+    elif kind == KIND_PREFIX:
+        prefix, pos = read_str(buf, 0)
+        return prefix, read_str_list(buf, pos)[0]
+    elif kind == KIND_TIME:
+        spec, pos = read_str(buf, 0)
+        nulls, pos = read_int_list(buf, pos)
+        return spec, nulls, read_deltas(buf, pos)
+    elif kind == KIND_TIME_REF:
+        stream, pos = read_varint(buf, 0)
+        return stream, read_varint(buf, pos)[0]
+    elif kind == KIND_RLE:
+        values, pos = read_str_list(buf, 0)
+        return values, read_int_list(buf, pos)[0]
+    elif kind == KIND_AFFIX:
+        prefix, pos = read_str(buf, 0)
+        suffix, pos = read_str(buf, pos)
+        return prefix, suffix, read_str_list(buf, pos)[0]
+    elif kind == KIND_FRONT:
+        suffix, pos = read_str(buf, 0)
+        shared, pos = read_int_list(buf, pos)
+        return suffix, shared, read_str_list(buf, pos)[0]
+    raise ContainerError('Unknown column kind %s' % kind)
+
+
+def expand_payload(kind, flags, payload):
+    """
+    Turn a typed payload back to the column values
+    :param kind:
+    :param flags:
+    :param payload:
+    :return: list of str
+    """
+    if kind == KIND_RAW:
+        values = list(payload)
+    elif kind == KIND_UNIQUE:
+        values = [payload[0]] * payload[1]
+    elif kind == KIND_DELTA:
+        template = payload[0]
+        values = [template % x for x in delta_decode(payload[2], payload[1])]
+    elif kind == KIND_DICT:
+        values = list(map(payload[0].__getitem__, payload[1]))
+    elif kind == KIND_PREFIX:
+        values = [payload[0] + x for x in payload[1]]
+    elif kind == KIND_TIME:
+        values = expand_time(payload)[0]
+    elif kind == KIND_RLE:
+        values = []
+        for value, run in zip(*payload):
+            values += [value] * run
+    elif kind == KIND_AFFIX:
+        values = [payload[0] + x + payload[1] for x in payload[2]]
+    elif kind == KIND_FRONT:
+        values = [x + payload[0] for x in front_decode(zip(payload[1], payload[2]))]
+    else:
+        raise ContainerError('Unknown column kind %s' % kind)
+
+    if flags & FLAG_START_WITH_FAIL:
+        values.insert(0, '')
+    return values
+
+
+def expand_time(payload):
+    """
+    Render all columns of a timestamp group from a KIND_TIME payload
+    :param payload:
+    :return: list of columns, in the order of the group
+    """
+    spec = json.loads(payload[0])
+    return render(spec, payload[1], delta_decode(payload[2], spec['order']))
+
+
+class BlockContainerWriter:
+    def __init__(self):
+        self.columns = []
+
+    def add_column(self, frame, name, kind, flags, payload):
+        self.columns.append((frame, name, kind, flags, pack_payload(kind, payload)))
+
+    def to_bytes(self):
+        table = bytearray()
+        offset = 0
+        entries = []
+        for frame, name, kind, flags, data in self.columns:
+            entries.append((frame, name, kind, flags, offset, len(data), zlib.crc32(data)))
+            offset += len(data)
+
+        # Offsets are known once the table size is known
+        table_len = sum(len(self._entry(e, 0)) for e in entries)
+        base = HEADER.size + table_len
+        for e in entries:
+            table += self._entry(e, base)
+
+        header = HEADER.pack(MAGIC, VERSION, len(entries), len(table), zlib.crc32(table))
+        return header + bytes(table) + b''.join(x[4] for x in self.columns)
+
+    def _entry(self, entry, base):
+        frame, name, kind, flags, offset, length, crc = entry
+        out = bytearray()
+        write_str(out, frame)
+        write_str(out, name)
+        out += COLUMN_ENTRY.pack(kind, flags, base + offset, length, crc)
+        return out
+
+    def write(self, file_name):
+        with open(file_name, 'wb') as w:
+            w.write(self.to_bytes())
+
+
+class BlockContainerReader:
+    def __init__(self, file_name, offset=0):
+        """
+        :param file_name: path of the container, or a binary file object holding it, e.g. io.BytesIO
+        :param offset: where the container starts in the file, e.g. inside a segment
+        """
+        if isinstance(file_name, str):
+            self.file_name = file_name
+            self.fin = open(file_name, 'rb')
+        else:
+            self.file_name = getattr(file_name, 'name', '<memory>')
+            self.fin = file_name
+        self.offset = offset
+        self.columns = {}
+        self.order = []
+        self.read_table()
+
+    def read_table(self):
+        self.fin.seek(self.offset)
+        magic, version, n_columns, table_len, table_crc = HEADER.unpack(self.fin.read(HEADER.size))
+        if magic != MAGIC:
+            raise ContainerError('%s is not a LogBlock container' % self.file_name)
+        if version != VERSION:
+            raise ContainerError('Unsupported container version %d' % version)
+        table = self.fin.read(table_len)
+        if zlib.crc32(table) != table_crc:
+            raise ContainerError('Corrupted column table in %s' % self.file_name)
+
+        pos = 0
+        for _ in range(n_columns):
+            frame, pos = read_str(table, pos)
+            name, pos = read_str(table, pos)
+            entry = COLUMN_ENTRY.unpack_from(table, pos)
+            pos += COLUMN_ENTRY.size
+            self.columns[(frame, name)] = entry
+            self.order.append((frame, name))
+
+    def frames(self):
+        return list(dict.fromkeys(frame for frame, _ in self.order))
+
+    def column_names(self, frame):
+        return [name for f, name in self.order if f == frame]
+
+    def read_payload(self, frame, name):
+        """
+        Seek to one column and unpack its typed payload
+        :param frame:
+        :param name:
+        :return: (kind, flags, payload)
+        """
+        kind, flags, offset, length, crc = self.columns[(frame, name)]
+        self.fin.seek(self.offset + offset)
+        data = self.fin.read(length)
+        if zlib.crc32(data) != crc:
+            raise ContainerError('Corrupted column %s/%s in %s' % (frame, name, self.file_name))
+        return kind, flags, unpack_payload(kind, data)
+
+    def read_column(self, frame, name):
+        kind, flags, payload = self.read_payload(frame, name)
+        if kind == KIND_TIME_REF:
+            # Rendered from the timestamp stream of another column
+            stream, position = payload
+            return expand_time(self.read_payload(frame, self.column_names(frame)[stream])[2])[position]
+        return expand_payload(kind, flags, payload)
+
+    def read_columns(self, frame, names):
+        """
+        Read some columns of a frame, seeking to each of them, and to the timestamp stream they are rendered from
+        :param frame:
+        :param names: column names
+        :return: list of columns, in the order of names
+        """
+        columns = []
+        groups = {}
+        for name in names:
+            kind, flags, payload = self.read_payload(frame, name)
+            if kind == KIND_TIME_REF:
+                stream, position = payload
+                if stream not in groups:
+                    groups[stream] = expand_time(self.read_payload(frame, self.column_names(frame)[stream])[2])
+                columns.append(groups[stream][position])
+            else:
+                columns.append(expand_payload(kind, flags, payload))
+        return columns
+
+    def read_frame(self, frame):
+        """
+        Read all columns of a frame, rendering each timestamp group once
+        :param frame:
+        :return: list of columns
+        """
+        columns = []
+        groups = {}
+        for i, name in enumerate(self.column_names(frame)):
+            kind, flags, payload = self.read_payload(frame, name)
+            if kind == KIND_TIME:
+                groups[i] = expand_time(payload)
+                columns.append(groups[i][0])
+            elif kind == KIND_TIME_REF:
+                columns.append(groups[payload[0]][payload[1]])
+            else:
+                columns.append(expand_payload(kind, flags, payload))
+        return columns
+
+    def close(self):
+        self.fin.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,179 @@
+"""
+Seal a live log into LogBlock blocks
+Lines are read from a growing file or a stream and gathered in memory. A block is sealed when the next line would
+take it over the byte budget (16K for ELK, 128K for Splunk, 8K for Rsyslog), or when its first line has waited
+longer than the deadline. A line is never split, and a line longer than the budget is sealed alone.
+Each block is encoded from memory as soon as it is sealed, into outdir/bucket_<name>, the layout of encode_many,
+or appended to a segment file (see Segment).
+"""
+import os
+import select
+import stat
+import time
+from datetime import datetime
+
+from LogBlock.LogBlock import LogBlock, OutputFormat
+from LogBlock.LogReader import decode_lines
+from LogBlock.Segment import SegmentWriter
+
+# Bytes read at once from the input
+READ_SIZE = 1 << 16
+
+
+def read_chunks(fd, poll=0.5, isFollow=False):
+    """
+    Bytes of a file or stream as they arrive
+    :param fd: file descriptor
+    :param poll: seconds to wait for bytes before yielding None, so that deadlines are checked on an idle input
+    :param isFollow: at the end of a regular file, wait for bytes appended to it instead of stopping, as tail -f
+    :return: generator of bytes, or None when nothing arrived within poll seconds
+    """
+    isRegular = stat.S_ISREG(os.fstat(fd).st_mode)
+    while True:
+        if not isRegular:
+            ready, _, _ = select.select([fd], [], [], poll)
+            if not ready:
+                yield None
+                continue
+        data = os.read(fd, READ_SIZE)
+        if data:
+            yield data
+        elif isRegular and isFollow:
+            time.sleep(poll)
+            yield None
+        else:
+            return
+
+
+def split_lines(chunks):
+    """
+    Lines of chunks of bytes, the bytes after the last line break waiting for the next chunk
+    :param chunks: from read_chunks
+    :return: generator of bytes lines without '\\n', or None for a None chunk
+    """
+    pending = []
+    for data in chunks:
+        if data is None:
+            yield None
+            continue
+        if b'\n' not in data:
+            pending.append(data)
+            continue
+        lines = data.split(b'\n')
+        if pending:
+            pending.append(lines[0])
+            lines[0] = b''.join(pending)
+        pending = [lines.pop()]
+        yield from lines
+    rest = b''.join(pending)
+    if rest:
+        yield rest
+
+
+class BlockSealer:
+    def __init__(self, log_format, outdir, block_size=16 * 1024, deadline=None, name='block', segment=None,
+                 compressor=None, **kwargs):
+        """
+        :param log_format:
+        :param outdir: folder of the block folders
+        :param block_size: largest size of a block in bytes, line breaks included
+        :param deadline: seconds after which a block that is not full is sealed anyway, None to only seal full blocks
+        :param name: blocks are named name_0, name_1...
+        :param segment: path of a segment file to append the blocks to, as binary containers, instead of outdir
+        :param compressor: compressor of the blocks in the segment, see Segment.COMPRESSORS
+        :param kwargs: other LogBlock settings, e.g. output_format, isLearnSchema
+        """
+        if segment is not None:
+            kwargs['output_format'] = OutputFormat.BINARY
+        self.lblock = LogBlock(log_format=log_format, logName=None, outdir=outdir, isCleanOutdir=False, **kwargs)
+        self.lblock.compile_log_format()
+        if segment is not None:
+            self.lblock.segment = SegmentWriter(segment, compressor, isAppend=True)
+        self.outdir = outdir
+        self.block_size = block_size
+        self.deadline = deadline
+        self.name = name
+        # Lines of the open block, as bytes, and their size with line breaks
+        self.lines = []
+        self.size = 0
+        # Time the first line of the open block arrived
+        self.opened = None
+        # (output folder or segment#block, lines, bytes, encoding time in seconds) of every sealed block
+        self.sealed = []
+
+    def add(self, line):
+        """
+        :param line: bytes of a line, without its line break
+        :return:
+        """
+        size = len(line) + 1
+        if self.lines and self.size + size > self.block_size:
+            self.seal()
+        if not self.lines:
+            self.opened = time.time()
+        self.lines.append(line)
+        self.size += size
+        if self.size >= self.block_size:
+            self.seal()
+
+    def check_deadline(self, now=None):
+        """
+        Seal the open block if its first line has waited for deadline seconds
+        :param now: current time, time.time() by default
+        :return:
+        """
+        if not self.lines or self.deadline is None:
+            return
+        if (time.time() if now is None else now) - self.opened >= self.deadline:
+            self.seal()
+
+    def seal(self):
+        """
+        Encode the open block and start a new one
+        :return: output folder of the block, or segment#block, or None if the open block is empty
+        """
+        if not self.lines:
+            return None
+        block_name = '%s_%d' % (self.name, len(self.sealed))
+        start_time = datetime.now()
+        segment = self.lblock.segment
+        if segment is None:
+            out_dir = os.path.join(self.outdir, 'bucket_' + block_name)
+            self.lblock.set_block(block_name, out_dir)
+        else:
+            out_dir = '%s#%d' % (segment.file_name, len(segment.blocks))
+            self.lblock.logName = block_name
+        # The last line break keeps a trailing empty line
+        self.lblock.run_lines(decode_lines(b'\n'.join(self.lines) + b'\n'))
+        # Zone maps of the next block start after this one
+        self.lblock.first_line += self.lblock.line_count
+        self.sealed.append((out_dir, len(self.lines), self.size, (datetime.now() - start_time).total_seconds()))
+        print('[SEALED] %s: %d lines, %d bytes, %.3fs' % self.sealed[-1])
+        self.lines = []
+        self.size = 0
+        self.opened = None
+        return out_dir
+
+    def feed(self, lines):
+        """
+        Add lines until the input ends, then close
+        :param lines: iterable of bytes lines, None when the input is idle, e.g. split_lines(read_chunks(fd))
+        :return: sealed
+        """
+        for line in lines:
+            if line is not None:
+                self.add(line)
+            self.check_deadline()
+        self.close()
+        return self.sealed
+
+    def close(self):
+        """
+        Seal the last block, and write the footer of the segment
+        :return:
+        """
+        self.seal()
+        if self.lblock.segment is not None:
+            self.lblock.segment.close()
+            self.lblock.segment = None
+        self.lblock.close()
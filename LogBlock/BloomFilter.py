@@ -0,0 +1,115 @@
+"""
+Bloom filter over the tokens of the lines of a block, to skip the blocks a keyword search cannot match
+Tokens are the alphanumeric runs of split_item in ExtraBucket/ZipLog.py, so that 'blk_-1608999687919862906' is found
+from 'blk' and '1608999687919862906'. A term may be in a block only if all its tokens are in the filter.
+Tokens come from Content and from the other fields of the lines, so that a term in Component or Pid is found too.
+The filter is sized for the distinct tokens of the block and a false-positive rate, e.g. 1%, and each token is set at
+k positions derived from one blake2b hash (double hashing).
+"""
+import hashlib
+import math
+import re
+import struct
+
+import numpy as np
+
+TOKEN = re.compile(r'[a-zA-Z0-9]+')
+HEADER = struct.Struct('<QB')
+
+
+def content_tokens(values):
+    """
+    :param values: lines, or values of a column
+    :return: set of the distinct tokens
+    """
+    tokens = set()
+    for value in values:
+        tokens.update(TOKEN.findall(value))
+    return tokens
+
+
+def term_tokens(term):
+    """
+    :param term: searched string, e.g. 'blk_-1608999687919862906' or '10.251.42.84'
+    :return: list of its tokens
+    """
+    return TOKEN.findall(term)
+
+
+def hash_pairs(tokens):
+    """
+    :param tokens:
+    :return: two uint64 arrays, the second one odd so that every step reaches distinct positions
+    """
+    digests = b''.join(hashlib.blake2b(x.encode('utf-8'), digest_size=16).digest() for x in tokens)
+    pairs = np.frombuffer(digests, dtype='<u8').reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1] | np.uint64(1)
+
+
+class BloomFilter:
+    def __init__(self, n_bits, n_hashes, bits=None):
+        """
+        :param n_bits: size of the filter
+        :param n_hashes: positions set per token
+        :param bits: packed bits, little-endian bit order, or None for an empty filter
+        """
+        self.n_bits = n_bits
+        self.n_hashes = n_hashes
+        self.bits = np.zeros((n_bits + 7) // 8, dtype=np.uint8) if bits is None else bits
+
+    @classmethod
+    def build(cls, tokens, fpr=0.01):
+        """
+        :param tokens: distinct tokens of a block
+        :param fpr: false-positive rate aimed at
+        :return: BloomFilter holding the tokens
+        """
+        n = max(len(tokens), 1)
+        n_bits = max(int(math.ceil(-n * math.log(fpr) / math.log(2) ** 2)), 8)
+        n_hashes = max(int(round(n_bits / n * math.log(2))), 1)
+        bloom = cls(n_bits, n_hashes)
+        bloom.add(tokens)
+        return bloom
+
+    def positions(self, tokens):
+        h1, h2 = hash_pairs(tokens)
+        steps = np.arange(self.n_hashes, dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            return (h1[:, None] + steps * h2[:, None]) % np.uint64(self.n_bits)
+
+    def add(self, tokens):
+        tokens = list(tokens)
+        if not tokens:
+            return
+        bits = np.unpackbits(self.bits, count=self.n_bits, bitorder='little')
+        bits[self.positions(tokens).ravel()] = 1
+        self.bits = np.packbits(bits, bitorder='little')
+
+    def might_contain(self, tokens):
+        """
+        :param tokens: e.g. term_tokens(term)
+        :return: False if some token is certainly not in the filter
+        """
+        tokens = list(tokens)
+        if not tokens:
+            return True
+        positions = self.positions(tokens).ravel()
+        return bool(np.all((self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1))
+
+    def to_bytes(self):
+        return HEADER.pack(self.n_bits, self.n_hashes) + self.bits.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        n_bits, n_hashes = HEADER.unpack_from(data)
+        return cls(n_bits, n_hashes, np.frombuffer(data, dtype=np.uint8, offset=HEADER.size).copy())
+
+
+def write_bloom(file_name, bloom):
+    with open(file_name, 'wb') as w:
+        w.write(bloom.to_bytes())
+
+
+def read_bloom(file_name):
+    with open(file_name, 'rb') as r:
+        return BloomFilter.from_bytes(r.read())
@@ -0,0 +1,77 @@
+"""
+Profile of a column, shared by the LogBlock heuristics so that each of them does not rescan the column
+distinct (and cardinality), integers, common_prefix and common_suffix work on the distinct values, found by one scan
+of all rows; integers parses the distinct values and maps them back over all rows when some repeat.
+counts (a Counter), runs and run_lengths (a groupby) scan all rows themselves; count_runs stops at a limit.
+Every property is computed on first use, then cached.
+"""
+import os
+from collections import Counter
+from functools import cached_property
+from itertools import groupby, islice
+
+from LogBlock.IntegerCodec import parse_integers
+
+
+class ColumnProfile:
+    def __init__(self, l_list):
+        self.values = l_list
+        self.n = len(l_list)
+
+    @cached_property
+    def distinct(self):
+        # Distinct values, in order of first appearance
+        return list(dict.fromkeys(self.values))
+
+    @cached_property
+    def cardinality(self):
+        return len(self.distinct)
+
+    @cached_property
+    def counts(self):
+        return Counter(self.values)
+
+    @cached_property
+    def runs(self):
+        # Number of runs of repeated values
+        return len(self.run_lengths)
+
+    @cached_property
+    def run_lengths(self):
+        # (value, length) of each run of repeated values
+        return [(value, len(list(group))) for value, group in groupby(self.values)]
+
+    def count_runs(self, limit):
+        """
+        Count runs without building them, for columns rejected when they have too many
+        :param limit:
+        :return: number of runs, or limit + 1 if there are more than limit
+        """
+        if 'run_lengths' in self.__dict__:
+            return min(self.runs, limit + 1)
+        return sum(1 for _ in islice(groupby(self.values), limit + 1))
+
+    @cached_property
+    def integers(self):
+        """
+        Integer values of the column, if they can be restored exactly from the integers with a printf template:
+        canonical ('7'), zero-padded ('07'), signed ('+7') or hex ('0x1f', '0x001F')
+        :return: (list of int, template), or None
+        """
+        parsed = parse_integers(self.distinct)
+        if parsed is None:
+            return None
+
+        ints, template = parsed
+        if len(ints) == self.n:
+            return ints, template
+        lookup = dict(zip(self.distinct, ints))
+        return list(map(lookup.__getitem__, self.values)), template
+
+    @cached_property
+    def common_prefix(self):
+        return os.path.commonprefix(self.distinct)
+
+    @cached_property
+    def common_suffix(self):
+        return os.path.commonprefix([x[::-1] for x in self.distinct])[::-1]
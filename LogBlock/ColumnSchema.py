@@ -0,0 +1,61 @@
+"""
+Column schema learnt over the blocks of one dataset
+Blocks of a dataset share their log_format and, mostly, the step that wins on each column: Pid takes step2,
+Level step3, Component step4... Once a column took the same step in the last `window` blocks, later blocks try
+only step1 and that step (only step1 for a column left raw), instead of every step in turn. Every `reprobe` blocks all steps are tried again.
+"""
+from collections import deque
+
+# Schemas in this process, by log_format
+SCHEMAS = {}
+
+
+def get_schema(key):
+    """
+    :param key: usually the log_format of the dataset
+    :return: ColumnSchema shared by the blocks of this process with the same key
+    """
+    if key not in SCHEMAS:
+        SCHEMAS[key] = ColumnSchema()
+    return SCHEMAS[key]
+
+
+class ColumnSchema:
+    def __init__(self, window=4, reprobe=32):
+        """
+        :param window: number of recent blocks that must agree on the step of a column
+        :param reprobe: try all steps on every column once every reprobe blocks
+        """
+        self.window = window
+        self.reprobe = reprobe
+        self.history = {}
+        self.blocks = 0
+
+    def start_block(self):
+        self.blocks += 1
+
+    def is_probe_block(self):
+        return self.blocks % self.reprobe == 0
+
+    def steps(self, name):
+        """
+        Steps to try on a column of the current block
+        :param name: column name, with its frame, e.g. ('trans_file', 'Level')
+        :return: list of step numbers, empty for a column left raw, or None to try all steps
+        """
+        if self.is_probe_block():
+            return None
+        wins = self.history.get(name)
+        if wins is None or len(wins) < self.window or len(set(wins)) != 1:
+            return None
+        return [] if wins[0] is None else [wins[0]]
+
+    def record(self, name, step):
+        """
+        :param name:
+        :param step: step used on the column, None if it was left raw
+        :return:
+        """
+        if name not in self.history:
+            self.history[name] = deque(maxlen=self.window)
+        self.history[name].append(step)
@@ -0,0 +1,76 @@
+"""
+Dictionary codec for LogBlock step3
+Codes are given by decreasing frequency, so that the most common values get the shortest codes, and the dictionary
+is written as '<dict>' followed by 'length:value' per code, which needs no escaping and is much faster than json.
+For the binary container, codes are bit-packed at the smallest width holding the largest code.
+"""
+import json
+import re
+
+import numpy as np
+
+DICT_MARKER = '<dict>'
+ENTRY_LENGTH = re.compile(r'\d+')
+
+
+def frequency_order(counts):
+    """
+    :param counts: Counter of the values of a column
+    :return: distinct values by decreasing count, ties in order of first appearance
+    """
+    return [value for value, _ in counts.most_common()]
+
+
+def dict_marker(values):
+    """
+    :param values: distinct values, in code order
+    :return: '<dict>4:INFO4:WARN5:ERROR'
+    """
+    return DICT_MARKER + ''.join(['%d:%s' % (len(v), v) for v in values])
+
+
+def parse_dict_marker(head):
+    """
+    Read a step3 marker, either from dict_marker or the json dictionary {value: code} written by older versions,
+    followed by an optional E
+    :param head:
+    :return: (values in code order, isStartWithFail), or None if head is not a step3 marker
+    """
+    if head.startswith(DICT_MARKER):
+        values = []
+        pos = len(DICT_MARKER)
+        while pos < len(head) and head[pos] != 'E':
+            m = ENTRY_LENGTH.match(head, pos)
+            if m is None or head[m.end():m.end() + 1] != ':':
+                return None
+            pos = m.end() + 1 + int(m.group())
+            if pos > len(head):
+                return None
+            values.append(head[m.end() + 1:pos])
+        if head[pos:] not in ('', 'E'):
+            return None
+        return values, head[pos:] == 'E'
+
+    if head[:1] == '{' and (head.endswith('}') or head.endswith('}E')):
+        try:
+            dict_lv = json.loads(head.rstrip('E'))
+        except ValueError:
+            return None
+        if isinstance(dict_lv, dict):
+            return sorted(dict_lv, key=dict_lv.get), head.endswith('E')
+    return None
+
+
+def code_width(cardinality):
+    # Bits of the largest code
+    return max(cardinality - 1, 0).bit_length()
+
+
+def to_codes(values, l_list):
+    """
+    :param values: distinct values, in code order
+    :param l_list:
+    :return: numpy int64 array of the code of each row
+    """
+    index = dict(zip(values, range(len(values))))
+    return np.fromiter(map(index.__getitem__, l_list), dtype=np.int64, count=len(l_list))
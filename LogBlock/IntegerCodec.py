@@ -0,0 +1,278 @@
+"""
+Integer codec for LogBlock step2
+Values are parsed with a printf template that renders them back exactly ('%d', '%03d', '%+d', '0x%x', '0x%08X'...),
+then encoded as differences of order 0 (plain), 1 (delta) or 2 (delta-of-delta), whichever is the smallest.
+For the binary container, differences are zigzag-encoded and stored as varints or bit-packed.
+"""
+import re
+from itertools import accumulate
+
+import numpy as np
+
+# Values up to this magnitude keep differences of order 2 within int64
+SAFE_MAGNITUDE = 1 << 60
+MAX_ORDER = 2
+
+POW10 = np.array([10 ** k for k in range(1, 19)], dtype=np.int64)
+VARINT_LIMITS = np.array([1 << (7 * k) for k in range(1, 10)], dtype=np.uint64)
+
+# Packing of zigzag values in the binary container
+PACK_VARINT = 0
+PACK_BITS = 1
+
+
+def parse_integers(keys):
+    """
+    Find a printf template that renders every key back from its integer
+    :param keys: distinct values of a column
+    :return: (list of int, template), or None if the keys are not all integers of one template
+    """
+    if not keys:
+        return [], '%d'
+
+    first = keys[0]
+    if first[:2] in ('0x', '0X'):
+        base = 16
+        width = str(len(first) - 2)
+        candidates = [first[:2] + t for t in ('%x', '%X', '%0' + width + 'x', '%0' + width + 'X')]
+    else:
+        base = 10
+        width = str(len(first))
+        candidates = ['%d', '%0' + width + 'd', '%+d', '%+0' + width + 'd']
+
+    try:
+        ints = list(map(int, keys)) if base == 10 else [int(x, base) for x in keys]
+    except ValueError:
+        return None
+
+    if base == 10 and list(map(str, ints)) == keys:
+        return ints, '%d'
+    for template in candidates:
+        if [template % x for x in ints] == keys:
+            return ints, template
+    return None
+
+
+def delta_marker(order, template):
+    """
+    Text marker of a step2 column: <delta>, <delta2>, <delta0:0x%x>...
+    Order 1 and the '%d' template are implied
+    """
+    return '<delta%s%s>' % (order if order != 1 else '', ':' + template if template != '%d' else '')
+
+
+def parse_delta_marker(head):
+    """
+    Invert delta_marker, a head like <delta:2> (zero-padding width only) is read as template '%02d'
+    :param head: marker, without the trailing E
+    :return: (order, template), or None if head is not a step2 marker
+    """
+    m = re.fullmatch(r'<delta(\d)?(?::([^>]*))?>', head)
+    if m is None:
+        return None
+    order = int(m.group(1)) if m.group(1) else 1
+    template = m.group(2) or '%d'
+    if template.isdigit():
+        template = '%0' + template + 'd'
+    return order, template
+
+
+def to_array(ints):
+    """
+    :param ints: list of int
+    :return: numpy int64 array, or None if values are out of the int64-safe range
+    """
+    try:
+        arr = np.array(ints, dtype=np.int64)
+    except OverflowError:
+        return None
+    if len(arr) and not (-SAFE_MAGNITUDE < arr.min() and arr.max() < SAFE_MAGNITUDE):
+        return None
+    return arr
+
+
+def delta_encode(ints, order):
+    """
+    Differences of the given order, the first value of each order is kept as is
+    :param ints: list of int, or numpy array from to_array
+    :param order:
+    :return: numpy int64 array, or a list of int for values out of the int64-safe range
+    """
+    deltas = ints if isinstance(ints, np.ndarray) else to_array(ints)
+    if deltas is None:
+        deltas = list(ints)
+        for _ in range(order):
+            deltas = [deltas[x] - deltas[x-1] if x != 0 else deltas[0] for x in range(len(deltas))]
+        return deltas
+
+    for _ in range(order):
+        deltas = np.diff(deltas, prepend=0)
+    return deltas
+
+
+def delta_decode(deltas, order):
+    """
+    Invert delta_encode, with numpy if the running sums cannot overflow int64
+    :param deltas: list of int or numpy array
+    :param order:
+    :return: list of int
+    """
+    if not isinstance(deltas, np.ndarray):
+        arr = to_array(deltas)
+        deltas = arr if arr is not None else deltas
+    if isinstance(deltas, np.ndarray):
+        # Bound of the running sums of every order
+        bound = np.abs(deltas).astype(np.float64).sum() * max(len(deltas), 1) ** max(order - 1, 0)
+        if bound < 1 << 62:
+            for _ in range(order):
+                deltas = np.cumsum(deltas)
+            return deltas.tolist()
+        deltas = deltas.tolist()
+
+    for _ in range(order):
+        deltas = list(accumulate(deltas))
+    return deltas
+
+
+def text_size(deltas):
+    # Number of characters of the deltas written in decimal
+    if not isinstance(deltas, np.ndarray):
+        return sum(len(str(x)) for x in deltas)
+    return int((np.searchsorted(POW10, np.abs(deltas), side='right') + 1).sum() + (deltas < 0).sum())
+
+
+def zigzag(deltas):
+    return ((deltas << 1) ^ (deltas >> 63)).astype(np.uint64)
+
+
+def unzigzag(z):
+    return (z >> np.uint64(1)).astype(np.int64) ^ -(z & np.uint64(1)).astype(np.int64)
+
+
+def varint_lengths(z):
+    return np.searchsorted(VARINT_LIMITS, z, side='right') + 1
+
+
+def bit_width(z):
+    return int(z.max()).bit_length() if len(z) else 0
+
+
+def binary_size(deltas):
+    # Number of bytes of the smaller packing of the zigzag deltas
+    if not isinstance(deltas, np.ndarray):
+        return sum(len(str(x)) for x in deltas)
+    z = zigzag(deltas)
+    return min(int(varint_lengths(z).sum()), (len(z) * bit_width(z) + 7) // 8)
+
+
+def choose_order(ints, size=text_size):
+    """
+    Pick the order of differences that gives the smallest output
+    :param ints:
+    :param size: text_size or binary_size
+    :return: (order, deltas)
+    """
+    arr = to_array(ints)
+    best = None
+    for order in range(MAX_ORDER + 1):
+        deltas = delta_encode(arr if arr is not None else ints, order)
+        cost = size(deltas)
+        if best is None or cost < best[0]:
+            best = (cost, order, deltas)
+    return best[1], best[2]
+
+
+def pack_varints(z):
+    n = varint_lengths(z)
+    if len(z) == 0:
+        return b''
+    max_len = int(n.max())
+    k = np.arange(max_len)
+    groups = ((z[:, None] >> (k.astype(np.uint64) * np.uint64(7))) & np.uint64(0x7f)).astype(np.uint8)
+    # Continuation bit on all but the last byte of each value
+    groups |= ((k[None, :] < (n[:, None] - 1)) * 0x80).astype(np.uint8)
+    return groups[k[None, :] < n[:, None]].tobytes()
+
+
+def unpack_varints(buf):
+    b = np.frombuffer(buf, dtype=np.uint8)
+    if len(b) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    ends = np.flatnonzero(b < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    if (ends - starts).max() >= 9:
+        # Larger than 63 bits, written from python ints
+        return unpack_varints_slow(buf, len(ends))
+    pos = np.arange(len(b)) - np.repeat(starts, ends - starts + 1)
+    values = (b & 0x7f).astype(np.uint64) << (pos.astype(np.uint64) * np.uint64(7))
+    return np.add.reduceat(values, starts)
+
+
+def pack_varints_slow(deltas):
+    out = bytearray()
+    for n in deltas:
+        n = n * 2 if n >= 0 else -n * 2 - 1
+        while n >= 0x80:
+            out.append((n & 0x7f) | 0x80)
+            n >>= 7
+        out.append(n)
+    return bytes(out)
+
+
+def unpack_varints_slow(buf, count):
+    values = []
+    pos = 0
+    for _ in range(count):
+        n = shift = 0
+        while True:
+            b = buf[pos]
+            pos += 1
+            n |= (b & 0x7f) << shift
+            if b < 0x80:
+                break
+            shift += 7
+        values.append(n)
+    return values
+
+
+def pack_bits(z, width):
+    if width == 0:
+        return b''
+    shifts = np.arange(width - 1, -1, -1).astype(np.uint64)
+    bits = ((z[:, None] >> shifts) & np.uint64(1)).astype(np.uint8)
+    return np.packbits(bits.ravel()).tobytes()
+
+
+def unpack_bits(buf, count, width):
+    if width == 0:
+        return np.zeros(count, dtype=np.uint64)
+    bits = np.unpackbits(np.frombuffer(buf, dtype=np.uint8))[:count * width].reshape(count, width)
+    shifts = np.arange(width - 1, -1, -1).astype(np.uint64)
+    return (bits.astype(np.uint64) << shifts).sum(axis=1, dtype=np.uint64)
+
+
+def pack_deltas(deltas):
+    """
+    Zigzag deltas and pack them with the smaller of varint and bit-packing
+    :param deltas: list of int
+    :return: (packing, bit width, bytes)
+    """
+    arr = to_array(deltas)
+    if arr is None:
+        return PACK_VARINT, 0, pack_varints_slow(deltas)
+    z = zigzag(arr)
+    width = bit_width(z)
+    if (len(z) * width + 7) // 8 < int(varint_lengths(z).sum()):
+        return PACK_BITS, width, pack_bits(z, width)
+    return PACK_VARINT, 0, pack_varints(z)
+
+
+def unpack_deltas(packing, width, count, buf):
+    if packing == PACK_BITS:
+        z = unpack_bits(buf, count, width)
+    else:
+        z = unpack_varints(buf)
+    if isinstance(z, list) or (len(z) and int(z.max()) >= 2 * SAFE_MAGNITUDE):
+        # Decoded as python ints, so that the cumulative sums do not overflow
+        return [x >> 1 if not x & 1 else -(x >> 1) - 1 for x in map(int, z)]
+    return unzigzag(z)
@@ -0,0 +1,341 @@
+r"""
+Split log lines into the fields of a log_format
+The regex of generate_logformat_regex turns every field into a lazy (?P<x>.*?) and every run of spaces into \s+,
+which backtracks over each field. Formats made only of fields, plain literals and spaces are split with str.find
+and slicing instead, <Field:N> taking N characters: each field takes the shortest text before the next delimiter,
+which is the first thing the regex tries, so both give the same values. A line the fast path cannot split, and
+every line of a format with groups like (\[<PID>\])? or regex syntax in its literals, goes through the regex.
+"""
+import re
+
+# Characters with a meaning in the regex source of a format, unless escaped
+REGEX_SYNTAX = set('.^$*+?{}[]|()')
+WHITESPACE = re.compile(r'\s+')
+
+# Delimiter tokens, besides plain text
+SPACES = 'spaces'
+ANY = 'any'
+
+
+def generate_logformat_regex(log_format):
+    """ Function to generate regular expression to split log messages
+    """
+    headers = []
+    splitters = re.split(r'(<[^<>]+>)', log_format)
+    regex = ''
+    for k in range(len(splitters)):
+        if k % 2 == 0:
+            splitter = re.sub(' +', '\\\\s+', splitters[k])
+            regex += splitter
+        else:
+            header = splitters[k].strip('<').strip('>')
+
+            h_list = header.split(':')
+            if len(h_list) > 1:
+                header = h_list[0]
+                digit = h_list[1]
+
+                regex += '(?P<%s>.{%s})' % (header, digit)
+            else:
+                regex += '(?P<%s>.*?)' % header
+            headers.append(header)
+    regex = re.compile('^' + regex + '$')
+    return headers, regex
+
+
+def literal_tokens(splitter):
+    """
+    Tokens of the text between two fields: SPACES for a run of spaces (\s+ in the regex), ANY for '.',
+    (str,) for plain text
+    :param splitter: regex source of the text
+    :return: list of tokens, or None if the text is not plain
+    """
+    tokens = []
+    text = ''
+    i = 0
+    while i < len(splitter):
+        c = splitter[i]
+        if c == ' ' or c == '.':
+            if text:
+                tokens.append((text,))
+                text = ''
+            if c == '.':
+                tokens.append(ANY)
+            elif tokens[-1:] != [SPACES]:
+                tokens.append(SPACES)
+        elif c == '\\':
+            # '\[' is a plain '[', '\s' or '\d' a class
+            if i + 1 == len(splitter) or splitter[i + 1].isalnum() or splitter[i + 1].isspace():
+                return None
+            text += splitter[i + 1]
+            i += 1
+        elif c in REGEX_SYNTAX or c.isspace():
+            return None
+        else:
+            text += c
+        i += 1
+    if text:
+        tokens.append((text,))
+    return tokens
+
+
+def compile_program(log_format):
+    """
+    Compile a format to [delimiter, field width, delimiter, ..., delimiter], the width of a <Field> being None
+    :param log_format:
+    :return: program, or None if the format needs the regex
+    """
+    splitters = re.split(r'(<[^<>]+>)', log_format)
+    program = []
+    for k in range(len(splitters)):
+        if k % 2 == 0:
+            tokens = literal_tokens(splitters[k])
+            if tokens is None:
+                return None
+            program.append(tokens)
+        else:
+            h_list = splitters[k].strip('<').strip('>').split(':')
+            if len(h_list) > 1 and not h_list[1].isdigit():
+                return None
+            program.append(int(h_list[1]) if len(h_list) > 1 else None)
+
+    for k in range(1, len(program), 2):
+        if program[k] is not None:
+            continue
+        tokens = program[k + 1]
+        if (not tokens) != (k == len(program) - 2):
+            # A variable field needs a delimiter to end at, except the last one, which takes the rest of the line
+            return None
+        if ANY in tokens:
+            # Delimiters are searched for from their text, '.' is only matched in place
+            return None
+    return program
+
+
+def match_delimiter(tokens, line, pos):
+    """
+    :return: position after the delimiter starting at pos, or -1
+    """
+    for token in tokens:
+        if token is SPACES:
+            m = WHITESPACE.match(line, pos)
+            if m is None:
+                return -1
+            pos = m.end()
+        elif token is ANY:
+            if pos == len(line):
+                return -1
+            pos += 1
+        elif line.startswith(token[0], pos):
+            pos += len(token[0])
+        else:
+            return -1
+    return pos
+
+
+def find_delimiter(tokens, line, pos):
+    """
+    First place at or after pos where the delimiter matches
+    :return: (start, end) of the delimiter, or None
+    """
+    if tokens[0] is SPACES:
+        if len(tokens) == 1:
+            m = WHITESPACE.search(line, pos)
+            return None if m is None else (m.start(), m.end())
+        # Spaces then text: find the text, then go back over the spaces before it
+        text = tokens[1][0]
+        q = line.find(text, pos + 1)
+        while q != -1:
+            start = q
+            while start > pos and line[start - 1].isspace():
+                start -= 1
+            if start < q:
+                end = match_delimiter(tokens[2:], line, q + len(text))
+                if end != -1:
+                    return start, end
+            q = line.find(text, q + 1)
+        return None
+
+    text = tokens[0][0]
+    q = line.find(text, pos)
+    while q != -1:
+        end = match_delimiter(tokens[1:], line, q + len(text))
+        if end != -1:
+            return q, end
+        q = line.find(text, q + 1)
+    return None
+
+
+class ParserSource:
+    """
+    Source of a function splitting a line, built from a program
+    Positions are kept as pos plus an offset known when compiling, so that fields of fixed width and the text
+    between them are sliced at constant offsets, pos being only moved after something of variable length
+    """
+    def __init__(self):
+        self.out = ['def fast_split(line):', '    pos = 0']
+        self.offset = 0
+        # pos is 0 until the first run of variable length
+        self.isAtStart = True
+        # Lowest length of line that the slices since the last check need
+        self.need = 0
+        self.names = []
+        self.delimiters = {}
+
+    def at(self, extra=0):
+        offset = self.offset + extra
+        if self.isAtStart:
+            return str(offset)
+        return 'pos + %d' % offset if offset else 'pos'
+
+    def emit(self, statement):
+        self.out.append('    ' + statement)
+
+    def flush(self):
+        # Check the length needed by the slices so far and move pos past them
+        if self.need:
+            self.emit('if len(line) < %s: return None' % self.at(self.need - self.offset))
+            self.need = 0
+        if self.offset:
+            self.emit('pos = %s' % self.at())
+            self.offset = 0
+        self.isAtStart = False
+
+    def new_name(self):
+        name = 'v%d' % len(self.names)
+        self.names.append(name)
+        return name
+
+    def field(self, width):
+        self.emit('%s = line[%s:%s]' % (self.new_name(), self.at(), self.at(width)))
+        self.offset += width
+        self.need = self.offset
+
+    def match(self, tokens):
+        # Delimiter in place, returning None on failure
+        for token in tokens:
+            if token is SPACES:
+                self.flush()
+                # Most runs are a single space
+                self.emit("if line[pos:pos + 1] == ' ' and not line[pos + 1:pos + 2].isspace():")
+                self.emit('    pos += 1')
+                self.emit('else:')
+                self.emit('    m = WHITESPACE.match(line, pos)')
+                self.emit('    if m is None: return None')
+                self.emit('    pos = m.end()')
+            elif token is ANY:
+                self.offset += 1
+                self.need = self.offset
+            else:
+                self.emit('if not line.startswith(%r, %s): return None' % (token[0], self.at()))
+                self.offset += len(token[0])
+
+    def split_run(self, run):
+        # Fields ended by spaces, the next field starting after the run of spaces
+        self.flush()
+        names = [self.new_name() for _ in range(run)]
+        self.emit('if line[pos:pos + 1].isspace(): return None')
+        self.emit('parts = line[pos:].split(None, %d)' % run)
+        self.emit('if len(parts) <= %d: return None' % run)
+        self.emit('%s, line = parts' % ', '.join(names))
+        self.emit('pos = 0')
+
+    def find(self, tokens):
+        # Field ended by the first place its delimiter matches at
+        self.flush()
+        name = self.new_name()
+        if tokens[0] is SPACES:
+            key = 'd%d' % len(self.delimiters)
+            self.delimiters[key] = tokens
+            self.emit('found = find_delimiter(%s, line, pos)' % key)
+            self.emit('if found is None: return None')
+            self.emit('%s = line[pos:found[0]]' % name)
+            self.emit('pos = found[1]')
+            return
+        self.emit('q = line.find(%r, pos)' % tokens[0][0])
+        self.emit('if q < 0: return None')
+        self.emit('%s = line[pos:q]' % name)
+        self.emit('pos = q + %d' % len(tokens[0][0]))
+        self.match(tokens[1:])
+
+    def end(self, isRest):
+        if isRest:
+            self.flush()
+            self.emit('return [%s]' % ', '.join(self.names + ['line[pos:]']))
+        else:
+            self.emit('if len(line) != %s: return None' % self.at())
+            self.emit('return [%s]' % ', '.join(self.names))
+
+    def build(self):
+        namespace = {'WHITESPACE': WHITESPACE, 'find_delimiter': find_delimiter}
+        namespace.update(self.delimiters)
+        exec('\n'.join(self.out), namespace)
+        return namespace['fast_split']
+
+
+def compile_parser(program):
+    """
+    Emit and compile a function splitting a line with program
+    Runs of fields ended by spaces are split with str.split, fields ended by text are cut at str.find.
+    The function only takes the first place each delimiter matches at, and returns None when that fails,
+    leaving the line to the regex, which backtracks to later places
+    :param program: from compile_program
+    :return: function taking a line and returning its list of values, or None
+    """
+    source = ParserSource()
+    source.match(program[0])
+    k = 1
+    while k < len(program):
+        width, tokens = program[k], program[k + 1]
+        if width is not None:
+            source.field(width)
+            source.match(tokens)
+        elif not tokens:
+            source.end(True)
+            return source.build()
+        elif tokens == [SPACES]:
+            run = 1
+            while program[k + 2 * run] is None and program[k + 2 * run + 1] == [SPACES]:
+                run += 1
+            source.split_run(run)
+            k += 2 * (run - 1)
+        else:
+            source.find(tokens)
+        k += 2
+    source.end(False)
+    return source.build()
+
+
+class LineSplitter:
+    def __init__(self, log_format):
+        self.log_format = log_format
+        self.headers, self.regex = generate_logformat_regex(log_format)
+        self.program = compile_program(log_format)
+        self.fast_split = compile_parser(self.program) if self.program is not None else None
+
+    def __getstate__(self):
+        # The emitted function cannot be pickled, it is compiled again
+        state = self.__dict__.copy()
+        state['fast_split'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.program is not None:
+            self.fast_split = compile_parser(self.program)
+
+    def split(self, line):
+        """
+        Split a stripped log line
+        :param line:
+        :return: list of values, in the order of headers (None for a field of an optional group that did not match),
+        or None if the line does not match log_format
+        """
+        if self.fast_split is not None and '\n' not in line:
+            values = self.fast_split(line)
+            if values is not None:
+                return values
+        match = self.regex.search(line)
+        if match is None:
+            return None
+        return [match.group(header) for header in self.headers]
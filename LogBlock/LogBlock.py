@@ -2,13 +2,33 @@ import hashlib
 import os
 import re
 import shutil
+import time
 import json
+import multiprocessing as mp
 from enum import Enum
 from datetime import datetime
+from itertools import zip_longest
+from collections import Counter
 
+import numpy as np
 import pandas as pd
 
 from py.Util import run_async
+from LogBlock.LogFormat import LogFormat
+from LogBlock.LineSplitter import LineSplitter, generate_logformat_regex
+from LogBlock.LogReader import iter_lines
+from LogBlock.ColumnProfile import ColumnProfile
+from LogBlock.ColumnSchema import get_schema
+from LogBlock.IntegerCodec import choose_order, delta_decode, delta_marker, parse_delta_marker, text_size, binary_size
+from LogBlock.TimeCodec import find_time_groups, render, time_range
+from LogBlock.DictCodec import frequency_order, dict_marker, parse_dict_marker
+from LogBlock.PrefixCodec import front_encode, shared_lengths, front_decode, affix_marker, front_marker, parse_prefix_marker
+from LogBlock.BlockContainer import BlockContainerWriter, BlockContainerReader, FLAG_START_WITH_FAIL, pack_payload, \
+    KIND_RAW, KIND_UNIQUE, KIND_DELTA, KIND_DICT, KIND_PREFIX, KIND_TIME, KIND_TIME_REF, \
+    KIND_RLE, KIND_AFFIX, KIND_FRONT
+from LogBlock.Aggregate import payload_counts
+from LogBlock.ZoneMap import Zone, column_bounds, write_zone_map, read_zone_map
+from LogBlock.BloomFilter import BloomFilter, content_tokens, write_bloom
 
 
 class FailLogsOption(Enum):
@@ -23,22 +43,100 @@ class FailLogsOption(Enum):
     REORDER_ATTACH = 4 #pass
 
 
+class OutputFormat(Enum):
+    # One text file per frame, columns joined by sep_split, one column per line
+    TEXT = 1
+    # One binary container per block, see BlockContainer
+    BINARY = 2
+
+
+class SelectionMode(Enum):
+    # Use the first step that applies, in the order of convert_column
+    FIRST_MATCH = 1
+    # Use the step giving the fewest bytes in the output format
+    MIN_SIZE = 2
+    # Use the step giving the smallest order-0 entropy estimate of the compressed output
+    MIN_ENTROPY = 3
+
+
+# Files written for each block, under the output folder, as logName + ext
+OUTPUT_EXTS = ['_trans_file.txt', '_failmatch.txt', '_block.bin', '_zonemap.json', '_bloom.bin']
+
+# Step of the columns of a timestamp group: the first column holds '<time>{spec}' and the time deltas,
+# the others only '<time@i:p>', rendered from column i at position p of the group
+TIME_STEP = 'time'
+TIME_REF = re.compile(r'<time@(\d+):(\d+)>')
+
+def entropy_size(data):
+    """
+    Cheap estimate of the compressed size of data: its order-0 entropy, in bytes
+    :param data: bytes
+    :return:
+    """
+    if not data:
+        return 0
+    counts = np.bincount(np.frombuffer(data, dtype=np.uint8), minlength=256)
+    p = counts[counts > 0] / len(data)
+    return float(-(p * np.log2(p)).sum() * len(data) / 8)
+
+
+# Tokens of Content, separators being kept so that joining the pieces gives the value back
+TOKEN_SPLIT = re.compile(r'([^a-zA-Z0-9]+)')
+
+
 class LogBlock:
-    def __init__(self, log_format, logName, indir='./', outdir='./result/', rex=[], sep_split='||', sep_count='<*>', line_break='~~', disable_step=None):
+    def __init__(self, log_format, logName, indir='./', outdir='./result/', rex=[], sep_split='||', sep_count='<*>', line_break='~~', disable_step=None, isStreaming=False, n_workers=1, isCleanOutdir=True, output_format=OutputFormat.TEXT, content_tokens=0, selection_mode=SelectionMode.FIRST_MATCH, isLearnSchema=False, isZoneMap=False, bloom_fpr=None):
         self.path = indir
         self.logName = logName
         self.savePath = outdir
         self.df_log = None
+        self.log_columns = None
         self.log_format = log_format
         self.rex = rex
         self.failtomatchList = []
-        self.init()
+        self.headers = None
+        self.line_splitter = None
+        if isCleanOutdir:
+            self.init()
         self.sep_split = sep_split
         self.sep_count = sep_count
         self.line_break = line_break
         self.failed_logs_option = FailLogsOption.APPEND_LINE
         self.freq = 0.1
+        # Rows used by step4 to pick between common prefix/suffix and front coding
+        self.prefix_sample = 1000
         self.disable_step = disable_step #Skip which step
+        self.output_format = output_format
+        # Parse lines straight into per-column lists instead of building a dataframe
+        self.isStreaming = isStreaming
+        # Number of processes used to shorten columns, 1 to process columns one by one
+        self.n_workers = n_workers
+        # Pool of n_workers processes, started by the first block converted in parallel and kept until close()
+        self.pool = None
+        # Split Content by token position into at most this many sub-columns, 0 to keep it as one column
+        self.content_tokens = content_tokens
+        # How convert_column picks a step, and the seconds it may spend on one column trying steps
+        self.selection_mode = selection_mode
+        self.selection_timeout = 1.0
+        # Learn the winning step of each column over the blocks of this log_format, see ColumnSchema
+        self.isLearnSchema = isLearnSchema
+        # SegmentWriter that OutputFormat.BINARY containers are appended to, instead of one _block.bin per block
+        self.segment = None
+        # BlockContainerReader that decode() reads from instead of the output folder, e.g. a block of a segment
+        self.container = None
+        # Lines of the loaded block, and (first, last) time of its lines in milliseconds since the epoch, or None
+        self.line_count = 0
+        self.time_range = None
+        # Write the zone map of each block to <logName>_zonemap.json, blocks of a segment keep it in the footer
+        self.isZoneMap = isZoneMap
+        # Line of the dataset the block starts at, for its zone map; blocks of a segment are numbered by the segment
+        self.first_line = 0
+        # (min, max) of each integer column of the loaded block, see ZoneMap
+        self.bounds = {}
+        # False-positive rate of the Bloom filter of line tokens kept for each block, e.g. 0.01, None for no filter
+        # It goes to the segment footer, or to <logName>_bloom.bin
+        self.bloom_fpr = bloom_fpr
+        self.bloom = None
 
     def outputCSV(self, list, file_name, sep='\n'):
         print('[START] writing %s' % file_name)
@@ -55,14 +153,17 @@ class LogBlock:
             w.close()
         print('[END] writing %s' % file_name)
 
-    def step1_check_unique(self, l_list, isStartWithFail):
+    def step1_check_unique(self, l_list, isStartWithFail, profile=None):
         """
         Step1: Process if current column contains only unique value
         :param l_list:
         :param isStartWithFail:
+        :param profile: ColumnProfile of l_list, shared between steps
         :return:
         """
-        if len(set(l_list)) == 1:
+        if profile is None:
+            profile = ColumnProfile(l_list)
+        if profile.cardinality == 1:
             # If only single value in list
             # Return single value add its appearance
             if isStartWithFail:
@@ -72,79 +173,148 @@ class LogBlock:
         else:
             return l_list, False
 
-    def step2_delta_encoding_for_integers(self, l_list, isStartWithFail):
+    def step2_delta_encoding_for_integers(self, l_list, isStartWithFail, profile=None):
         """
         If a line contains only integers, represent with delta value
         This saves space for colunms like timestamp
         :param l_list:
         :param isStartWithFail:
+        :param profile: ColumnProfile of l_list, shared between steps
         :return:
         """
-        try:
-            t_list = list(map(int, l_list))
-            # Delta encoding
-            t_list = [str(t_list[x+1] - t_list[x]) if x != 0 else str(t_list[0]) for x in range(len(t_list) - 1)]
-            if isStartWithFail:
-                # t_list[0] = '<delta>E' + t_list[0]
-                t_list.insert(0, '<delta>E')
-            else:
-                #t_list[0] = '<delta>' + t_list[0]
-                t_list.insert(0, '<delta>')
-            return t_list, True
-        except ValueError:
-            # If cannot be convert to integers
+        if profile is None:
+            profile = ColumnProfile(l_list)
+        # Values must be restored exactly from the integers with a printf template,
+        # e.g. zero-padded ('07' in <Minute:2>) or hex ('0x1f'), which is kept in the marker as <delta:%02d>
+        if profile.integers is None:
             return l_list, False
+        ints, template = profile.integers
 
-    def step3_extract_frequent_words(self, l_list, isStartWithFail):
+        # Plain values, delta or delta-of-delta, whichever is the smallest in the output format
+        size = binary_size if self.output_format == OutputFormat.BINARY else text_size
+        order, deltas = choose_order(ints, size)
+        marker = delta_marker(order, template)
+        t_list = list(map(str, deltas.tolist() if isinstance(deltas, np.ndarray) else deltas))
+        if isStartWithFail:
+            # t_list[0] = '<delta>E' + t_list[0]
+            t_list.insert(0, marker + 'E')
+        else:
+            #t_list[0] = '<delta>' + t_list[0]
+            t_list.insert(0, marker)
+        return t_list, True
+
+    def step3_extract_frequent_words(self, l_list, isStartWithFail, profile=None):
         """
         If column contains frequent words (larger than a frequency threshold), extract & build dictionary & replace those words
         :param l_list:
         :param isStartWithFail:
-        :param freq:
+        :param profile: ColumnProfile of l_list, shared between steps
         :return:
         """
-        if len(set(l_list)) <= int(self.freq * len(l_list)):
-            # Create dictionary
-            dict_lv = {}
-            count = 0
-            for lv in set(l_list):
-                dict_lv[lv] = count
-                count += 1
-            d_list = [str(dict_lv[x]) for x in l_list]
-            #d_list[0] = json.dumps(dict_lv) + d_list[0]
+        if profile is None:
+            profile = ColumnProfile(l_list)
+        if profile.cardinality <= int(self.freq * len(l_list)):
+            # Create dictionary, the most frequent values get the shortest codes
+            values = frequency_order(profile.counts)
+            codes = dict(zip(values, map(str, range(len(values)))))
+            d_list = list(map(codes.__getitem__, l_list))
             if isStartWithFail:
-                #d_list[0] = json.dumps(dict_lv) + 'E' + d_list[0]
-                d_list.insert(0, json.dumps(dict_lv) + 'E')
+                d_list.insert(0, dict_marker(values) + 'E')
             else:
-                # d_list[0] = json.dumps(dict_lv) + d_list[0]
-                d_list.insert(0, json.dumps(dict_lv))
+                d_list.insert(0, dict_marker(values))
             return d_list, True
         else:
             return l_list, False
 
 
-    def step4_extract_common_prefix_string(self, l_list, isStartWithFail):
+    def step4_extract_common_prefix_string(self, l_list, isStartWithFail, profile=None):
         """
         If a column contains values with the same prefix string, then extract that
         For example, if all values start with "com.hadoop."
+        Values may also share a suffix, or only share prefixes with their neighbours (front coding, one outlier such as
+        "org.apache." vs "com.hadoop." kills the common prefix); the mode saving the most, measured on the first rows, is used
         :param l_list:
         :param isStartWithFail:
+        :param profile: ColumnProfile of l_list, shared between steps
         :return:
         """
-        common_prefix_str = os.path.commonprefix(l_list)
-        #if len(common_prefix_str) >= 0.4 * len(l_list[0]):
-        if len(common_prefix_str) > 0:
+        if profile is None:
+            profile = ColumnProfile(l_list)
+        if not profile.distinct:
+            # Nothing to extract, e.g. a column holding only its failed first row
+            return l_list, False
+        common_prefix_str = profile.common_prefix
+        common_suffix_str = profile.common_suffix
+        # Prefix and suffix cannot overlap on the shortest value
+        overlap = len(common_prefix_str) + len(common_suffix_str) - min(map(len, profile.distinct))
+        if overlap > 0:
+            common_suffix_str = common_suffix_str[overlap:]
+
+        # Savings in characters of each mode on the first rows
+        sample = l_list[:self.prefix_sample]
+        affix_saving = len(sample) * (len(common_prefix_str) + len(common_suffix_str)) - \
+            len(affix_marker(common_prefix_str, common_suffix_str))
+        front = front_encode([x[:len(x) - len(common_suffix_str)] for x in sample])
+        front_saving = sum(k - len(str(k)) - 1 for k, _ in front) + len(sample) * len(common_suffix_str) - \
+            len(front_marker(common_suffix_str))
+        if max(affix_saving, front_saving) <= 0:
+            return l_list, False
+
+        if front_saving > affix_saving:
+            strip = len(common_suffix_str)
+            values = [x[:len(x) - strip] for x in l_list] if strip else l_list
+            comm_list = ['%d:%s' % (k, x[k:]) for k, x in zip(shared_lengths(values), values)]
+            head = front_marker(common_suffix_str)
+        elif common_suffix_str:
+            start, end = len(common_prefix_str), len(common_suffix_str)
+            comm_list = [x[start:len(x) - end] for x in l_list]
+            head = affix_marker(common_prefix_str, common_suffix_str)
+        else:
             comm_list = [x[len(common_prefix_str):] for x in l_list]
-            if isStartWithFail:
-                #comm_list[0] = '<pre' + common_prefix_str + '/>E' + comm_list[0]
-                comm_list.insert(0, '<pre' + common_prefix_str + '/>E')
-            else:
-                #comm_list[0] = '<pre' + common_prefix_str + '/>' + comm_list[0]
-                comm_list.insert(0, '<pre' + common_prefix_str + '/>')
-            return comm_list, True
+            head = '<pre' + common_prefix_str + '/>'
+
+        if isStartWithFail:
+            #comm_list[0] = '<pre' + common_prefix_str + '/>E' + comm_list[0]
+            comm_list.insert(0, head + 'E')
         else:
+            #comm_list[0] = '<pre' + common_prefix_str + '/>' + comm_list[0]
+            comm_list.insert(0, head)
+        return comm_list, True
+
+    def step5_run_length_encoding(self, l_list, isStartWithFail, profile=None):
+        """
+        If a column comes in long runs of the same value, write each run as value<*>run
+        This saves space for columns like Level or Component, which repeat without being unique
+        Only used if the runs are shorter than the column written as is, as a dictionary or as deltas
+        :param l_list:
+        :param isStartWithFail:
+        :param profile: ColumnProfile of l_list, shared between steps
+        :return:
+        """
+        if profile is None:
+            profile = ColumnProfile(l_list)
+        if profile.count_runs(profile.n // 2) > profile.n // 2:
+            return l_list, False
+
+        sep_size = len(self.sep_split)
+        rle_size = sum(len(v) + len(str(n)) for v, n in profile.run_lengths) + \
+            profile.runs * (len(self.sep_count) + sep_size)
+        raw_size = sum(len(v) * n for v, n in profile.counts.items()) + profile.n * sep_size
+        # Codes of step3 are given by decreasing frequency
+        values = frequency_order(profile.counts)
+        dict_size = len(dict_marker(values)) + sep_size + \
+            sum(len(str(k)) * profile.counts[v] for k, v in enumerate(values)) + profile.n * sep_size
+        other_sizes = [raw_size, dict_size]
+        if profile.integers is not None:
+            # Deltas take at least one character per value
+            other_sizes.append(profile.n * (1 + sep_size))
+        if rle_size >= min(other_sizes):
             return l_list, False
 
+        t_list = [self.sep_count.join([v, str(n)]) for v, n in profile.run_lengths]
+        t_list.insert(0, '<rle>E' if isStartWithFail else '<rle>')
+        return t_list, True
+
     def check_disable_steps(self, process_funcs):
         """
         Skip preprocessing steps
@@ -156,16 +326,27 @@ class LogBlock:
             return process_funcs
         else:
             if isinstance(dis, int):
-                del process_funcs[dis-1]
-            elif isinstance(dis, list):
-                dis = sorted(dis, reverse=True)
-                for x in dis:
-                    del process_funcs[x-1]
-            else:
+                dis = [dis]
+            elif not isinstance(dis, list):
                 raise TypeError('To disable step(s), you should only use an integer or a list of integers')
-            return process_funcs
+            # Steps are disabled by their number, not by their position in process_funcs
+            return [p_func for p_func in process_funcs if self.step_number(p_func) not in dis]
+
+    def step_number(self, p_func):
+        # step3_extract_frequent_words -> 3
+        return int(p_func.__name__[len('step')])
 
     def convert_list_to_shorter(self, l_list):
+        return self.convert_column(l_list)[0]
+
+    def convert_column(self, l_list, steps=None):
+        """
+        Shorten a column with the first step that applies
+        :param l_list:
+        :param steps: numbers of the steps learnt by ColumnSchema for this column, tried after step1 and before the
+        others, which are only tried if none of them applies; empty for a column learnt to stay raw
+        :return: (encoded column, number of the step used or None)
+        """
         # 0. Check if first row is null
         # This happens to log chunks that start with failed logs
         isStartWithFail = False
@@ -174,10 +355,12 @@ class LogBlock:
             isStartWithFail = True
 
         # 1. Check if unique
+        # 5. If values come in long runs
         # 2. If list contains integers only
         # 3. If contains repetitive values can be regard as levels (< 10%) for example
         # 4. Extract repetitive prefix strings
         process_funcs = [self.step1_check_unique,
+                 self.step5_run_length_encoding,
                  self.step2_delta_encoding_for_integers,
                  self.step3_extract_frequent_words,
                  self.step4_extract_common_prefix_string]
@@ -185,20 +368,174 @@ class LogBlock:
         # Check disable steps
         process_funcs = self.check_disable_steps(process_funcs)
 
+        # Skip the steps that did not win on this column in earlier blocks
+        fallback_funcs = []
+        if steps is not None:
+            learnt = [p_func for p_func in process_funcs if self.step_number(p_func) in [1] + steps]
+            if steps:
+                fallback_funcs = [p_func for p_func in process_funcs if p_func not in learnt]
+            process_funcs = learnt
+
+        # Profile the column once for all steps
+        profile = ColumnProfile(l_list)
+
+        for funcs in (process_funcs, fallback_funcs):
+            selected = self.apply_steps(funcs, l_list, isStartWithFail, profile)
+            if selected is not None: return selected
+
+        # If reach here, it means the list cannot be processed from above approaches, recover it
+        if isStartWithFail:
+            l_list.insert(0, '')
+        # Mark raw columns that would otherwise be read back as an encoded one
+        if self.detect_step(l_list) is not None:
+            l_list.insert(0, '<raw>')
+        return l_list, None
+
+    def apply_steps(self, process_funcs, l_list, isStartWithFail, profile):
+        """
+        Encode a column with process_funcs, as chosen by selection_mode
+        :return: (encoded column, number of the step used), or None if the column stays raw
+        """
+        if self.selection_mode != SelectionMode.FIRST_MATCH:
+            # Cheapest step, by the cost of selection_mode
+            return self.select_step(process_funcs, l_list, isStartWithFail, profile)
+
         for p_func in process_funcs:
             # Process columns according to different steps
-            l, processed = p_func(l_list, isStartWithFail)
-            if processed: return l
+            l, processed = p_func(l_list, isStartWithFail, profile)
+            if processed: return l, self.step_number(p_func)
+        return None
+
+    def select_step(self, process_funcs, l_list, isStartWithFail, profile):
+        """
+        Try the steps in order and keep the output with the lowest column_cost, the raw column included
+        Steps are not tried any more once selection_timeout seconds are spent on the column
+        :param process_funcs:
+        :param l_list: column, without its leading empty row if isStartWithFail
+        :param isStartWithFail:
+        :param profile: ColumnProfile of l_list
+        :return: (encoded column, number of the step used), or None if the raw column is the cheapest
+        """
+        start = time.perf_counter()
+        best = None
+        best_cost = self.column_cost([''] + l_list if isStartWithFail else l_list, None)
+        for p_func in process_funcs:
+            l, processed = p_func(l_list, isStartWithFail, profile)
+            if processed:
+                step = self.step_number(p_func)
+                if step == 1:
+                    # A single value and its count cannot be beaten
+                    return l, step
+                cost = self.column_cost(l, step)
+                if cost < best_cost:
+                    best, best_cost = (l, step), cost
+            if time.perf_counter() - start > self.selection_timeout:
+                break
+        return best
+
+    def detect_step(self, col_list):
+        """
+        Tell which step produced an encoded column, from its first token
+        :param col_list: encoded column, split by sep_split
+        :return: step number, 0 for an escaped raw column, None for a raw column
+        """
+        head = col_list[0]
+        if head == '<raw>':
+            return 0
+        if len(col_list) == 1 and re.fullmatch(r'.*%s\d+E?' % re.escape(self.sep_count), head, re.DOTALL):
+            return 1
+        if head.startswith('<time>{') or TIME_REF.fullmatch(head):
+            return TIME_STEP
+        if head in ('<rle>', '<rle>E'):
+            return 5
+        if parse_delta_marker(head[:-1] if head.endswith('E') else head) is not None:
+            return 2
+        if parse_dict_marker(head) is not None:
+            return 3
+        if parse_prefix_marker(head) is not None:
+            return 4
+        return None
+
+    def decode_column(self, col_list):
+        """
+        Invert convert_list_to_shorter
+        :param col_list: encoded column, split by sep_split
+        :return: list of original values
+        """
+        step = self.detect_step(col_list)
+        if step is None:
+            return col_list
+        if step == 0:
+            return col_list[1:]
+
+        head = col_list[0]
+        if step == TIME_STEP:
+            if TIME_REF.fullmatch(head):
+                raise ValueError('%s is rendered from another column, use decode_columns' % head)
+            return self.decode_time_stream(col_list)[0]
+
+        isStartWithFail = head.endswith('E')
+        if step == 1:
+            value, count = head.rstrip('E').rsplit(self.sep_count, 1)
+            l_list = [value] * int(count)
+        elif step == 2:
+            order, template = parse_delta_marker(head[:-1] if isStartWithFail else head)
+            l_list = [template % x for x in delta_decode(list(map(int, col_list[1:])), order)]
+        elif step == 3:
+            # A value of the dictionary may end with E
+            values, isStartWithFail = parse_dict_marker(head)
+            l_list = [values[int(x)] for x in col_list[1:]]
+        elif step == 5:
+            l_list = []
+            for token in col_list[1:]:
+                value, run = token.rsplit(self.sep_count, 1)
+                l_list += [value] * int(run)
+        else:
+            mode, prefix, suffix, isStartWithFail = parse_prefix_marker(head)
+            if mode == 'front':
+                pairs = [token.split(':', 1) for token in col_list[1:]]
+                l_list = [x + suffix for x in front_decode([(int(k), rest) for k, rest in pairs])]
+            else:
+                l_list = [prefix + x + suffix for x in col_list[1:]]
 
-        # If reach here, it means the list cannot be processed from above approaches, recover it
         if isStartWithFail:
             l_list.insert(0, '')
         return l_list
 
 
-    def trans_by_cols(self, df, cols, output_ext):
-        #TODO: Decide if we need to introduce parallel processing
-        merge_list = []
+    def decode_time_stream(self, col_list):
+        """
+        Render all columns of a timestamp group from its first column
+        :param col_list: '<time>{spec}' followed by the time deltas, empty for empty rows
+        :return: list of columns, in the order of the group
+        """
+        spec = json.loads(col_list[0][len('<time>'):])
+        nulls = [k for k, x in enumerate(col_list[1:]) if x == '']
+        deltas = [int(x) for x in col_list[1:] if x != '']
+        return render(spec, nulls, delta_decode(deltas, spec['order']))
+
+    def decode_columns(self, col_lists):
+        """
+        Invert convert_column on all columns of a frame, timestamp groups being rendered once for all their columns
+        :param col_lists: encoded columns, split by sep_split
+        :return: list of decoded columns
+        """
+        decoded = []
+        groups = {}
+        for i, col_list in enumerate(col_lists):
+            if self.detect_step(col_list) != TIME_STEP:
+                decoded.append(self.decode_column(col_list))
+                continue
+            ref = TIME_REF.fullmatch(col_list[0])
+            if ref is None:
+                groups[i] = self.decode_time_stream(col_list)
+                decoded.append(groups[i][0])
+            else:
+                decoded.append(groups[int(ref.group(1))][int(ref.group(2))])
+        return decoded
+
+    def df_to_columns(self, df, cols):
+        col_lists = []
 
         for col in cols:
             df_colList = df[col]
@@ -208,13 +545,240 @@ class LogBlock:
                 df_colList = ['' if x is None else x for x in df_colList]
             else:
                 df_colList = list(df_colList)
+            col_lists.append(df_colList)
+        return col_lists
+
+    def trans_by_cols(self, df, cols, output_ext):
+        self.trans_frames([(self.df_to_columns(df, cols), output_ext, list(cols))])
+
+    def trans_columns(self, col_lists, output_ext, names=None):
+        """
+        Shorten each column and write one column per line
+        :param col_lists: list of columns, each column is a list of str
+        :param output_ext:
+        :param names: column names, used by the binary output
+        :return:
+        """
+        self.trans_frames([(col_lists, output_ext, names)])
+
+    def trans_frames(self, frames):
+        """
+        Shorten the columns of all frames together, then write one file per frame,
+        or a single container for all frames with OutputFormat.BINARY
+        :param frames: list of (col_lists, output_ext, column names)
+        :return:
+        """
+        # Timestamp groups are found before shortening the columns, which may change them
+        time_groups = []
+        start = 0
+        for col_lists, _, names in frames:
+            if names is not None:
+                time_groups += [(start, group) for group in find_time_groups(names, col_lists)]
+            start += len(col_lists)
+        self.time_range = time_range([group for start, group in time_groups if start == 0])
+        self.bounds = {}
+        if (self.segment is not None or self.isZoneMap) and frames[0][2] is not None:
+            self.bounds = column_bounds(frames[0][0], frames[0][2])
+        if self.segment is None and self.isZoneMap:
+            write_zone_map(os.path.join(self.savePath, self.logName + '_zonemap.json'),
+                           Zone(self.first_line, self.line_count, self.time_range, self.bounds))
+        self.bloom = None
+        if self.bloom_fpr is not None:
+            self.bloom = BloomFilter.build(self.line_tokens(frames), self.bloom_fpr)
+            if self.segment is None:
+                write_bloom(os.path.join(self.savePath, self.logName + '_bloom.bin'), self.bloom)
 
-            df_colList = self.convert_list_to_shorter(df_colList)
+        # Steps that won on each column in earlier blocks of the same log_format
+        steps = None
+        if self.isLearnSchema:
+            schema = get_schema(self.log_format)
+            schema.start_block()
+            col_keys = [(self.frame_name(output_ext), name if names is not None else str(x))
+                        for col_lists, output_ext, names in frames for x, name in enumerate(names or col_lists)]
+            steps = [schema.steps(key) for key in col_keys]
 
-            merge_list.append(self.sep_split.join(df_colList))
+        converted = self.convert_columns([col_list for col_lists, _, _ in frames for col_list in col_lists], steps)
+        if self.isLearnSchema:
+            for key, (_, step) in zip(col_keys, converted):
+                schema.record(key, step)
+        for start, group in time_groups:
+            self.apply_time_group(converted, start, group)
 
-        self.outputCSV(file_name=os.path.join(self.savePath, self.logName + output_ext), list=merge_list)
+        if self.output_format == OutputFormat.BINARY:
+            writer = BlockContainerWriter()
+            start = 0
+            for col_lists, output_ext, names in frames:
+                if names is None:
+                    names = [str(x) for x in range(len(col_lists))]
+                for name, (col_list, step) in zip(names, converted[start:start + len(col_lists)]):
+                    writer.add_column(self.frame_name(output_ext), name, *self.column_payload(col_list, step))
+                start += len(col_lists)
+            if self.segment is not None:
+                self.segment.add_block(writer.to_bytes(), self.line_count, self.time_range, self.bounds, self.bloom)
+                return
+            file_name = os.path.join(self.savePath, self.logName + '_block.bin')
+            print('[START] writing %s' % file_name)
+            writer.write(file_name)
+            print('[END] writing %s' % file_name)
+            return
 
+        start = 0
+        for col_lists, output_ext, _ in frames:
+            merge_list = [self.sep_split.join(col_list) for col_list, _ in converted[start:start + len(col_lists)]]
+            start += len(col_lists)
+            self.outputCSV(file_name=os.path.join(self.savePath, self.logName + output_ext), list=merge_list)
+
+    def line_tokens(self, frames):
+        """
+        Tokens of the lines decode() gives back, taken from the rows rendered with log_format, so that tokens of
+        headers and of fields with no separator between them are found too
+        :param frames: list of (col_lists, output_ext, column names), as taken by trans_frames
+        :return: set of tokens, see BloomFilter.content_tokens
+        """
+        col_lists, output_ext, names = frames[0]
+        log_format = LogFormat(self.log_format)
+        if output_ext != '_trans_file.txt' or names is None:
+            return content_tokens(value for col_lists, _, _ in frames for col_list in col_lists for value in col_list)
+        tokens = content_tokens(map(log_format.render, zip(*self.merge_content(col_lists, log_format.headers))))
+        # Unmatched lines of CREATE_SEP
+        for col_lists, _, names in frames[1:]:
+            if names is not None and 'Content' in names:
+                tokens |= content_tokens(col_lists[names.index('Content')])
+        return tokens
+
+    def apply_time_group(self, converted, start, group):
+        """
+        Replace the columns of a timestamp group by a single time stream, if its column_cost is lower
+        :param converted: list of (encoded column, step), changed in place
+        :param start: index of the first column of the frame in converted
+        :param group: TimeGroup, with column indices in the frame
+        :return:
+        """
+        size = binary_size if self.output_format == OutputFormat.BINARY else text_size
+        order, deltas = choose_order(group.units, size)
+        tokens = list(map(str, deltas.tolist() if isinstance(deltas, np.ndarray) else deltas))
+        if group.nulls:
+            # Empty rows, e.g. failed lines, are kept as empty tokens
+            null_set = set(group.nulls)
+            it = iter(tokens)
+            tokens = ['' if k in null_set else next(it) for k in range(len(tokens) + len(group.nulls))]
+
+        head = '<time>' + json.dumps(group.spec(order), separators=(',', ':'))
+        if self.sep_split in head:
+            return
+        encoded = [([head] + tokens, TIME_STEP)]
+        encoded += [(['<time@%d:%d>' % (group.cols[0], p)], TIME_STEP) for p in range(1, len(group.cols))]
+
+        current = [converted[start + i] for i in group.cols]
+        if sum(self.column_cost(*x) for x in encoded) < sum(self.column_cost(*x) for x in current):
+            for i, x in zip(group.cols, encoded):
+                converted[start + i] = x
+
+    def encoded_size(self, col_list, step):
+        # Bytes taken by an encoded column in the output format
+        if self.output_format == OutputFormat.BINARY:
+            kind, _, payload = self.column_payload(col_list, step)
+            return len(pack_payload(kind, payload))
+        return len(self.sep_split.join(col_list))
+
+    def column_cost(self, col_list, step):
+        # Cost of an encoded column for selection_mode, bytes in the output format or their entropy estimate
+        if self.selection_mode != SelectionMode.MIN_ENTROPY:
+            return self.encoded_size(col_list, step)
+        if self.output_format == OutputFormat.BINARY:
+            kind, _, payload = self.column_payload(col_list, step)
+            return entropy_size(pack_payload(kind, payload))
+        return entropy_size(self.sep_split.join(col_list).encode('utf-8'))
+
+    def frame_name(self, output_ext):
+        # '_trans_file.txt' -> 'trans_file'
+        return output_ext[1:].rsplit('.', 1)[0]
+
+    def column_payload(self, col_list, step):
+        """
+        Typed payload of an encoded column for the binary container
+        :param col_list: encoded column
+        :param step: step used, as returned by convert_column
+        :return: (kind, flags, payload)
+        """
+        if step is None:
+            return KIND_RAW, 0, col_list[1:] if col_list[:1] == ['<raw>'] else col_list
+
+        head = col_list[0]
+        if step == TIME_STEP:
+            ref = TIME_REF.fullmatch(head)
+            if ref is not None:
+                return KIND_TIME_REF, 0, (int(ref.group(1)), int(ref.group(2)))
+            tokens = col_list[1:]
+            return KIND_TIME, 0, (head[len('<time>'):], [k for k, x in enumerate(tokens) if x == ''],
+                                  [int(x) for x in tokens if x != ''])
+
+        if step == 4:
+            mode, prefix, suffix, isStartWithFail = parse_prefix_marker(head)
+            flags = FLAG_START_WITH_FAIL if isStartWithFail else 0
+            if mode == 'front':
+                pairs = [token.split(':', 1) for token in col_list[1:]]
+                return KIND_FRONT, flags, (suffix, [int(k) for k, _ in pairs], [rest for _, rest in pairs])
+            if mode == 'affix':
+                return KIND_AFFIX, flags, (prefix, suffix, col_list[1:])
+            return KIND_PREFIX, flags, (prefix, col_list[1:])
+
+        if step == 3:
+            values, isStartWithFail = parse_dict_marker(head)
+            flags = FLAG_START_WITH_FAIL if isStartWithFail else 0
+            return KIND_DICT, flags, (values, list(map(int, col_list[1:])))
+
+        flags = FLAG_START_WITH_FAIL if head.endswith('E') else 0
+        head = head[:-1] if flags else head
+        if step == 1:
+            value, count = head.rsplit(self.sep_count, 1)
+            return KIND_UNIQUE, flags, (value, int(count))
+        elif step == 2:
+            order, template = parse_delta_marker(head)
+            return KIND_DELTA, flags, (template, order, list(map(int, col_list[1:])))
+        else:
+            runs = [token.rsplit(self.sep_count, 1) for token in col_list[1:]]
+            return KIND_RLE, flags, ([v for v, _ in runs], [int(n) for _, n in runs])
+
+    def convert_columns(self, col_lists, steps=None):
+        """
+        Run convert_column on every column, on a pool of n_workers processes if n_workers > 1
+        Output keeps the order of col_lists
+        :param col_lists:
+        :param steps: steps learnt for each column, see convert_column, or None
+        :return: list of (encoded column, step)
+        """
+        if steps is None:
+            steps = [None] * len(col_lists)
+        if self.n_workers <= 1 or len(col_lists) <= 1:
+            return [self.convert_column(col_list, col_steps) for col_list, col_steps in zip(col_lists, steps)]
+
+        if self.pool is None:
+            # Started once and reused by the next blocks, e.g. of encode_many or BlockSealer
+            self.pool = mp.Pool(processes=self.n_workers)
+        # One column per task, columns differ a lot in size
+        return self.pool.starmap(self.convert_column, zip(col_lists, steps), chunksize=1)
+
+    def close(self):
+        """
+        Stop the pool of convert_columns, if it was started
+        :return:
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def __getstate__(self):
+        # Workers only need the settings, not the loaded block
+        state = self.__dict__.copy()
+        state['df_log'] = None
+        state['log_columns'] = None
+        state['failtomatchList'] = []
+        state['segment'] = None
+        state['container'] = None
+        state['pool'] = None
+        return state
 
     def run(self):
         """
@@ -222,24 +786,318 @@ class LogBlock:
         :return:
         """
 
+        if self.isStreaming:
+            self.run_streaming()
+            return
+
         # Load data
         self.load_data()
 
-        self.trans_by_cols(
-            df=self.df_log,
-            cols=self.headers,
-            output_ext="_trans_file.txt"
-        )
+        frames = [self.split_content(self.df_to_columns(self.df_log, self.headers), "_trans_file.txt", self.headers)]
 
         # Output unmatched lines
         if len(self.failtomatchList) != 0:
             fail_df = pd.DataFrame(self.failtomatchList, columns=['Line', 'Content'])
+            frames.append((self.df_to_columns(fail_df, list(fail_df.columns)), '_failmatch.txt', list(fail_df.columns)))
+
+        self.trans_frames(frames)
+
+    def run_streaming(self):
+        """
+        Same output as run(), without the dataframe round-trip
+        :return:
+        """
+        self.load_columns()
+        self.trans_log_columns()
+
+    def run_lines(self, lines):
+        """
+        Encode a block held in memory instead of a log file, as run_streaming() does
+        :param lines: lines of the block, without line breaks
+        :return:
+        """
+        self.load_lines(lines)
+        self.trans_log_columns()
+
+    def trans_log_columns(self):
+        """
+        Shorten and write the loaded log_columns and unmatched lines
+        :return:
+        """
+        frames = [self.split_content(self.log_columns, "_trans_file.txt", self.headers)]
+
+        # Output unmatched lines, transposed to [Line, Content]
+        if len(self.failtomatchList) != 0:
+            frames.append(([list(x) for x in zip(*self.failtomatchList)], '_failmatch.txt', ['Line', 'Content']))
+
+        self.trans_frames(frames)
+
+    def split_content(self, col_lists, output_ext, names):
+        """
+        Split Content into sub-columns by token position, each of them going through the steps on its own
+        Pieces past the budget stay together in the last sub-column, and rows with fewer pieces get ''
+        :param col_lists: columns of a frame
+        :param output_ext:
+        :param names: column names, Content becoming Content_0, Content_1...
+        :return: (col_lists, output_ext, names), as taken by trans_frames
+        """
+        if self.content_tokens <= 1 or 'Content' not in names or not col_lists[names.index('Content')]:
+            return col_lists, output_ext, names
+        index = names.index('Content')
+        budget = self.content_tokens
+        pieces = []
+        for value in col_lists[index]:
+            tokens = TOKEN_SPLIT.split(value)
+            if len(tokens) > budget:
+                tokens[budget - 1:] = [''.join(tokens[budget - 1:])]
+            pieces.append(tokens)
+        sub_lists = [list(x) for x in zip_longest(*pieces, fillvalue='')]
+        sub_names = ['Content_%d' % k for k in range(len(sub_lists))]
+        return col_lists[:index] + sub_lists + col_lists[index + 1:], output_ext, \
+            names[:index] + sub_names + names[index + 1:]
+
+    def merge_content(self, columns, headers):
+        """
+        Invert split_content, the number of sub-columns being the number of columns over the headers
+        :param columns: decoded columns of the frame
+        :param headers: headers of log_format
+        :return: one column per header
+        """
+        index = headers.index('Content')
+        extra = len(columns) - len(headers)
+        if extra <= 0:
+            return columns
+        merged = [''.join(x) for x in zip(*columns[index:index + extra + 1])]
+        return columns[:index] + [merged] + columns[index + extra + 1:]
+
+    def read_trans_file(self, output_ext):
+        """
+        Read and decode an output file written by trans_frames
+        :param output_ext:
+        :return: list of decoded columns, or None if the file does not exist
+        """
+        if self.container is not None:
+            return self.read_container_frame(self.container, output_ext)
+        if self.output_format == OutputFormat.BINARY:
+            file_name = os.path.join(self.savePath, self.logName + '_block.bin')
+            if not os.path.isfile(file_name):
+                return None
+            with BlockContainerReader(file_name) as reader:
+                return self.read_container_frame(reader, output_ext)
+
+        file_name = os.path.join(self.savePath, self.logName + output_ext)
+        if not os.path.isfile(file_name):
+            return None
+        with open(file_name, 'r', encoding='utf-8') as r:
+            lines = r.read().split('\n')
+        return self.decode_columns([line.split(self.sep_split) for line in lines])
+
+    def read_container_frame(self, reader, output_ext):
+        frame = self.frame_name(output_ext)
+        if frame not in reader.frames():
+            return None
+        return reader.read_frame(frame)
+
+    def frame_columns(self, output_ext, n_columns):
+        """
+        Column names of an output frame, as written by trans_frames
+        :param output_ext:
+        :param n_columns: columns in the frame, more than the names when Content was split by split_content
+        :return: list of names
+        """
+        names = LogFormat(self.log_format).headers if output_ext == '_trans_file.txt' else ['Line', 'Content']
+        extra = n_columns - len(names)
+        if extra > 0 and 'Content' in names:
+            index = names.index('Content')
+            names = names[:index] + ['Content_%d' % k for k in range(extra + 1)] + names[index + 1:]
+        return names
+
+    def read_columns(self, names, output_ext='_trans_file.txt'):
+        """
+        Decode some columns of an output frame, e.g. ['Level', 'Component'], without decoding the others
+        Values are given per row of the frame: failed lines are rows with empty headers (see decode)
+        :param names: headers of log_format, or Line and Content for _failmatch.txt
+        :param output_ext:
+        :return: dict of name -> decoded column, or None if the frame does not exist
+        """
+        if self.container is not None:
+            return self.read_container_columns(self.container, names, output_ext)
+        if self.output_format == OutputFormat.BINARY:
+            file_name = os.path.join(self.savePath, self.logName + '_block.bin')
+            if not os.path.isfile(file_name):
+                return None
+            with BlockContainerReader(file_name) as reader:
+                return self.read_container_columns(reader, names, output_ext)
+
+        file_name = os.path.join(self.savePath, self.logName + output_ext)
+        if not os.path.isfile(file_name):
+            return None
+        with open(file_name, 'r', encoding='utf-8') as r:
+            lines = r.read().split('\n')
+        frame_names = self.frame_columns(output_ext, len(lines))
+        groups = {}
+
+        def decode_line(position):
+            col_list = lines[position].split(self.sep_split)
+            ref = TIME_REF.fullmatch(col_list[0])
+            if ref is None:
+                return self.decode_column(col_list)
+            stream = int(ref.group(1))
+            if stream not in groups:
+                groups[stream] = self.decode_time_stream(lines[stream].split(self.sep_split))
+            return groups[stream][int(ref.group(2))]
+
+        return {name: self.join_columns([decode_line(x) for x in self.column_positions(frame_names, name)])
+                for name in names}
+
+    def read_container_columns(self, reader, names, output_ext):
+        frame = self.frame_name(output_ext)
+        if frame not in reader.frames():
+            return None
+        frame_names = reader.column_names(frame)
+        wanted = {name: [frame_names[x] for x in self.column_positions(frame_names, name)] for name in names}
+        columns = dict(zip(sum(wanted.values(), []), reader.read_columns(frame, sum(wanted.values(), []))))
+        return {name: self.join_columns([columns[x] for x in wanted[name]]) for name in names}
+
+    def column_positions(self, frame_names, name):
+        """
+        :param frame_names: column names of the frame
+        :param name:
+        :return: positions of the column in the frame, those of Content_0, Content_1... for a split Content
+        """
+        if name in frame_names:
+            return [frame_names.index(name)]
+        positions = [x for x, y in enumerate(frame_names) if re.fullmatch(re.escape(name) + r'_\d+', y)]
+        if name != 'Content' or not positions:
+            raise ValueError('No column %s in %s' % (name, frame_names))
+        return positions
+
+    def join_columns(self, columns):
+        # Sub-columns of a split Content are joined back, as merge_content does
+        return columns[0] if len(columns) == 1 else [''.join(x) for x in zip(*columns)]
+
+    def group_count(self, name, output_ext='_trans_file.txt'):
+        """
+        Count the rows of each value of a column, from its encoding when possible (see Aggregate)
+        :param name: e.g. 'Level'
+        :param output_ext:
+        :return: Counter of values, or None if the frame does not exist
+        """
+        if self.container is not None:
+            return self.container_group_count(self.container, name, output_ext)
+        if self.output_format == OutputFormat.BINARY:
+            file_name = os.path.join(self.savePath, self.logName + '_block.bin')
+            if not os.path.isfile(file_name):
+                return None
+            with BlockContainerReader(file_name) as reader:
+                return self.container_group_count(reader, name, output_ext)
+
+        file_name = os.path.join(self.savePath, self.logName + output_ext)
+        if not os.path.isfile(file_name):
+            return None
+        with open(file_name, 'r', encoding='utf-8') as r:
+            lines = r.read().split('\n')
+        positions = self.column_positions(self.frame_columns(output_ext, len(lines)), name)
+        if len(positions) == 1:
+            col_list = lines[positions[0]].split(self.sep_split)
+            step = self.detect_step(col_list)
+            if step != TIME_STEP:
+                counts = payload_counts(*self.column_payload(col_list, None if step == 0 else step))
+                if counts is not None:
+                    return counts
+        return Counter(self.read_columns([name], output_ext)[name])
+
+    def container_group_count(self, reader, name, output_ext):
+        frame = self.frame_name(output_ext)
+        if frame not in reader.frames():
+            return None
+        frame_names = reader.column_names(frame)
+        positions = self.column_positions(frame_names, name)
+        if len(positions) == 1:
+            counts = payload_counts(*reader.read_payload(frame, frame_names[positions[0]]))
+            if counts is not None:
+                return counts
+        return Counter(self.read_container_columns(reader, [name], output_ext)[name])
+
+    def distinct(self, name, output_ext='_trans_file.txt'):
+        """
+        :param name:
+        :param output_ext:
+        :return: set of the values of a column
+        """
+        counts = self.group_count(name, output_ext)
+        return None if counts is None else set(counts)
+
+    def count(self, name=None, value=None, output_ext='_trans_file.txt'):
+        """
+        :param name: column to count by, the first header by default
+        :param value: count only the rows holding this value
+        :param output_ext:
+        :return: number of rows
+        """
+        counts = self.group_count(name or self.frame_columns(output_ext, 0)[0], output_ext)
+        if counts is None:
+            return 0
+        return sum(counts.values()) if value is None else counts[value]
+
+    def decode(self, outpath=None):
+        """
+        Rebuild the log block from _trans_file.txt (and _failmatch.txt), or from _block.bin
+        Lines are rendered from log_format, so what the format regex does not keep comes back as the format writes it:
+        leading and trailing spaces (lines are stripped) and the length of whitespace runs between fields
+        :param outpath: if given, also write the block to this file
+        :return: list of log lines
+        """
+        log_format = LogFormat(self.log_format)
+        headers = log_format.headers
+        content_index = headers.index("Content")
+        columns = self.merge_content(self.read_trans_file("_trans_file.txt"), headers)
+        rows = list(zip(*columns))
 
-            self.trans_by_cols(
-                df=fail_df,
-                cols=list(fail_df.columns),
-                output_ext='_failmatch.txt'
-            )
+        def is_failed(row):
+            # Failed lines are kept as Content with empty headers
+            return all(v == '' for i, v in enumerate(row) if i != content_index)
+
+        fail_runs = []
+        log_lines = []
+        if self.failed_logs_option == FailLogsOption.KEEP_MERGE:
+            log_lines = [row[content_index] if is_failed(row) else log_format.render(row) for row in rows]
+        elif self.failed_logs_option == FailLogsOption.APPEND_LINE:
+            for row in rows:
+                pieces = row[content_index].split(self.line_break)
+                if is_failed(row):
+                    log_lines += pieces
+                    continue
+                if len(pieces) > 1:
+                    row = row[:content_index] + (pieces[0],) + row[content_index + 1:]
+                log_lines.append(log_format.render(row))
+                log_lines += pieces[1:]
+        elif self.failed_logs_option == FailLogsOption.CREATE_SEP:
+            fail_columns = self.read_trans_file('_failmatch.txt')
+            if fail_columns is not None:
+                for line_id, content in zip(*fail_columns):
+                    if line_id != '':
+                        fail_runs.append((int(line_id), []))
+                    fail_runs[-1][1].append(content)
+        elif self.failed_logs_option == FailLogsOption.REORDER_ATTACH:
+            # Runs of failed lines are attached at the end, as '<line id> <line>~~<line>...'
+            while rows and is_failed(rows[-1]) and re.match(r'\d+ ', rows[-1][content_index]):
+                line_id, content = rows.pop()[content_index].split(' ', 1)
+                fail_runs.insert(0, (int(line_id), content.split(self.line_break)))
+
+        if self.failed_logs_option in (FailLogsOption.CREATE_SEP, FailLogsOption.REORDER_ATTACH):
+            # Put runs of failed lines back at their line ids
+            row_iter = iter(rows)
+            for line_id, run_lines in fail_runs:
+                while len(log_lines) < line_id - 1:
+                    log_lines.append(log_format.render(next(row_iter)))
+                log_lines += run_lines
+            log_lines += [log_format.render(row) for row in row_iter]
+
+        if outpath is not None:
+            with open(outpath, 'w', encoding='utf-8') as w:
+                w.write('\n'.join(log_lines) + '\n')
+        return log_lines
 
     def init(self):
         if not os.path.exists(self.savePath):
@@ -249,127 +1107,313 @@ class LogBlock:
             shutil.rmtree(self.savePath)
             os.makedirs(self.savePath)
 
+    def set_block(self, log_path, outdir):
+        """
+        Point this instance to another log block, keeping the compiled log format and settings
+        Unlike init(), the output folder is reused: only the output files of this block are removed
+        :param log_path:
+        :param outdir:
+        :return:
+        """
+        self.path = os.path.dirname(log_path)
+        self.logName = os.path.basename(log_path)
+        self.savePath = outdir
+        self.df_log = None
+        self.log_columns = None
+        self.failtomatchList = []
+
+        if not os.path.isdir(outdir):
+            os.makedirs(outdir)
+        else:
+            for output_ext in OUTPUT_EXTS:
+                file_name = os.path.join(outdir, self.logName + output_ext)
+                if os.path.isfile(file_name):
+                    os.remove(file_name)
+
+    def compile_log_format(self):
+        """
+        Generate headers and line splitter of log_format once per instance
+        :return:
+        """
+        if self.line_splitter is None:
+            self.line_splitter = LineSplitter(self.log_format)
+            self.headers = self.line_splitter.headers
+        return self.headers, self.line_splitter
+
     def load_data(self):
-        headers, regex = self.generate_logformat_regex(self.log_format)
-        self.headers = headers
-        self.df_log = self.log_to_dataframe(os.path.join(self.path, self.logName), regex,
+        headers, splitter = self.compile_log_format()
+        self.df_log = self.log_to_dataframe(os.path.join(self.path, self.logName), splitter,
                                             headers, self.log_format)
 
+    def load_columns(self):
+        headers, splitter = self.compile_log_format()
+        self.log_columns = self.log_to_columns(os.path.join(self.path, self.logName), splitter, headers)
+
+    def load_lines(self, lines):
+        headers, splitter = self.compile_log_format()
+        self.log_columns = self.lines_to_columns(lines, splitter, headers)
+
     def preprocess(self, line):
         for currentRex in self.rex:
             line = re.sub(currentRex, '<*>', line)
         return line
 
-    def log_to_dataframe(self, log_file, regex, headers, logformat, encode="utf-8"):
+    def log_to_dataframe(self, log_file, splitter, headers, logformat):
         """ Function to transform log file to dataframe
         """
-        try:
-            log_messages = []
-            linecount = 0
+        log_messages = []
+        linecount = 0
+
+        # Record temporary line number
+        temp_linecount = 0
+        temp_line_list = []
+
+        line_id_list_real = []
 
-            # Record temporary line number
-            temp_linecount = 0
-            temp_line_list = []
+        # Content of the last message and the failed lines appended to it, joined once the message is complete
+        content_index = headers.index("Content") if "Content" in headers else None
+        content_fragments = []
 
-            line_id_list_real = []
+        for line in iter_lines(log_file):
+            # print(line)
+            temp_linecount += 1
+            try:
 
-            with open(log_file, 'r', encoding=encode) as fin:
+                message = splitter.split(line.strip())
+                if message is None:
+                    raise ValueError('Line does not match log_format')
 
-                for line in fin.readlines():
-                    # print(line)
-                    temp_linecount += 1
-                    try:
+                if content_fragments:
+                    log_messages[-1][content_index] = self.line_break.join(content_fragments)
+                    content_fragments = []
+                log_messages.append(message)
 
-                        match = regex.search(line.strip())
-                        message = [match.group(header) for header in headers]
+                # Dump saved failed lines
+                if temp_line_list != []:
+                    # Add except extra
+                    if self.failed_logs_option == FailLogsOption.REORDER_ATTACH:
+                        # Failed lines of one run, joined once
+                        self.failtomatchList.append(self.line_break.join(temp_line_list))
+                    else:
+                        self.failtomatchList += temp_line_list
+                    temp_line_list = []
 
+                linecount += 1
+                line_id_list_real.append(temp_linecount)
+
+            except Exception as e:
+                if self.failed_logs_option == FailLogsOption.CREATE_SEP:
+                    # Record lines that cannot be processed
+                    if temp_line_list == []:
+                        temp_line_list.append([str(temp_linecount), line.strip()])
+                    else:
+                        temp_line_list.append(['', line.strip()])
+                elif self.failed_logs_option == FailLogsOption.REORDER_ATTACH:
+                    if temp_line_list == []:
+                        temp_line_list.append(str(temp_linecount) + ' ' + line.strip())
+                    else:
+                        temp_line_list.append(line.strip())
+
+                elif self.failed_logs_option == FailLogsOption.KEEP_MERGE:
+                    # If merge failed log lines, regard the failed log line as content, with empty headers
+                    message = ['' if header != "Content" else line.strip() for header in headers]
+                    log_messages.append(message)
+                elif self.failed_logs_option == FailLogsOption.APPEND_LINE:
+                    if len(log_messages) > 0:
+                        # IF has a prior log line, append to the end of line
+                        if not content_fragments:
+                            content_fragments.append(log_messages[-1][content_index])
+                        content_fragments.append(line.strip())
+                    else:
+                        # If first line failed
+                        message = ['' if header != "Content" else line.strip() for header in headers]
                         log_messages.append(message)
 
-                        # Dump saved failed lines
-                        if temp_line_list != []:
-                            # Add except extra
-                            self.failtomatchList += temp_line_list
-                            temp_line_list = []
-
-                        linecount += 1
-                        line_id_list_real.append(temp_linecount)
-
-                    except Exception as e:
-                        if self.failed_logs_option == FailLogsOption.CREATE_SEP:
-                            # Record lines that cannot be processed
-                            if temp_line_list == []:
-                                temp_line_list.append([str(temp_linecount), line.strip()])
-                            else:
-                                temp_line_list.append(['', line.strip()])
-                        elif self.failed_logs_option == FailLogsOption.REORDER_ATTACH:
-                            if temp_line_list == []:
-                                temp_line_list.append(str(temp_linecount) + ' ' + line.strip())
-                            else:
-                                temp_line_list[-1] += self.line_break + line.strip()
-                                #temp_line_list.append(line.strip())
-
-                        elif self.failed_logs_option == FailLogsOption.KEEP_MERGE:
-                            # If merge failed log lines, regard the failed log line as content, with empty headers
-                            message = ['' if header != "Content" else line.strip() for header in headers]
-                            log_messages.append(message)
-                        elif self.failed_logs_option == FailLogsOption.APPEND_LINE:
-
-
-                            content_index = headers.index("Content")
-                            if len(log_messages) > 0:
-                                # IF has a prior log line, append to the end of line
-                                log_messages[-1][content_index] += self.line_break + line.strip()
-                            else:
-                                # If first line failed
-                                message = ['' if header != "Content" else line.strip() for header in headers]
-                                log_messages.append(message)
-
-            fin.close()
-
-            # Final check if temp_line_text is empty
-            if temp_line_list != []:
+        if content_fragments:
+            log_messages[-1][content_index] = self.line_break.join(content_fragments)
+
+        # Final check if temp_line_text is empty
+        if temp_line_list != []:
+            if self.failed_logs_option == FailLogsOption.REORDER_ATTACH:
+                self.failtomatchList.append(self.line_break.join(temp_line_list))
+            else:
                 self.failtomatchList += temp_line_list
-                del temp_line_list
+            del temp_line_list
+
+        if self.failed_logs_option == FailLogsOption.REORDER_ATTACH:
+            for f_line in self.failtomatchList:
+                message = ['' if header != "Content" else f_line for header in headers]
+                log_messages.append(message)
+            # Clear
+            self.failtomatchList = []
 
+        self.line_count = temp_linecount
+
+        logdf = pd.DataFrame(log_messages, columns=headers)
+
+        return logdf
+
+    def log_to_columns(self, log_file, splitter, headers):
+        """
+        Streaming counterpart of log_to_dataframe: parse each line straight into one list per header
+        :param log_file:
+        :param splitter: LineSplitter of log_format
+        :param headers:
+        :return: list of columns, in the order of headers
+        """
+        return self.lines_to_columns(iter_lines(log_file), splitter, headers)
+
+    def lines_to_columns(self, lines, splitter, headers):
+        """
+        Parse lines into one list per header
+        :param lines: iterable of lines
+        :param splitter: LineSplitter of log_format
+        :param headers:
+        :return: list of columns, in the order of headers
+        """
+        columns = [[] for _ in headers]
+        content_index = headers.index("Content")
+        content_col = columns[content_index]
+        fail_list = []
+        temp_line_list = []
+        temp_linecount = 0
+        # Content of the last row and the failed lines appended to it, joined once the row is complete
+        content_fragments = []
+
+        for line in lines:
+            temp_linecount += 1
+            line = line.strip()
+            values = splitter.split(line)
+
+            if values is not None:
+                if content_fragments:
+                    content_col[-1] = self.line_break.join(content_fragments)
+                    content_fragments = []
+                for col, value in zip(columns, values):
+                    col.append('' if value is None else value)
+
+                # Dump saved failed lines
+                if temp_line_list != []:
+                    if self.failed_logs_option == FailLogsOption.REORDER_ATTACH:
+                        # Failed lines of one run, joined once
+                        fail_list.append(self.line_break.join(temp_line_list))
+                    else:
+                        fail_list += temp_line_list
+                    temp_line_list = []
+                continue
+
+            if self.failed_logs_option == FailLogsOption.CREATE_SEP:
+                if temp_line_list == []:
+                    temp_line_list.append([str(temp_linecount), line])
+                else:
+                    temp_line_list.append(['', line])
+            elif self.failed_logs_option == FailLogsOption.REORDER_ATTACH:
+                if temp_line_list == []:
+                    temp_line_list.append(str(temp_linecount) + ' ' + line)
+                else:
+                    temp_line_list.append(line)
+            elif self.failed_logs_option == FailLogsOption.APPEND_LINE and len(content_col) > 0:
+                # IF has a prior log line, append to the end of line
+                if not content_fragments:
+                    content_fragments.append(content_col[-1])
+                content_fragments.append(line)
+            else:
+                # KEEP_MERGE, or APPEND_LINE when the first line failed:
+                # regard the failed log line as content, with empty headers
+                for col in columns:
+                    col.append('')
+                content_col[-1] = line
+
+        if content_fragments:
+            content_col[-1] = self.line_break.join(content_fragments)
+
+        # Final check if temp_line_text is empty
+        if temp_line_list != []:
             if self.failed_logs_option == FailLogsOption.REORDER_ATTACH:
-                for f_line in self.failtomatchList:
-                    message = ['' if header != "Content" else f_line for header in headers]
-                    log_messages.append(message)
-                # Clear
-                self.failtomatchList = []
+                fail_list.append(self.line_break.join(temp_line_list))
+            else:
+                fail_list += temp_line_list
 
-            logdf = pd.DataFrame(log_messages, columns=headers)
+        if self.failed_logs_option == FailLogsOption.REORDER_ATTACH:
+            for f_line in fail_list:
+                for col in columns:
+                    col.append('')
+                content_col[-1] = f_line
+            fail_list = []
 
-            return logdf
-        except UnicodeDecodeError:
-            return self.log_to_dataframe(log_file, regex, headers, logformat, encode="ISO-8859-1")
+        self.failtomatchList = fail_list
+        self.line_count = temp_linecount
+        return columns
 
     def generate_logformat_regex(self, logformat):
         """ Function to generate regular expression to split log messages
         """
-        headers = []
-        splitters = re.split(r'(<[^<>]+>)', logformat)
-        regex = ''
-        for k in range(len(splitters)):
-            if k % 2 == 0:
-                splitter = re.sub(' +', '\\\s+', splitters[k])
-                regex += splitter
-            else:
-                header = splitters[k].strip('<').strip('>')
+        return generate_logformat_regex(logformat)
 
-                h_list = header.split(':')
-                if len(h_list) > 1:
-                    header = h_list[0]
-                    digit = h_list[1]
 
-                    regex += '(?P<%s>.{%s})' % (header, digit)
-                else:
-                    regex += '(?P<%s>.*?)' % header
-                headers.append(header)
-        regex = re.compile('^' + regex + '$')
-        return headers, regex
+# Template instance and output folder of the current worker process in encode_many
+_worker_lblock = None
+_worker_outdir = None
 
 
+def _init_encode_worker(lblock, outdir):
+    global _worker_lblock, _worker_outdir
+    _worker_lblock = lblock
+    _worker_outdir = outdir
+    # Pool workers cannot start their own pools
+    _worker_lblock.n_workers = 1
+
+
+def _encode_block(log_path, lblock=None, outdir=None):
+    if lblock is None:
+        lblock, outdir = _worker_lblock, _worker_outdir
+    out_dir = os.path.join(outdir, "bucket_" + os.path.basename(log_path).split('.')[0])
+    start_time = datetime.now()
+    lblock.set_block(log_path, out_dir)
+    lblock.run()
+    return out_dir, (datetime.now() - start_time).total_seconds()
+
+
+def encode_many(paths, log_format, outdir, workers=1, **kwargs):
+    """
+    Encode many log blocks with one LogBlock setup: the log format is compiled once (per worker),
+    and block folders outdir/bucket_<name> are reused instead of being removed and recreated
+    :param paths: paths of log blocks; file names (before the first '.') should be unique
+    :param log_format:
+    :param outdir:
+    :param workers: number of processes, 1 to encode in the current process
+    :param kwargs: other LogBlock settings, e.g. rex, disable_step
+    :return: list of (output folder, encoding time in seconds), in the order of paths
+    """
+    lblock = LogBlock(log_format=log_format, logName=None, outdir=outdir, isCleanOutdir=False, **kwargs)
+    lblock.compile_log_format()
+
+    if workers <= 1:
+        result = []
+        try:
+            for path in paths:
+                result.append(_encode_block(path, lblock, outdir))
+                lblock.first_line += lblock.line_count
+        finally:
+            lblock.close()
+        return result
+
+    pool = mp.Pool(processes=workers, initializer=_init_encode_worker, initargs=(lblock, outdir))
+    try:
+        # Batch small blocks to amortize inter-process overhead
+        result = pool.map(_encode_block, paths, chunksize=max(1, len(paths) // (workers * 4)))
+    finally:
+        pool.close()
+        pool.join()
+    if lblock.isZoneMap:
+        # Workers do not know the lines of the blocks before theirs, the zone maps are moved to their first line here
+        first_line = 0
+        for path, (out_dir, _) in zip(paths, result):
+            file_name = os.path.join(out_dir, os.path.basename(path) + '_zonemap.json')
+            zone = read_zone_map(file_name)
+            write_zone_map(file_name, zone._replace(first_line=first_line))
+            first_line += zone.line_count
+    return result
 
 if __name__ == '__main__':
 
@@ -0,0 +1,98 @@
+r"""
+Parse a log_format (e.g. '<Date> <Time> <Level> \[<Process>\] <Component>: <Content>') into literal and field parts,
+so that a structured log row can be rendered back to its log line
+"""
+import re
+
+LITERAL = 0
+FIELD = 1
+GROUP = 2
+
+
+class LogFormat:
+    def __init__(self, log_format):
+        self.log_format = log_format
+        self.headers = []
+        self.widths = {}
+        self.parts = self.parse(log_format)
+        # Formats without groups render with a single '%' substitution
+        self.template = None
+        if all(part[0] != GROUP for part in self.parts):
+            self.template = ''.join(part[1].replace('%', '%%') if part[0] == LITERAL else '%s' for part in self.parts)
+
+    def parse(self, log_format):
+        r"""
+        Build a tree of parts: (LITERAL, text), (FIELD, header) and (GROUP, parts, isOptional)
+        Literal text is the regex source of the format, so escapes like '\[' are unescaped and
+        groups like '(\[<PID>\])?' are kept as optional groups
+        :param log_format:
+        :return:
+        """
+        root = []
+        stack = [root]
+        splitters = re.split(r'(<[^<>]+>)', log_format)
+        for k in range(len(splitters)):
+            if k % 2 == 1:
+                h_list = splitters[k].strip('<').strip('>').split(':')
+                header = h_list[0]
+                if len(h_list) > 1:
+                    self.widths[header] = int(h_list[1])
+                stack[-1].append((FIELD, header))
+                self.headers.append(header)
+                continue
+
+            splitter = splitters[k]
+            i = 0
+            while i < len(splitter):
+                c = splitter[i]
+                if c == '\\' and i + 1 < len(splitter):
+                    stack[-1].append((LITERAL, splitter[i + 1]))
+                    i += 1
+                elif c == '(':
+                    group = []
+                    stack[-1].append([GROUP, group, False])
+                    stack.append(group)
+                elif c == ')' and len(stack) > 1:
+                    stack.pop()
+                    if splitter[i + 1:i + 2] == '?':
+                        # Mark the group we just closed as optional
+                        stack[-1][-1][2] = True
+                        i += 1
+                else:
+                    stack[-1].append((LITERAL, c))
+                i += 1
+        return root
+
+    def render(self, values):
+        """
+        Render a row to a log line
+        :param values: tuple of values, in the order of headers
+        :return:
+        """
+        if self.template is not None:
+            return self.template % tuple(values)
+        return ''.join(self._render_parts(self.parts, dict(zip(self.headers, values))))
+
+    def _render_parts(self, parts, row):
+        out = []
+        for part in parts:
+            if part[0] == LITERAL:
+                out.append(part[1])
+            elif part[0] == FIELD:
+                out.append(row[part[1]])
+            else:
+                sub = self._render_parts(part[1], row)
+                # An optional group that did not match leaves all of its fields empty
+                if part[2] and all(row[h] == '' for h in self._group_headers(part[1])):
+                    continue
+                out += sub
+        return out
+
+    def _group_headers(self, parts):
+        headers = []
+        for part in parts:
+            if part[0] == FIELD:
+                headers.append(part[1])
+            elif part[0] == GROUP:
+                headers += self._group_headers(part[1])
+        return headers
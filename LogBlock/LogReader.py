@@ -0,0 +1,91 @@
+"""
+Read the lines of a log file in one pass over its bytes
+Logs are mostly ASCII, with a few lines in UTF-8 or, in Mac and Windows logs, in a legacy 8-bit encoding.
+A file that is all ASCII is decoded at once. Otherwise it is decoded as UTF-8 in chunks of whole lines; when a chunk
+fails, only the line holding the offending byte is decoded as ISO-8859-1 and decoding goes on from the next line,
+so a single bad line neither fails the whole file nor turns its valid UTF-8 lines into ISO-8859-1.
+Lines break at '\n', '\r\n' and '\r', as in files opened in text mode.
+Files are read through mmap one chunk at a time by iter_lines, so only the chunk being decoded is held in memory.
+"""
+import mmap
+import os
+
+ENCODING = 'utf-8'
+FALLBACK_ENCODING = 'ISO-8859-1'
+
+# Bytes decoded at once, up to the end of a line
+CHUNK_SIZE = 1 << 16
+# Bytes of a mapped file copied and decoded at once by iter_lines, up to the end of a line
+READ_SIZE = 1 << 20
+
+
+def decode_text(data):
+    """
+    :param data: bytes of a log file
+    :return: str, each line decoded as UTF-8, or as ISO-8859-1 if it is not valid UTF-8
+    """
+    if data.isascii():
+        return data.decode('ascii')
+    pieces = []
+    start = 0
+    while start < len(data):
+        end = data.find(b'\n', start + CHUNK_SIZE)
+        end = len(data) if end == -1 else end + 1
+        try:
+            pieces.append(data[start:end].decode(ENCODING))
+            start = end
+            continue
+        except UnicodeDecodeError as e:
+            bad = start + e.start
+        # Lines before the offending one are valid, the offending line falls back, the next chunk starts after it
+        line_start = max(data.rfind(b'\n', start, bad) + 1, start)
+        line_end = data.find(b'\n', bad)
+        line_end = len(data) if line_end == -1 else line_end + 1
+        pieces.append(data[start:line_start].decode(ENCODING))
+        pieces.append(data[line_start:line_end].decode(FALLBACK_ENCODING))
+        start = line_end
+    return ''.join(pieces)
+
+
+def decode_lines(data):
+    """
+    :param data: bytes of a log file
+    :return: list of lines, without line breaks
+    """
+    if b'\r' in data:
+        data = data.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+    lines = decode_text(data).split('\n')
+    if lines[-1] == '':
+        # Text after the last line break, empty if the file ends with one
+        lines.pop()
+    return lines
+
+
+def read_lines(log_file):
+    """
+    :param log_file: path of a log file
+    :return: list of lines, without line breaks
+    """
+    with open(log_file, 'rb') as r:
+        return decode_lines(r.read())
+
+
+def iter_lines(log_file):
+    """
+    Lines of a log file, mapped in memory and decoded a chunk of lines at a time
+    :param log_file: path of a log file
+    :return: generator of lines, without line breaks
+    """
+    with open(log_file, 'rb') as r:
+        size = os.fstat(r.fileno()).st_size
+        if size == 0:
+            # An empty file cannot be mapped
+            return
+        with mmap.mmap(r.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            start = 0
+            while start < size:
+                # Chunks end after a '\n', so that no line, nor '\r\n', is cut
+                end = m.find(b'\n', start + READ_SIZE)
+                end = size if end == -1 else end + 1
+                yield from decode_lines(m[start:end])
+                start = end
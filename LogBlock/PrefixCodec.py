@@ -0,0 +1,107 @@
+"""
+Prefix codec for LogBlock step4
+Values are written without the prefix and suffix shared by the whole column (affix), or front-coded:
+each value keeps only what differs from the previous row, as 'shared length:rest'.
+Front coding catches local prefix sharing, e.g. Component or path columns, which one outlier hides from affixes.
+Each value is compared with the previous one by numpy, over its first COMPARE_WIDTH characters, CHUNK_ROWS rows at a
+time; only the pairs sharing all of them are compared further in Python.
+"""
+import re
+
+import numpy as np
+
+AFFIX_MARKER = re.compile(r'<affix:(\d+):(\d+)>')
+FRONT_MARKER = re.compile(r'<front:(\d+)>')
+
+# Characters and rows compared at once by shared_lengths, at most 4MB of code points
+COMPARE_WIDTH = 256
+CHUNK_ROWS = 4096
+
+
+def common_prefix_length(a, b):
+    # Binary search on slices, faster than comparing one character at a time
+    lo, hi = 0, min(len(a), len(b))
+    if a[:hi] == b[:hi]:
+        return hi
+    hi -= 1
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def shared_lengths(values):
+    """
+    :param values: list of str
+    :return: list of the length of the prefix each value shares with the previous one, the first one with ''
+    """
+    lengths = []
+    prev = ''
+    for start in range(0, len(values), CHUNK_ROWS):
+        rows = [prev] + values[start:start + CHUNK_ROWS]
+        sizes = np.fromiter(map(len, rows), dtype=np.int64, count=len(rows))
+        width = int(min(max(sizes.max(), 1), COMPARE_WIDTH))
+        # Code points of each row, cut or padded with zeros to width
+        codes = np.array(rows, dtype='<U%d' % width).view(np.uint32).reshape(len(rows), width)
+        differs = codes[1:] != codes[:-1]
+        shared = np.where(differs.any(axis=1), differs.argmax(axis=1), width)
+        shared = np.minimum(shared, np.minimum(sizes[1:], sizes[:-1]))
+        chunk = shared.tolist()
+        for i in np.flatnonzero(shared == COMPARE_WIDTH).tolist():
+            chunk[i] = common_prefix_length(rows[i], rows[i + 1])
+        lengths += chunk
+        prev = rows[-1]
+    return lengths
+
+
+def front_encode(values):
+    """
+    :param values: list of str
+    :return: list of (length shared with the previous value, rest)
+    """
+    return [(k, value[k:]) for k, value in zip(shared_lengths(values), values)]
+
+
+def front_decode(pairs):
+    values = []
+    prev = ''
+    for k, rest in pairs:
+        prev = prev[:k] + rest
+        values.append(prev)
+    return values
+
+
+def affix_marker(prefix, suffix):
+    return '<affix:%d:%d>%s%s' % (len(prefix), len(suffix), prefix, suffix)
+
+
+def front_marker(suffix):
+    return '<front:%d>%s' % (len(suffix), suffix)
+
+
+def parse_prefix_marker(head):
+    """
+    Read a step4 marker: <pre{prefix}/>, <affix:p:s>{prefix}{suffix} or <front:s>{suffix}, each followed by an optional E
+    :param head:
+    :return: (mode, prefix, suffix, isStartWithFail), mode being 'pre', 'affix' or 'front', or None
+    """
+    if head.startswith('<pre') and (head.endswith('/>') or head.endswith('/>E')):
+        isStartWithFail = head.endswith('E')
+        return 'pre', head[len('<pre'):head.rindex('/>')], '', isStartWithFail
+
+    m = AFFIX_MARKER.match(head)
+    if m is not None:
+        mode, p_len, s_len = 'affix', int(m.group(1)), int(m.group(2))
+    else:
+        m = FRONT_MARKER.match(head)
+        if m is None:
+            return None
+        mode, p_len, s_len = 'front', 0, int(m.group(1))
+
+    body = head[m.end():]
+    if len(body) - p_len - s_len not in (0, 1) or body[p_len + s_len:] not in ('', 'E'):
+        return None
+    return mode, body[:p_len], body[p_len:p_len + s_len], body[p_len + s_len:] == 'E'
@@ -0,0 +1,76 @@
+"""
+Keyword search over LogBlock blocks, skipping the blocks whose Bloom filter rules the term out
+A term is matched as whole tokens: 'blk_-1608999687919862906' or '10.251.42.84' match where they are not part of a
+longer alphanumeric run, so that every token of the term is a token of a matching line (see BloomFilter).
+Blocks of a segment are first pruned by their zone maps when a time range is given (see ZoneMap), then by their
+Bloom filter, and only the remaining blocks are decoded and scanned.
+"""
+import os
+import re
+
+from LogBlock.BloomFilter import term_tokens, read_bloom
+
+
+def term_pattern(term):
+    """
+    :param term:
+    :return: regex finding the term as whole tokens
+    """
+    return re.compile(r'(?<![a-zA-Z0-9])' + re.escape(term) + r'(?![a-zA-Z0-9])')
+
+
+def search_segment(reader, lblock, term, time_range=None):
+    """
+    :param reader: SegmentReader
+    :param lblock: LogBlock with the settings the blocks were encoded with
+    :param term:
+    :param time_range: (first, last) in milliseconds since the epoch, only blocks overlapping it are searched
+    :return: (list of (line number in the segment, line), dict of block counts)
+    """
+    tokens = term_tokens(term)
+    pattern = term_pattern(term)
+    candidates = reader.prune(time_range=time_range)
+    matches = []
+    skipped = 0
+    false_positives = 0
+    for index in candidates:
+        entry = reader.blocks[index]
+        if entry.bloom is not None and not entry.bloom.might_contain(tokens):
+            skipped += 1
+            continue
+        found = [(entry.first_line + k, line) for k, line in enumerate(reader.decode_block(index, lblock))
+                 if pattern.search(line)]
+        if not found and entry.bloom is not None:
+            false_positives += 1
+        matches += found
+    return matches, {
+        'Blocks': len(reader.blocks),
+        'Pruned': len(reader.blocks) - len(candidates),
+        'Skipped': skipped,
+        'Read': len(candidates) - skipped,
+        'FalsePositives': false_positives,
+    }
+
+
+def search_blocks(lblocks, term):
+    """
+    Search blocks written to folders, skipping those whose <logName>_bloom.bin rules the term out
+    :param lblocks: LogBlock of each block, pointing to its output folder
+    :param term:
+    :return: (list of (logName, line number in the block, line), dict of block counts)
+    """
+    tokens = term_tokens(term)
+    pattern = term_pattern(term)
+    matches = []
+    skipped = 0
+    for lblock in lblocks:
+        bloom_file = os.path.join(lblock.savePath, lblock.logName + '_bloom.bin')
+        if os.path.isfile(bloom_file) and not read_bloom(bloom_file).might_contain(tokens):
+            skipped += 1
+            continue
+        matches += [(lblock.logName, k, line) for k, line in enumerate(lblock.decode()) if pattern.search(line)]
+    return matches, {
+        'Blocks': len(lblocks),
+        'Skipped': skipped,
+        'Read': len(lblocks) - skipped,
+    }
@@ -0,0 +1,334 @@
+"""
+Segment file of many encoded LogBlock blocks
+
+Layout (little-endian):
+    header   magic 'LGSG' | version u8
+    blocks   binary containers (see BlockContainer), compressed or not, one after the other
+    footer   per block: offset u64 | length u64 | crc32 u32 | first line u64 | line count u32 |
+             has time u8 | first time i64 | last time i64 | codec |
+             column bounds count | per integer column: name | min | max (as decimal strings), from version 2 |
+             Bloom filter length | Bloom filter of the line tokens (see BloomFilter), from version 3
+    trailer  footer offset u64 | footer length u32 | footer crc32 u32 | block count u32 | magic 'LGSG'
+
+Blocks are appended as they are encoded and the footer is written once, on close, so a segment is written
+sequentially. A reader loads the footer with one seek from the end of the file, then reads any block with one
+more seek. Lines are numbered from 0 across the segment, times are milliseconds since the epoch.
+The footer doubles as the zone maps of the blocks, see ZoneMap.
+"""
+import bz2
+import io
+import lzma
+import os
+import struct
+import zlib
+from bisect import bisect_right
+from collections import Counter, namedtuple
+
+from LogBlock.Aggregate import merge_counts
+from LogBlock.BlockContainer import BlockContainerReader, ContainerError, write_str, read_str, write_varint, \
+    read_varint
+from LogBlock.ZoneMap import prune
+from LogBlock.BloomFilter import BloomFilter
+
+MAGIC = b'LGSG'
+VERSION = 3
+HEADER = struct.Struct('<4sB')
+BLOCK_ENTRY = struct.Struct('<QQIQIBqq')
+TRAILER = struct.Struct('<QIII4s')
+
+# Codec of a block: the binary container, compressed by one of COMPRESSORS
+CODEC_BINARY = 'bin'
+COMPRESSORS = {
+    'zlib': (zlib.compress, zlib.decompress),
+    'bz2': (bz2.compress, bz2.decompress),
+    'lzma': (lzma.compress, lzma.decompress),
+}
+
+BlockEntry = namedtuple('BlockEntry', ['offset', 'length', 'crc', 'first_line', 'line_count', 'time_range', 'codec',
+                                       'bounds', 'bloom'])
+
+
+def block_codec(compressor=None):
+    """
+    :param compressor: None, or a key of COMPRESSORS
+    :return: 'bin', 'bin+zlib'...
+    """
+    if compressor is None:
+        return CODEC_BINARY
+    if compressor not in COMPRESSORS:
+        raise ValueError('Unknown compressor %s' % compressor)
+    return CODEC_BINARY + '+' + compressor
+
+
+def write_footer(blocks):
+    out = bytearray()
+    for entry in blocks:
+        has_time = entry.time_range is not None
+        first_time, last_time = entry.time_range if has_time else (0, 0)
+        out += BLOCK_ENTRY.pack(entry.offset, entry.length, entry.crc, entry.first_line, entry.line_count,
+                                has_time, first_time, last_time)
+        write_str(out, entry.codec)
+        write_varint(out, len(entry.bounds))
+        for name, (low, high) in entry.bounds.items():
+            write_str(out, name)
+            write_str(out, str(low))
+            write_str(out, str(high))
+        bloom = entry.bloom.to_bytes() if entry.bloom is not None else b''
+        write_varint(out, len(bloom))
+        out += bloom
+    return bytes(out)
+
+
+def read_footer(buf, n_blocks, version=VERSION):
+    blocks = []
+    pos = 0
+    for _ in range(n_blocks):
+        offset, length, crc, first_line, line_count, has_time, first_time, last_time = \
+            BLOCK_ENTRY.unpack_from(buf, pos)
+        pos += BLOCK_ENTRY.size
+        codec, pos = read_str(buf, pos)
+        bounds = {}
+        if version >= 2:
+            n_bounds, pos = read_varint(buf, pos)
+            for _ in range(n_bounds):
+                name, pos = read_str(buf, pos)
+                low, pos = read_str(buf, pos)
+                high, pos = read_str(buf, pos)
+                bounds[name] = (int(low), int(high))
+        bloom = None
+        if version >= 3:
+            bloom_len, pos = read_varint(buf, pos)
+            if bloom_len:
+                bloom = BloomFilter.from_bytes(buf[pos:pos + bloom_len])
+            pos += bloom_len
+        blocks.append(BlockEntry(offset, length, crc, first_line, line_count,
+                                 (first_time, last_time) if has_time else None, codec, bounds, bloom))
+    return blocks
+
+
+def read_index(fin, file_name):
+    """
+    :param fin: segment file, opened in binary mode
+    :param file_name: for error messages
+    :return: (footer offset, list of BlockEntry)
+    """
+    fin.seek(0, os.SEEK_END)
+    if fin.tell() < HEADER.size + TRAILER.size:
+        raise ContainerError('%s is not a closed LogBlock segment' % file_name)
+    fin.seek(-TRAILER.size, os.SEEK_END)
+    footer_offset, footer_len, footer_crc, n_blocks, magic = TRAILER.unpack(fin.read(TRAILER.size))
+    if magic != MAGIC:
+        raise ContainerError('%s is not a closed LogBlock segment' % file_name)
+    fin.seek(0)
+    magic, version = HEADER.unpack(fin.read(HEADER.size))
+    if magic != MAGIC:
+        raise ContainerError('%s is not a LogBlock segment' % file_name)
+    if not 1 <= version <= VERSION:
+        raise ContainerError('Unsupported segment version %d' % version)
+    fin.seek(footer_offset)
+    footer = fin.read(footer_len)
+    if zlib.crc32(footer) != footer_crc:
+        raise ContainerError('Corrupted footer in %s' % file_name)
+    return footer_offset, read_footer(footer, n_blocks, version)
+
+
+class SegmentWriter:
+    def __init__(self, file_name, compressor=None, isAppend=False):
+        """
+        :param file_name:
+        :param compressor: None to store containers as they are, or a key of COMPRESSORS
+        :param isAppend: add blocks to an existing segment, its footer being written again on close
+        """
+        self.file_name = file_name
+        self.codec = block_codec(compressor)
+        self.compress = COMPRESSORS[compressor][0] if compressor is not None else None
+        self.blocks = []
+        if isAppend and os.path.isfile(file_name):
+            self.fout = open(file_name, 'r+b')
+            footer_offset, self.blocks = read_index(self.fout, file_name)
+            # The footer is written again in the current version
+            self.fout.seek(0)
+            self.fout.write(HEADER.pack(MAGIC, VERSION))
+            # New blocks overwrite the old footer
+            self.fout.seek(footer_offset)
+            self.fout.truncate()
+        else:
+            self.fout = open(file_name, 'wb')
+            self.fout.write(HEADER.pack(MAGIC, VERSION))
+        self.offset = self.fout.tell()
+
+    @property
+    def line_count(self):
+        if not self.blocks:
+            return 0
+        return self.blocks[-1].first_line + self.blocks[-1].line_count
+
+    def add_block(self, data, line_count, time_range=None, bounds=None, bloom=None):
+        """
+        Append an encoded block
+        :param data: bytes of a binary container
+        :param line_count: lines of the block
+        :param time_range: (first, last) time of the block in milliseconds since the epoch, or None
+        :param bounds: dict of column name -> (min, max) of its integers, see ZoneMap.column_bounds
+        :param bloom: BloomFilter of the line tokens of the block, or None
+        :return: index of the block in the segment
+        """
+        if self.compress is not None:
+            data = self.compress(data)
+        self.fout.write(data)
+        self.blocks.append(BlockEntry(self.offset, len(data), zlib.crc32(data), self.line_count, line_count,
+                                      time_range, self.codec, bounds or {}, bloom))
+        self.offset += len(data)
+        return len(self.blocks) - 1
+
+    def close(self):
+        footer = write_footer(self.blocks)
+        self.fout.write(footer)
+        self.fout.write(TRAILER.pack(self.offset, len(footer), zlib.crc32(footer), len(self.blocks), MAGIC))
+        self.fout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SegmentReader:
+    def __init__(self, file_name, cache=None):
+        """
+        :param file_name:
+        :param cache: BlockCache of decoded blocks, which may be shared by readers of many segments
+        """
+        self.file_name = file_name
+        self.cache = cache
+        self.fin = open(file_name, 'rb')
+        try:
+            _, self.blocks = read_index(self.fin, file_name)
+        except Exception:
+            self.fin.close()
+            raise
+        self.first_lines = [entry.first_line for entry in self.blocks]
+
+    def read_block(self, index):
+        """
+        Seek to one block and check it
+        :param index:
+        :return: bytes of its binary container
+        """
+        entry = self.blocks[index]
+        self.fin.seek(entry.offset)
+        data = self.fin.read(entry.length)
+        if zlib.crc32(data) != entry.crc:
+            raise ContainerError('Corrupted block %d in %s' % (index, self.file_name))
+        codec, _, compressor = entry.codec.partition('+')
+        if codec != CODEC_BINARY or (compressor and compressor not in COMPRESSORS):
+            raise ContainerError('Unsupported codec %s of block %d in %s' % (entry.codec, index, self.file_name))
+        if compressor:
+            data = COMPRESSORS[compressor][1](data)
+        return data
+
+    def open_block(self, index):
+        return BlockContainerReader(io.BytesIO(self.read_block(index)))
+
+    def decode_block(self, index, lblock):
+        """
+        :param index:
+        :param lblock: LogBlock with the settings the block was encoded with
+        :return: list of log lines of the block, shared with the cache if there is one
+        """
+        if self.cache is not None:
+            key = (os.path.realpath(self.file_name), index)
+            return self.cache.get(key, lambda: self.decode_uncached(index, lblock))
+        return self.decode_uncached(index, lblock)
+
+    def decode_uncached(self, index, lblock):
+        with self.open_block(index) as reader:
+            lblock.container = reader
+            try:
+                return lblock.decode()
+            finally:
+                lblock.container = None
+
+    def read_columns(self, index, lblock, names, output_ext='_trans_file.txt'):
+        """
+        Decode some columns of a block, see LogBlock.read_columns
+        Each column is cached on its own, keyed by (segment path, block index, frame, name)
+        :param index:
+        :param lblock: LogBlock with the settings the block was encoded with
+        :param names: e.g. ['Level', 'Component']
+        :param output_ext:
+        :return: dict of name -> decoded column, shared with the cache if there is one
+        """
+        columns = {}
+        if self.cache is not None:
+            path = os.path.realpath(self.file_name)
+            for name in names:
+                column = self.cache.get((path, index, output_ext, name))
+                if column is not None:
+                    columns[name] = column
+        missing = [name for name in names if name not in columns]
+        if missing:
+            with self.open_block(index) as reader:
+                decoded = lblock.read_container_columns(reader, missing, output_ext)
+            if decoded is None:
+                return None
+            if self.cache is not None:
+                for name, column in decoded.items():
+                    self.cache.put((path, index, output_ext, name), column)
+            columns.update(decoded)
+        return {name: columns[name] for name in names}
+
+    def group_count(self, lblock, name, blocks=None, output_ext='_trans_file.txt'):
+        """
+        Count the rows of each value of a column over blocks of the segment, see LogBlock.group_count
+        A column decoded in the cache is counted from there, other blocks from their encoding
+        :param lblock: LogBlock with the settings the blocks were encoded with
+        :param name: e.g. 'Level'
+        :param blocks: indices of the blocks, all blocks by default
+        :param output_ext:
+        :return: Counter of values
+        """
+        counts_list = []
+        for index in range(len(self.blocks)) if blocks is None else blocks:
+            column = None
+            if self.cache is not None:
+                # Counting does not fill the cache, so neither a hit nor a miss
+                column = self.cache.peek((os.path.realpath(self.file_name), index, output_ext, name))
+            if column is not None:
+                counts_list.append(Counter(column))
+                continue
+            with self.open_block(index) as reader:
+                counts = lblock.container_group_count(reader, name, output_ext)
+            if counts is not None:
+                counts_list.append(counts)
+        return merge_counts(counts_list)
+
+    def prune(self, time_range=None, line_range=None, columns=None):
+        """
+        Blocks that may hold lines within all the ranges, from the zone maps of the footer, see ZoneMap.may_match
+        :param time_range: (first, last) in milliseconds since the epoch, either may be None
+        :param line_range: (first, last) line of the segment, either may be None
+        :param columns: dict of integer column name -> (low, high), e.g. {'Pid': (100, 200)}
+        :return: list of block indices
+        """
+        return prune(self.blocks, time_range, line_range, columns)
+
+    def find_line(self, line):
+        """
+        :param line: line number in the segment, from 0
+        :return: index of the block holding it, or None
+        """
+        index = bisect_right(self.first_lines, line) - 1
+        if index < 0 or line >= self.blocks[index].first_line + self.blocks[index].line_count:
+            return None
+        return index
+
+    def close(self):
+        self.fin.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,335 @@
+"""
+Timestamp codec for LogBlock
+Headers holding the parts of a timestamp, split (<Year:4>-<Month:2>-<Day:2> <Hour:2>:<Minute:2>...) or as strings
+(<Date> <Time> with values like '2015-10-18' '18:01:47,978'), are grouped from the header names and turned into one
+integer stream of time units since the epoch, ready for delta encoding.
+Every column of a group keeps a printf layout, and a group is only used if all rows render back to their exact text.
+"""
+import re
+from collections import defaultdict
+
+import numpy as np
+
+from LogBlock.IntegerCodec import parse_integers
+
+ROLES = ['Year', 'Month', 'Day', 'Hour', 'Minute', 'Second', 'Millisecond']
+MONTH_NAME = 'MonthName'
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+# Parts missing from a group, 2000 is a leap year so that Feb 29 is valid without a year
+DEFAULTS = {'Year': 2000, 'Month': 1, 'Day': 1, 'Hour': 0, 'Minute': 0, 'Second': 0, 'Millisecond': 0}
+
+# Bounds of each part, checked before building the stream so that it cannot overflow int64
+LIMITS = {'Year': (0, 9999), 'Month': (1, 12), 'Day': (1, 31), 'Hour': (0, 23), 'Minute': (0, 59), 'Second': (0, 59),
+          'Millisecond': (0, 10 ** 9)}
+MAX_UNIT = 9
+# Longest span of each part in milliseconds, a month of 31 days and a leap year
+PART_MILLIS = {'Year': 366 * 86400000, 'Month': 31 * 86400000, 'Day': 86400000, 'Hour': 3600000, 'Minute': 60000,
+               'Second': 1000}
+
+# <DYear:4>, <Month1:2>..., grouped by what surrounds the part name
+SPLIT_HEADER = re.compile(r'(.*?)(%s)(.*)' % '|'.join(ROLES))
+# Headers holding a date and/or a time as a string, grouped together
+STRING_HEADERS = ['Date', 'Time']
+
+
+class TimeGroup:
+    def __init__(self, cols, layouts, unit, nulls, units):
+        """
+        :param cols: column indices of the group, the first one holds the stream
+        :param layouts: [fmt, roles] per column
+        :param unit: number of digits of the fraction of a second
+        :param nulls: row indices where all columns of the group are empty
+        :param units: numpy int64 array of time units since the epoch, one per non-empty row
+        """
+        self.cols = cols
+        self.layouts = layouts
+        self.unit = unit
+        self.nulls = nulls
+        self.units = units
+
+    def spec(self, order):
+        return {'order': order, 'unit': self.unit, 'layouts': self.layouts}
+
+
+def days_from_civil(y, m, d):
+    # Days since 1970-01-01 of a proleptic Gregorian date, on numpy arrays
+    y = y - (m <= 2)
+    era = y // 400
+    yoe = y - era * 400
+    doy = (153 * np.where(m > 2, m - 3, m + 9) + 2) // 5 + d - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def civil_from_days(days):
+    z = days + 719468
+    era = z // 146097
+    doe = z - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    d = doy - (153 * mp + 2) // 5 + 1
+    m = np.where(mp < 10, mp + 3, mp - 9)
+    return yoe + era * 400 + (m <= 2), m, d
+
+
+def compose(parts, unit):
+    """
+    :param parts: dict of role -> numpy int64 array
+    :param unit:
+    :return: time units since the epoch
+    """
+    get = lambda role: parts[role] if role in parts else DEFAULTS[role]
+    days = days_from_civil(get('Year'), get('Month'), get('Day'))
+    seconds = ((days * 24 + get('Hour')) * 60 + get('Minute')) * 60 + get('Second')
+    return seconds * 10 ** unit + get('Millisecond')
+
+
+def decompose(units, unit):
+    seconds, fraction = np.divmod(units, 10 ** unit)
+    minutes, second = np.divmod(seconds, 60)
+    hours, minute = np.divmod(minutes, 60)
+    days, hour = np.divmod(hours, 24)
+    year, month, day = civil_from_days(days)
+    return {'Year': year, 'Month': month, 'Day': day, 'Hour': hour, 'Minute': minute, 'Second': second,
+            'Millisecond': fraction}
+
+
+def to_millis(units, unit):
+    """
+    :param units: time units since the epoch
+    :param unit: number of digits of the fraction of a second
+    :return: milliseconds since the epoch
+    """
+    if unit >= 3:
+        return units // 10 ** (unit - 3)
+    return units * 10 ** (3 - unit)
+
+
+def group_roles(group):
+    # Parts of the timestamp held by a group, month names counting as months
+    return {'Month' if role == MONTH_NAME else role for _, roles in group.layouts for role in roles}
+
+
+def time_range(groups):
+    """
+    :param groups: TimeGroup of a frame
+    :return: (first, last) time in milliseconds since the epoch, from the group with a year having the most columns,
+    or None if no group has a year (e.g. '<Month> <Day> <Time>', whose default year would give wrong times);
+    years of two digits are taken as 20xx, and last is the end of its finest part, e.g. of its day for a date
+    """
+    groups = [group for group in groups if len(group.units) and 'Year' in group_roles(group)]
+    if not groups:
+        return None
+    group = max(groups, key=lambda x: len(x.cols))
+    bounds = np.array([group.units.min(), group.units.max()], dtype=np.int64)
+    parts = decompose(bounds, group.unit)
+    if parts['Year'].max() < 100:
+        # Two-digit years, e.g. 081109 in HDFS
+        parts['Year'] = parts['Year'] + 2000
+        bounds = compose(parts, group.unit)
+    first, last = to_millis(bounds, group.unit).tolist()
+    finest = max(ROLES.index(role) for role in group_roles(group))
+    if ROLES[finest] == 'Millisecond':
+        last += max(10 ** (3 - group.unit), 1) - 1
+    else:
+        last += PART_MILLIS[ROLES[finest]] - 1
+    return first, last
+
+
+def string_slots(header, sample):
+    """
+    Roles of the digit runs of a date/time string, a run like '081109' being split into fixed-width parts
+    :param header: 'Date' or 'Time'
+    :param sample: one value of the column
+    :return: (literals, slots), a slot being a list of (role, width or 0) per digit run, or None
+    """
+    pieces = re.split(r'(\d+)', sample)
+    literals, runs = pieces[0::2], pieces[1::2]
+    lens = [len(x) for x in runs]
+    ymd = [[('Year', 0)], [('Month', 0)], [('Day', 0)]]
+    hms = [[('Hour', 0)], [('Minute', 0)], [('Second', 0)], [('Millisecond', 0)]]
+
+    if header == 'Date':
+        if lens in ([6], [8]):
+            return literals, [[('Year', lens[0] - 4), ('Month', 2), ('Day', 2)]]
+        if len(runs) == 3:
+            return literals, ymd
+        if lens in ([1], [2]):
+            return literals, [[('Day', 0)]]
+        return None
+
+    if lens == [6]:
+        return literals, [[('Hour', 2), ('Minute', 2), ('Second', 2)]]
+    if len(runs) in (3, 4):
+        return literals, hms[:len(runs)]
+    if lens[:1] == [8] and len(runs) in (4, 5):
+        return literals, [[('Year', 4), ('Month', 2), ('Day', 2)]] + hms[:len(runs) - 1]
+    if len(runs) in (6, 7):
+        return literals, ymd + hms[:len(runs) - 3]
+    return None
+
+
+def parse_column(header, role, col_list):
+    """
+    Find the printf layout of a column and parse its parts
+    :param header:
+    :param role: role of a split header, None for a date/time string
+    :param col_list:
+    :return: (fmt, roles, lookup), lookup giving the int tuple of the parts of each distinct value, or None
+    """
+    keys = [x for x in dict.fromkeys(col_list) if x != '']
+    if not keys:
+        return None
+
+    if role is not None:
+        if role == 'Month' and all(x in MONTHS for x in keys):
+            return '%s', [MONTH_NAME], {x: (MONTHS.index(x) + 1,) for x in keys}
+        parsed = parse_integers(keys)
+        if parsed is None:
+            return None
+        ints, template = parsed
+        return template, [role], {x: (n,) for x, n in zip(keys, ints)}
+
+    found = string_slots(header, keys[0])
+    if found is None:
+        return None
+    literals, slots = found
+    regex = re.compile(''.join(
+        re.escape(literals[k]) + ''.join(r'(\d{%d})' % w if w else r'(\d+)' for _, w in slots[k])
+        for k in range(len(slots))) + re.escape(literals[-1]))
+    roles = [role for slot in slots for role, _ in slot]
+
+    matches = [regex.fullmatch(x) for x in keys]
+    if any(m is None for m in matches):
+        return None
+    fields = list(zip(*[m.groups() for m in matches]))
+    templates = []
+    for field in fields:
+        parsed = parse_integers(list(dict.fromkeys(field)))
+        if parsed is None:
+            return None
+        templates.append(parsed[1])
+
+    fmt = ''
+    k = 0
+    for literal, slot in zip(literals, slots):
+        fmt += literal.replace('%', '%%') + ''.join(templates[k + x] for x in range(len(slot)))
+        k += len(slot)
+    fmt += literals[-1].replace('%', '%%')
+    return fmt, roles, {x: tuple(int(v) for v in m.groups()) for x, m in zip(keys, matches)}
+
+
+def find_time_groups(names, col_lists):
+    """
+    Group the columns holding parts of a timestamp, and turn each group into a stream of time units
+    A group is kept only if every row renders back to its original text
+    :param names: column names, usually the headers of log_format
+    :param col_lists: columns, list of str each
+    :return: list of TimeGroup
+    """
+    candidates = defaultdict(list)
+    for i, name in enumerate(names):
+        m = SPLIT_HEADER.fullmatch(name)
+        if m is not None:
+            key, role = m.group(1) + m.group(3), m.group(2)
+        elif name in STRING_HEADERS:
+            key, role = '', None
+        else:
+            continue
+        parsed = parse_column(name, role, col_lists[i])
+        if parsed is not None:
+            candidates[key].append((i, parsed))
+
+    groups = []
+    for members in candidates.values():
+        # Columns with more parts first, a part of a timestamp can only come from one column
+        members.sort(key=lambda x: -len(x[1][1]))
+        taken = set()
+        chosen = []
+        for i, (fmt, roles, parts) in members:
+            plain = {'Month' if r == MONTH_NAME else r for r in roles}
+            if plain & taken:
+                continue
+            taken |= plain
+            chosen.append((i, fmt, roles, parts))
+        chosen.sort()
+
+        group = build_group(chosen, col_lists)
+        if group is not None:
+            groups.append(group)
+    return groups
+
+
+def build_group(chosen, col_lists):
+    """
+    Turn the chosen columns of a group into a stream of time units
+    Each distinct value renders back from its parts (checked by parse_column), so a row renders back exactly
+    if its parts come back from the stream, which fails for parts out of range like a second 60 or Feb 30
+    :param chosen: list of (column index, fmt, roles, lookup)
+    :param col_lists:
+    :return: TimeGroup, or None
+    """
+    tables = []
+    unit = 0
+    for i, fmt, roles, lookup in chosen:
+        table = np.array(list(lookup.values()), dtype=np.int64)
+        for k, role in enumerate(roles):
+            low, high = LIMITS['Month' if role == MONTH_NAME else role]
+            if table[:, k].min() < low or table[:, k].max() > high:
+                return None
+        if 'Millisecond' in roles:
+            # The fraction is always the last digit run, its longest width gives the unit
+            unit = max(len(re.findall(r'\d+', x)[-1]) for x in lookup)
+            if unit > MAX_UNIT:
+                return None
+        tables.append(table)
+
+    parts = {}
+    empty = None
+    for (i, fmt, roles, lookup), table in zip(chosen, tables):
+        index = dict(zip(lookup, range(len(lookup))))
+        index[''] = len(lookup)
+        codes = np.array(list(map(index.__getitem__, col_lists[i])))
+        # Rows must be empty in all columns of the group or in none
+        mask = codes == len(lookup)
+        if empty is None:
+            empty = mask
+        elif not np.array_equal(mask, empty):
+            return None
+        rows = table[codes[~mask]]
+        for k, role in enumerate(roles):
+            parts['Month' if role == MONTH_NAME else role] = rows[:, k]
+
+    if empty.all():
+        return None
+    units = compose(parts, unit)
+    back = decompose(units, unit)
+    if any(not np.array_equal(back[role], values) for role, values in parts.items()):
+        return None
+    layouts = [[fmt, roles] for _, fmt, roles, _ in chosen]
+    return TimeGroup([i for i, _, _, _ in chosen], layouts, unit, np.flatnonzero(empty).tolist(), units)
+
+
+def render(spec, nulls, units):
+    """
+    Render the columns of a group back from the stream
+    :param spec: as written by TimeGroup.spec
+    :param nulls: row indices where all columns are empty
+    :param units: numpy array or list of time units, one per non-empty row
+    :return: list of columns
+    """
+    parts = decompose(np.asarray(units, dtype=np.int64), spec['unit'])
+    parts = {k: v.tolist() for k, v in parts.items()}
+    parts[MONTH_NAME] = [MONTHS[x - 1] for x in parts['Month']]
+
+    null_set = set(nulls)
+    n = len(units) + len(nulls)
+    columns = []
+    for fmt, roles in spec['layouts']:
+        values = [fmt % args for args in zip(*[parts[r] for r in roles])]
+        if nulls:
+            it = iter(values)
+            values = ['' if k in null_set else next(it) for k in range(n)]
+        columns.append(values)
+    return columns
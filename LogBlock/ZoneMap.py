@@ -0,0 +1,85 @@
+"""
+Zone maps of LogBlock blocks, and a pruner skipping the blocks a query cannot match
+The zone map of a block is its line range, its (first, last) time in milliseconds since the epoch and the (min, max)
+of each integer column, e.g. Pid, found from the distinct values of the columns while they are encoded.
+Segments keep the zone maps in their footer (see Segment); blocks written to a folder keep them in a
+<logName>_zonemap.json sidecar when LogBlock(isZoneMap=True).
+A block missing a bound is never skipped on it.
+"""
+import json
+from collections import namedtuple
+
+from LogBlock.IntegerCodec import parse_integers
+
+# Same fields as Segment.BlockEntry, so that prune() takes both
+Zone = namedtuple('Zone', ['first_line', 'line_count', 'time_range', 'bounds'])
+
+
+def column_bounds(col_lists, names):
+    """
+    :param col_lists: columns of a frame
+    :param names: column names
+    :return: dict of name -> (min, max) of the integer columns, empty rows (failed lines) left out; Content is skipped
+    """
+    bounds = {}
+    for col_list, name in zip(col_lists, names):
+        if name == 'Content' or name.startswith('Content_'):
+            continue
+        keys = [x for x in dict.fromkeys(col_list) if x != '']
+        parsed = parse_integers(keys) if keys else None
+        if parsed is not None:
+            bounds[name] = (min(parsed[0]), max(parsed[0]))
+    return bounds
+
+
+def overlaps(bounds, low, high):
+    """
+    :param bounds: (min, max) of a block, or None if unknown
+    :param low: None for no lower bound
+    :param high: None for no upper bound
+    :return: False if no value of the block can be within [low, high]
+    """
+    if bounds is None:
+        return True
+    return (low is None or bounds[1] >= low) and (high is None or bounds[0] <= high)
+
+
+def may_match(zone, time_range=None, line_range=None, columns=None):
+    """
+    :param zone: Zone or Segment.BlockEntry
+    :param time_range: (first, last) in milliseconds since the epoch, either may be None
+    :param line_range: (first, last) line, from 0, either may be None
+    :param columns: dict of name -> (low, high), either may be None
+    :return: False if the block holds no line within all the ranges
+    """
+    if line_range is not None:
+        last_line = zone.first_line + zone.line_count - 1
+        if not overlaps((zone.first_line, last_line), *line_range):
+            return False
+    if time_range is not None and not overlaps(zone.time_range, *time_range):
+        return False
+    for name, (low, high) in (columns or {}).items():
+        if not overlaps(zone.bounds.get(name), low, high):
+            return False
+    return True
+
+
+def prune(zones, time_range=None, line_range=None, columns=None):
+    """
+    :param zones: list of Zone or Segment.BlockEntry
+    :return: indices of the blocks that may hold matching lines
+    """
+    return [i for i, zone in enumerate(zones) if may_match(zone, time_range, line_range, columns)]
+
+
+def write_zone_map(file_name, zone):
+    with open(file_name, 'w') as w:
+        json.dump(zone._asdict(), w)
+
+
+def read_zone_map(file_name):
+    with open(file_name, 'r') as r:
+        zone = json.load(r)
+    return Zone(zone['first_line'], zone['line_count'],
+                tuple(zone['time_range']) if zone['time_range'] is not None else None,
+                {name: tuple(bounds) for name, bounds in zone['bounds'].items()})
@@ -46,6 +46,18 @@ def _getAllFiles(folder, ext='.log', removeList= [], start=None):
         return [x for x in files_list if x not in removeList]
 
 
+def parse_size(size):
+    """
+    Convert a size like '16K' to bytes
+    :param size:
+    :return:
+    """
+    level = ['B', 'K', 'M', 'G']
+    if size[-1] in level:
+        return int(float(size[:-1]) * pow(1024, level.index(size[-1])))
+    return int(size)
+
+
 def run_async(func):
     """
     Run function in parallel
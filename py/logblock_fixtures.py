@@ -0,0 +1,41 @@
+"""
+Formats, generated lines and helpers shared by the LogBlock tests
+"""
+import contextlib
+import io
+
+HADOOP_FORMAT = r'<Date> <Time> <Level> \[<Process>\] <Component>: <Content>'
+# Month and day only, as Android logs
+ANDROID_FORMAT = '<Date> <Time>  <Pid>  <Tid> <Level> <Component>: <Content>'
+THUNDERBIRD_FORMAT = r'<Label> <Timestamp> <DYear:4>.<DMonth:2>.<DDay:2> <User> <Month> <Day> <Hour:2>:<Minute:2>:<Second:2> <Location> <Component>(\[<PID>\])?: <Content>'
+# 2015-10-18 18:00:00 UTC
+START_MILLIS = 1445191200000
+
+
+def hadoop_lines(n=600):
+    """
+    Lines of HADOOP_FORMAT one second apart, each with its own block id, every 50th followed by a stack trace line
+    """
+    lines = []
+    for i in range(n):
+        minute, second = divmod(i, 60)
+        level = 'WARN' if i % 7 == 0 else 'INFO'
+        component = ['org.apache.hadoop.mapreduce.v2.app.MRAppMaster', 'org.apache.hadoop.ipc.Server'][i % 2]
+        lines.append('2015-10-18 18:%02d:%02d,%03d %s [main] %s: Served block blk_%d to /10.190.%d.%d'
+                     % (minute, second, i % 1000, level, component, 7000000 + i * 13, i % 256, (i * 7) % 256))
+        if i % 50 == 49:
+            lines.append('java.io.IOException: Connection reset by peer %d' % i)
+    return lines
+
+
+def android_lines(n=600):
+    """
+    Lines of ANDROID_FORMAT, Pid rising by one every 20 lines
+    """
+    return ['03-17 16:%02d:%02d.%03d  %d  %d D PowerManagerService: acquire lock=%d, flags=0x1'
+            % (i // 60 % 60, i % 60, i % 1000, 1000 + i // 20, 2000 + i % 7, 233570404 + i) for i in range(n)]
+
+
+def quiet(func, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
@@ -986,7 +986,7 @@ def generate_random_chunk(path, repeat, dataset, temp_dir='../temp', chunkSize='
 
 @elpased_time
 def logblock(dataset, setting, output_root_dir, compressor, chunkSizeList, isDisable = False, repeat=100):
-    from LogBlock.LogBlock import LogBlock
+    from LogBlock.LogBlock import LogBlock, encode_many
 
     dict_list = []
 
@@ -1001,22 +1001,21 @@ def logblock(dataset, setting, output_root_dir, compressor, chunkSizeList, isDis
 
         log_path_list = generate_random_chunk(path=original_log_path, repeat=repeat, dataset=dataset, chunkSize=chunkSize)
 
+        if not isDisable:
+            # Encode all chunks with one LogBlock setup, in this process to capture time info
+            # Output folders are the same as creating one LogBlock per chunk
+            encoded_chunks = dict(zip(log_path_list, encode_many(
+                log_path_list,
+                log_format=setting['log_format'],
+                outdir=os.path.sep.join([output_root_dir, 'bucket_%s_%s' % (dataset, chunkSize)]),
+                rex=setting['regex'],
+            )))
+
         for logpath in log_path_list:
 
             if not isDisable:
 
-                out_dir = os.path.sep.join([output_root_dir, 'bucket_%s_%s' % (dataset, chunkSize),
-                                            "bucket_" + ntpath.basename(logpath).split('.')[0]])
-                # Generate a random chunk
-                lblock = LogBlock(
-                    log_format=setting['log_format'],
-                    indir=os.path.dirname(logpath),
-                    logName=os.path.basename(logpath),
-                    outdir=out_dir,
-                    rex=setting['regex'],
-                )
-
-                prep_time = cmd_execute_time(lblock.run)
+                out_dir, prep_time = encoded_chunks[logpath]
 
                 # Compress from here
                 d = get_compress_info(
@@ -1043,8 +1042,8 @@ def logblock(dataset, setting, output_root_dir, compressor, chunkSizeList, isDis
                     dict_list.append(d)
 
             else:
-                # From step1 to step4
-                for step in range(0, 5):
+                # From step1 to step5
+                for step in range(0, 6):
 
                     if step == 0:
                         skip_step = None
@@ -0,0 +1,59 @@
+"""
+Tail a live log and encode it into LogBlock blocks as they are sealed, see LogBlock/BlockSealer.py
+
+Read a log from stdin, sealing 16K blocks and any block open for 5 seconds:
+    tail -F /var/log/app.log | python main_logblock_sealer.py --format '<Date> <Time> <Level> <Component>: <Content>' --block_size 16K --deadline 5
+Follow a growing file instead, as tail -f:
+    python main_logblock_sealer.py --log /var/log/app.log --follow --format '<Date> <Time> <Level> <Component>: <Content>'
+Append the blocks to a segment file instead of one folder per block:
+    python main_logblock_sealer.py --log app.log --segment app.lgs --compressor lzma --format '<Date> <Time> <Level> <Component>: <Content>'
+Keep a Bloom filter of the tokens of the lines of each block, for main_logblock_search.py:
+    python main_logblock_sealer.py --log app.log --segment app.lgs --bloom_fpr 0.01 --format '<Date> <Time> <Level> <Component>: <Content>'
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from LogBlock.LogBlock import OutputFormat
+from LogBlock.BlockSealer import BlockSealer, read_chunks, split_lines
+from LogBlock.Segment import COMPRESSORS
+from py.Util import parse_size
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--log', type=str, default=None, help='log file to read, stdin by default')
+    parser.add_argument('--format', type=str, required=True, help='log_format of the log')
+    parser.add_argument('--outdir', type=str, default='../result/sealed')
+    parser.add_argument('--name', type=str, default='block', help='blocks are named name_0, name_1...')
+    parser.add_argument('--block_size', type=str, default='16K', help='byte budget of a block, e.g. 8K, 16K, 128K')
+    parser.add_argument('--deadline', type=float, default=None, help='seconds after which a block that is not full is sealed')
+    parser.add_argument('--poll', type=float, default=0.5, help='seconds to wait for new lines before checking the deadline')
+    parser.add_argument('--follow', action='store_true', help='keep reading lines appended to --log')
+    parser.add_argument('--binary', action='store_true', help='write one binary container per block')
+    parser.add_argument('--segment', type=str, default=None, help='segment file to append the blocks to')
+    parser.add_argument('--compressor', type=str, default=None, choices=sorted(COMPRESSORS), help='compressor of the blocks in the segment')
+    parser.add_argument('--bloom_fpr', type=float, default=None, help='false-positive rate of a Bloom filter of the line tokens of each block, e.g. 0.01')
+    args = parser.parse_args()
+
+    sealer = BlockSealer(
+        log_format=args.format,
+        outdir=args.outdir,
+        block_size=parse_size(args.block_size),
+        deadline=args.deadline,
+        name=args.name,
+        segment=args.segment,
+        compressor=args.compressor,
+        output_format=OutputFormat.BINARY if args.binary else OutputFormat.TEXT,
+        bloom_fpr=args.bloom_fpr,
+    )
+    log_file = open(args.log, 'rb') if args.log is not None else sys.stdin.buffer
+    try:
+        sealer.feed(split_lines(read_chunks(log_file.fileno(), args.poll, args.follow)))
+    except KeyboardInterrupt:
+        # Seal the lines read so far
+        sealer.close()
+    finally:
+        if args.log is not None:
+            log_file.close()
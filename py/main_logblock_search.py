@@ -0,0 +1,39 @@
+"""
+Search a LogBlock segment for a term, skipping the blocks whose Bloom filter or time range rules it out,
+see LogBlock/Search.py
+
+Find the lines of an HDFS block id in a segment sealed with --bloom_fpr:
+    python main_logblock_search.py --segment hdfs.lgs --term blk_-1608999687919862906 --format '<Date> <Time> <Pid> <Level> <Component>: <Content>'
+Only within a time range, in milliseconds since the epoch:
+    python main_logblock_search.py --segment hdfs.lgs --term 10.251.42.84 --first 1226262995000 --last 1226263013000 --format '<Date> <Time> <Pid> <Level> <Component>: <Content>'
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from LogBlock.LogBlock import LogBlock
+from LogBlock.Segment import SegmentReader
+from LogBlock.Search import search_segment
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--segment', type=str, required=True, help='segment file written by main_logblock_sealer.py')
+    parser.add_argument('--format', type=str, required=True, help='log_format the segment was sealed with')
+    parser.add_argument('--term', type=str, required=True, help='term to find, as whole tokens')
+    parser.add_argument('--first', type=int, default=None, help='first time to search, in milliseconds since the epoch')
+    parser.add_argument('--last', type=int, default=None, help='last time to search, in milliseconds since the epoch')
+    args = parser.parse_args()
+
+    time_range = None
+    if args.first is not None or args.last is not None:
+        time_range = (args.first, args.last)
+    lblock = LogBlock(log_format=args.format, logName=None, isCleanOutdir=False)
+    with SegmentReader(args.segment) as reader:
+        matches, stats = search_segment(reader, lblock, args.term, time_range)
+    for line_number, line in matches:
+        print('%d: %s' % (line_number, line))
+    print('[END] %d lines found, %d of %d blocks read, %d pruned by time, %d skipped by Bloom filter, '
+          '%d false positives' % (len(matches), stats['Read'], stats['Blocks'], stats['Pruned'], stats['Skipped'],
+                                  stats['FalsePositives']), file=sys.stderr)
@@ -0,0 +1,507 @@
+"""
+Throughput benchmarks for LogBlock
+
+decode: cut blocks of each size from a log file, encode them, and measure the decode MB/s per block size
+    python main_logblock_throughput.py decode --log ../logs/HDFS/HDFS_2k.log --format '<Date> <Time> <Pid> <Level> <Component>: <Content>'
+parse: split every line of a log file with the log_format regex and with LineSplitter, and measure the MB/s of each
+    python main_logblock_throughput.py parse --log ../logs/HDFS/HDFS_2k.log --format '<Date> <Time> <Pid> <Level> <Component>: <Content>'
+trace: generate logs whose records carry Java stack traces of each length, and measure how fast LogBlock loads them
+with the failed lines of a trace appended to its record (APPEND_LINE) or moved to the end (REORDER_ATTACH)
+    python main_logblock_throughput.py trace --trace_lines 100,1000,5000
+columns: encode blocks of each size in the binary container, and compare decoding whole blocks with decoding only
+the --columns given
+    python main_logblock_throughput.py columns --log ../logs/HDFS/HDFS_2k.log --format '<Date> <Time> <Pid> <Level> <Component>: <Content>' --columns Level,Component
+aggregate: seal a log into a segment of 16K blocks, then count the rows of each value of the --columns over all
+blocks, from the encoded columns and by decoding them
+    python main_logblock_throughput.py aggregate --log ../logs/HDFS/HDFS_2k.log --format '<Date> <Time> <Pid> <Level> <Component>: <Content>' --columns Level,Component
+prune: seal a log into a segment of 16K blocks, then count the blocks a query on random time windows of each width
+in seconds has to decode once the zone maps of the footer have pruned the others
+    python main_logblock_throughput.py prune --log ../logs/Hadoop/Hadoop_2k.log --format '<Date> <Time> <Level> \[<Process>\] <Component>: <Content>' --windows 1,10,60
+search: seal a log into a segment of 16K blocks with a Bloom filter per block, then search random needles, the
+longest token of random lines, with and without skipping blocks by their filter
+    python main_logblock_throughput.py search --log ../logs/HDFS/HDFS_2k.log --format '<Date> <Time> <Pid> <Level> <Component>: <Content>' --fpr 0.01
+cache: seal a log into a segment of 16K blocks, then read blocks, mostly recent ones, with and without a BlockCache
+of each memory budget
+    python main_logblock_throughput.py cache --log ../logs/HDFS/HDFS_2k.log --format '<Date> <Time> <Pid> <Level> <Component>: <Content>' --budgets 1M,4M,16M
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import shutil
+import sys
+import time
+from collections import Counter
+
+import pandas as pd
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from LogBlock.LogBlock import LogBlock, FailLogsOption, OutputFormat
+from LogBlock.LineSplitter import LineSplitter
+from LogBlock.BlockSealer import BlockSealer
+from LogBlock.BlockCache import BlockCache
+from LogBlock.Segment import SegmentReader
+from LogBlock.Search import search_segment, term_pattern
+from LogBlock.BloomFilter import TOKEN
+from LogBlock.LogReader import read_lines
+from py.Util import parse_size
+
+
+def cut_block(lines, size):
+    """
+    Take consecutive lines from a random position, up to size bytes, without splitting a line
+    :param lines: list of bytes lines, including line breaks
+    :param size:
+    :return:
+    """
+    start = random.randint(0, len(lines) - 1)
+    block = []
+    total = 0
+    for line in lines[start:]:
+        if total + len(line) > size:
+            break
+        block.append(line)
+        total += len(line)
+    return b''.join(block)
+
+
+def bench_decode(log_path, log_format, sizes, repeat, temp_dir):
+    """
+    Encode repeat blocks of each size and time LogBlock.decode()
+    :return: list of result dicts, one per block
+    """
+    with open(log_path, 'rb') as r:
+        lines = r.readlines()
+
+    random.seed(1)
+    dict_list = []
+    for size in sizes:
+        for i in range(repeat):
+            block = cut_block(lines, parse_size(size))
+            if not block:
+                continue
+            block_dir = os.path.join(temp_dir, 'chunk_%s' % size)
+            if not os.path.isdir(block_dir):
+                os.makedirs(block_dir)
+            block_name = '%d_%s' % (i, os.path.basename(log_path))
+            with open(os.path.join(block_dir, block_name), 'wb') as w:
+                w.write(block)
+
+            lblock = LogBlock(
+                log_format=log_format,
+                indir=block_dir,
+                logName=block_name,
+                outdir=os.path.join(block_dir, 'bucket_%d' % i),
+            )
+            with contextlib.redirect_stdout(io.StringIO()):
+                start_time = time.time()
+                lblock.run()
+                encode_time = time.time() - start_time
+
+                start_time = time.time()
+                decoded = lblock.decode()
+                decode_time = time.time() - start_time
+
+            expected = [x.strip() for x in block.decode('utf-8', errors='replace').splitlines()]
+            dict_list.append({
+                'Chunk': size,
+                'ChunkId': i,
+                'Bytes': len(block),
+                'Lines': len(expected),
+                'EncodeTime': encode_time,
+                'DecodeTime': decode_time,
+                'DecodeMBps': len(block) / pow(1024, 2) / decode_time if decode_time > 0 else float('inf'),
+                'Exact': decoded == expected,
+            })
+    return dict_list
+
+
+def bench_parse(log_path, log_format, repeat):
+    """
+    Split every line of a log file repeat times with the regex of log_format and with LineSplitter
+    :return: list of result dicts, one per parser and run
+    """
+    with open(log_path, 'r', encoding='utf-8', errors='replace') as r:
+        lines = [x.strip() for x in r]
+    n_bytes = sum(len(x.encode('utf-8')) for x in lines) + len(lines)
+
+    splitter = LineSplitter(log_format)
+
+    def regex_split(line):
+        match = splitter.regex.search(line)
+        return None if match is None else [match.group(header) for header in splitter.headers]
+
+    expected = None
+    dict_list = []
+    for i in range(repeat):
+        for parser, split in [('regex', regex_split), ('LineSplitter', splitter.split)]:
+            start_time = time.time()
+            parsed = [split(line) for line in lines]
+            parse_time = time.time() - start_time
+            if expected is None:
+                expected = parsed
+            dict_list.append({
+                'Parser': parser,
+                'Run': i,
+                'Bytes': n_bytes,
+                'Lines': len(lines),
+                'Matched': sum(x is not None for x in parsed),
+                'FastPath': splitter.program is not None,
+                'ParseTime': parse_time,
+                'ParseMBps': n_bytes / pow(1024, 2) / parse_time if parse_time > 0 else float('inf'),
+                'Exact': parsed == expected,
+            })
+    return dict_list
+
+
+def bench_columns(log_path, log_format, sizes, names, repeat, temp_dir):
+    """
+    Encode repeat blocks of each size, then time LogBlock.decode() and LogBlock.read_columns(names)
+    :return: list of result dicts, one per block
+    """
+    with open(log_path, 'rb') as r:
+        lines = r.readlines()
+
+    random.seed(1)
+    dict_list = []
+    for size in sizes:
+        for i in range(repeat):
+            block = cut_block(lines, parse_size(size))
+            if not block:
+                continue
+            block_dir = os.path.join(temp_dir, 'chunk_%s' % size)
+            if not os.path.isdir(block_dir):
+                os.makedirs(block_dir)
+            block_name = '%d_%s' % (i, os.path.basename(log_path))
+            with open(os.path.join(block_dir, block_name), 'wb') as w:
+                w.write(block)
+
+            lblock = LogBlock(
+                log_format=log_format,
+                indir=block_dir,
+                logName=block_name,
+                outdir=os.path.join(block_dir, 'bucket_%d' % i),
+                output_format=OutputFormat.BINARY,
+            )
+            with contextlib.redirect_stdout(io.StringIO()):
+                lblock.run()
+                start_time = time.time()
+                lblock.decode()
+                decode_time = time.time() - start_time
+
+                start_time = time.time()
+                columns = lblock.read_columns(names)
+                read_time = time.time() - start_time
+
+            expected = lblock.merge_content(lblock.read_trans_file('_trans_file.txt'), lblock.headers)
+            dict_list.append({
+                'Chunk': size,
+                'ChunkId': i,
+                'Bytes': len(block),
+                'DecodeTime': decode_time,
+                'ReadColumnsTime': read_time,
+                'Speedup': decode_time / read_time if read_time > 0 else float('inf'),
+                'Exact': all(columns[x] == expected[lblock.headers.index(x)] for x in names),
+            })
+    return dict_list
+
+
+TRACE_FORMAT = '<Date> <Time> <Level> <Component>: <Content>'
+
+
+def generate_trace_log(trace_lines, records=20):
+    """
+    Log lines of TRACE_FORMAT, where every record but the first is followed by a stack trace of trace_lines lines,
+    which do not match the format
+    :param trace_lines:
+    :param records:
+    :return: list of lines
+    """
+    lines = ['2020-01-01 00:00:00 INFO org.apache.spark.executor.Executor: Starting executor']
+    for i in range(1, records):
+        lines.append('2020-01-01 00:00:%02d ERROR org.apache.spark.executor.Executor: Exception in task %d.0'
+                     % (i % 60, i))
+        lines.append('java.lang.NullPointerException: task %d' % i)
+        for k in range(trace_lines - 1):
+            lines.append('\tat org.apache.spark.rdd.MapPartitionsRDD.compute(MapPartitionsRDD.scala:%d)' % (k % 500))
+    return lines
+
+
+def bench_trace(trace_lines, repeat, temp_dir):
+    """
+    Load generated stack-trace logs with each option for failed lines, as a dataframe and as streaming columns,
+    and check that the encoded blocks decode back
+    :return: list of result dicts, one per trace length, option, loader and run
+    """
+    if not os.path.isdir(temp_dir):
+        os.makedirs(temp_dir)
+    dict_list = []
+    for n_lines in trace_lines:
+        lines = generate_trace_log(n_lines)
+        log_name = 'trace_%d.log' % n_lines
+        with open(os.path.join(temp_dir, log_name), 'w') as w:
+            w.write('\n'.join(lines) + '\n')
+        for option in [FailLogsOption.APPEND_LINE, FailLogsOption.REORDER_ATTACH]:
+            for isStreaming in [False, True]:
+                lblock = LogBlock(
+                    log_format=TRACE_FORMAT,
+                    indir=temp_dir,
+                    logName=log_name,
+                    outdir=os.path.join(temp_dir, 'bucket_%d' % n_lines),
+                    isStreaming=isStreaming,
+                )
+                lblock.failed_logs_option = option
+                with contextlib.redirect_stdout(io.StringIO()):
+                    lblock.run()
+                    exact = lblock.decode() == [x.strip() for x in lines]
+                    for i in range(repeat):
+                        start_time = time.time()
+                        if isStreaming:
+                            lblock.load_columns()
+                        else:
+                            lblock.load_data()
+                        load_time = time.time() - start_time
+                        dict_list.append({
+                            'TraceLines': n_lines,
+                            'Option': option.name,
+                            'Loader': 'columns' if isStreaming else 'dataframe',
+                            'Run': i,
+                            'Lines': len(lines),
+                            'LoadTime': load_time,
+                            'Exact': exact,
+                        })
+    return dict_list
+
+
+def seal_segment(log_path, log_format, temp_dir, name, **kwargs):
+    """
+    Seal a log into a segment of 16K blocks
+    :param kwargs: other BlockSealer settings, e.g. bloom_fpr
+    :return: path of the segment, and a LogBlock to read it
+    """
+    if not os.path.isdir(temp_dir):
+        os.makedirs(temp_dir)
+    segment_path = os.path.join(temp_dir, name)
+    if os.path.isfile(segment_path):
+        os.remove(segment_path)
+    sealer = BlockSealer(log_format=log_format, outdir=temp_dir, segment=segment_path, **kwargs)
+    with contextlib.redirect_stdout(io.StringIO()):
+        with open(log_path, 'rb') as r:
+            sealer.feed(line.rstrip(b'\n') for line in r)
+    return segment_path, LogBlock(log_format=log_format, logName=None, outdir=temp_dir, isCleanOutdir=False)
+
+
+def bench_aggregate(log_path, log_format, names, repeat, temp_dir):
+    """
+    Seal a log into a segment, then count the rows of each value of each column over all blocks,
+    with SegmentReader.group_count and by decoding the column of every block
+    :return: list of result dicts, one per column, method and run
+    """
+    segment_path, lblock = seal_segment(log_path, log_format, temp_dir, 'aggregate.lgs')
+
+    def decoded_count(reader, name):
+        counts = Counter()
+        for index in range(len(reader.blocks)):
+            counts.update(reader.read_columns(index, lblock, [name])[name])
+        return counts
+
+    dict_list = []
+    with SegmentReader(segment_path) as reader:
+        for name in names:
+            expected = None
+            for i in range(repeat):
+                for method, count in [('encoded', lambda: reader.group_count(lblock, name)),
+                                      ('decoded', lambda: decoded_count(reader, name))]:
+                    start_time = time.time()
+                    counts = count()
+                    count_time = time.time() - start_time
+                    if expected is None:
+                        expected = counts
+                    dict_list.append({
+                        'Column': name,
+                        'Method': method,
+                        'Run': i,
+                        'Blocks': len(reader.blocks),
+                        'Distinct': len(counts),
+                        'CountTime': count_time,
+                        'Exact': counts == expected,
+                    })
+    return dict_list
+
+
+def bench_prune(log_path, log_format, windows, repeat, temp_dir):
+    """
+    Seal a log into a segment, then decode the blocks of repeat random time windows of each width, with and without
+    pruning them by the zone maps of the footer
+    :return: list of result dicts, one per width and window
+    """
+    segment_path, lblock = seal_segment(log_path, log_format, temp_dir, 'prune.lgs')
+    dict_list = []
+    with SegmentReader(segment_path) as reader, contextlib.redirect_stdout(io.StringIO()):
+        ranges = [entry.time_range for entry in reader.blocks if entry.time_range is not None]
+        if not ranges:
+            raise ValueError('No time range in the blocks of %s' % log_path)
+        first, last = min(x[0] for x in ranges), max(x[1] for x in ranges)
+        random.seed(1)
+        for width in windows:
+            for i in range(repeat):
+                start = random.randint(first, max(first, last - int(width * 1000)))
+                time_window = (start, start + int(width * 1000))
+
+                start_time = time.time()
+                kept = reader.prune(time_range=time_window)
+                for index in kept:
+                    reader.decode_block(index, lblock)
+                prune_time = time.time() - start_time
+
+                start_time = time.time()
+                for index in range(len(reader.blocks)):
+                    reader.decode_block(index, lblock)
+                scan_time = time.time() - start_time
+                dict_list.append({
+                    'Window': width,
+                    'Run': i,
+                    'Blocks': len(reader.blocks),
+                    'BlocksRead': len(kept),
+                    'PruneTime': prune_time,
+                    'ScanTime': scan_time,
+                    'Speedup': scan_time / prune_time if prune_time > 0 else float('inf'),
+                })
+    return dict_list
+
+
+def bench_search(log_path, log_format, fpr, repeat, temp_dir):
+    """
+    Seal a log into a segment with Bloom filters, then search repeat needles with search_segment and by scanning
+    every block
+    :return: list of result dicts, one per needle
+    """
+    segment_path, lblock = seal_segment(log_path, log_format, temp_dir, 'search.lgs', bloom_fpr=fpr)
+    lines = read_lines(log_path)
+    random.seed(1)
+    dict_list = []
+    with SegmentReader(segment_path) as reader, contextlib.redirect_stdout(io.StringIO()):
+        for i in range(repeat):
+            term = max(TOKEN.findall(random.choice(lines)) or ['none'], key=len)
+            pattern = term_pattern(term)
+
+            start_time = time.time()
+            matches, stats = search_segment(reader, lblock, term)
+            search_time = time.time() - start_time
+
+            start_time = time.time()
+            expected = [(reader.blocks[index].first_line + k, line) for index in range(len(reader.blocks))
+                        for k, line in enumerate(reader.decode_block(index, lblock)) if pattern.search(line)]
+            scan_time = time.time() - start_time
+            dict_list.append({
+                'Term': term,
+                'Blocks': stats['Blocks'],
+                'BlocksRead': stats['Read'],
+                'FalsePositives': stats['FalsePositives'],
+                'Matches': len(matches),
+                'SearchTime': search_time,
+                'ScanTime': scan_time,
+                'Speedup': scan_time / search_time if search_time > 0 else float('inf'),
+                'Exact': matches == expected,
+            })
+    return dict_list
+
+
+def bench_cache(log_path, log_format, budgets, reads, repeat, temp_dir):
+    """
+    Seal a log into a segment, then read reads blocks, 80% of them among the newest 10%
+    :return: list of result dicts, one per budget and run, budget None being without a cache
+    """
+    segment_path, lblock = seal_segment(log_path, log_format, temp_dir, 'cache.lgs')
+
+    dict_list = []
+    for budget in [None] + budgets:
+        for i in range(repeat):
+            random.seed(i)
+            cache = BlockCache(parse_size(budget)) if budget is not None else None
+            with SegmentReader(segment_path, cache) as reader, contextlib.redirect_stdout(io.StringIO()):
+                n_blocks = len(reader.blocks)
+                recent = max(n_blocks // 10, 1)
+                indexes = [n_blocks - 1 - random.randrange(recent) if random.random() < 0.8
+                           else random.randrange(n_blocks) for _ in range(reads)]
+                start_time = time.time()
+                n_lines = sum(len(reader.decode_block(index, lblock)) for index in indexes)
+                read_time = time.time() - start_time
+            stats = cache.stats() if cache is not None else {}
+            dict_list.append({
+                'Budget': budget or 'none',
+                'Run': i,
+                'Blocks': n_blocks,
+                'Reads': reads,
+                'Lines': n_lines,
+                'ReadTime': read_time,
+                'HitRate': stats.get('HitRate', 0.0),
+                'Evictions': stats.get('Evictions', 0),
+                'CachedBytes': stats.get('Bytes', 0),
+            })
+    return dict_list
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('bench', choices=['decode', 'parse', 'trace', 'columns', 'aggregate', 'prune', 'search', 'cache'])
+    parser.add_argument('--log', type=str, help='log file to cut blocks from')
+    parser.add_argument('--format', type=str, help='log_format of the log file')
+    parser.add_argument('--trace_lines', type=str, default='100,1000,5000', help='stack trace lengths of the trace bench')
+    parser.add_argument('--sizes', type=str, default='16K,32K,64K,128K,256K,1M')
+    parser.add_argument('--columns', type=str, default='Level,Component', help='columns read by the columns and aggregate benches')
+    parser.add_argument('--windows', type=str, default='1,10,60', help='time window widths in seconds of the prune bench')
+    parser.add_argument('--fpr', type=float, default=0.01, help='false-positive rate of the Bloom filters of the search bench')
+    parser.add_argument('--budgets', type=str, default='1M,4M,16M', help='memory budgets of the cache bench')
+    parser.add_argument('--reads', type=int, default=1000, help='block reads of the cache bench')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--temp_dir', type=str, default='../temp/throughput')
+    parser.add_argument('--out', type=str, default='../result/LogBlock_%s_throughput.csv')
+    args = parser.parse_args()
+    if args.bench != 'trace' and (args.log is None or args.format is None):
+        parser.error('--log and --format are required by the %s bench' % args.bench)
+
+    if args.bench == 'decode':
+        result = bench_decode(args.log, args.format, args.sizes.split(','), args.repeat, args.temp_dir)
+        shutil.rmtree(args.temp_dir, ignore_errors=True)
+        df = pd.DataFrame(result)
+        print(df.groupby('Chunk', sort=False).agg({'Bytes': 'mean', 'DecodeMBps': 'mean', 'EncodeTime': 'mean', 'Exact': 'all'}))
+    elif args.bench == 'parse':
+        result = bench_parse(args.log, args.format, args.repeat)
+        df = pd.DataFrame(result)
+        print(df.groupby('Parser', sort=False).agg({'Lines': 'mean', 'Matched': 'mean', 'ParseMBps': 'mean', 'FastPath': 'all', 'Exact': 'all'}))
+    elif args.bench == 'columns':
+        result = bench_columns(args.log, args.format, args.sizes.split(','), args.columns.split(','), args.repeat, args.temp_dir)
+        shutil.rmtree(args.temp_dir, ignore_errors=True)
+        df = pd.DataFrame(result)
+        print(df.groupby('Chunk', sort=False).agg({'Bytes': 'mean', 'DecodeTime': 'mean', 'ReadColumnsTime': 'mean', 'Speedup': 'mean', 'Exact': 'all'}))
+    elif args.bench == 'aggregate':
+        result = bench_aggregate(args.log, args.format, args.columns.split(','), args.repeat, args.temp_dir)
+        shutil.rmtree(args.temp_dir, ignore_errors=True)
+        df = pd.DataFrame(result)
+        print(df.groupby(['Column', 'Method'], sort=False).agg({'Blocks': 'mean', 'Distinct': 'mean', 'CountTime': 'mean', 'Exact': 'all'}))
+    elif args.bench == 'prune':
+        result = bench_prune(args.log, args.format, [float(x) for x in args.windows.split(',')], args.repeat, args.temp_dir)
+        shutil.rmtree(args.temp_dir, ignore_errors=True)
+        df = pd.DataFrame(result)
+        print(df.groupby('Window', sort=False).agg({'Blocks': 'mean', 'BlocksRead': 'mean', 'PruneTime': 'mean', 'ScanTime': 'mean', 'Speedup': 'mean'}))
+    elif args.bench == 'search':
+        result = bench_search(args.log, args.format, args.fpr, args.repeat, args.temp_dir)
+        shutil.rmtree(args.temp_dir, ignore_errors=True)
+        df = pd.DataFrame(result)
+        print(df[['Term', 'Blocks', 'BlocksRead', 'FalsePositives', 'Matches', 'Speedup', 'Exact']])
+        print(df.agg({'BlocksRead': 'mean', 'SearchTime': 'mean', 'ScanTime': 'mean', 'Speedup': 'mean', 'Exact': 'all'}))
+    elif args.bench == 'cache':
+        result = bench_cache(args.log, args.format, args.budgets.split(','), args.reads, args.repeat, args.temp_dir)
+        shutil.rmtree(args.temp_dir, ignore_errors=True)
+        df = pd.DataFrame(result)
+        print(df.groupby('Budget', sort=False).agg({'Blocks': 'mean', 'ReadTime': 'mean', 'HitRate': 'mean', 'Evictions': 'mean', 'CachedBytes': 'mean'}))
+    else:
+        result = bench_trace([int(x) for x in args.trace_lines.split(',')], args.repeat, args.temp_dir)
+        shutil.rmtree(args.temp_dir, ignore_errors=True)
+        df = pd.DataFrame(result)
+        print(df.groupby(['TraceLines', 'Option', 'Loader'], sort=False).agg({'Lines': 'mean', 'LoadTime': 'mean', 'Exact': 'all'}))
+    out_path = args.out % args.bench if '%s' in args.out else args.out
+    if not os.path.isdir(os.path.dirname(out_path)):
+        os.makedirs(os.path.dirname(out_path))
+    df.to_csv(out_path, index=False)
@@ -0,0 +1,294 @@
+"""
+Round-trip tests of LogBlock blocks written to folders, on small generated logs
+
+    python -m unittest py/test_logblock.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from LogBlock.LogBlock import LogBlock, SelectionMode, OutputFormat, FailLogsOption, encode_many
+from LogBlock.ColumnSchema import ColumnSchema, get_schema
+from LogBlock.LineSplitter import LineSplitter
+from LogBlock import PrefixCodec
+from LogBlock.ColumnProfile import ColumnProfile
+from LogBlock.BlockSealer import BlockSealer, read_chunks, split_lines
+from LogBlock.ZoneMap import prune, read_zone_map
+from LogBlock import LogReader
+from py.logblock_fixtures import HADOOP_FORMAT, ANDROID_FORMAT, THUNDERBIRD_FORMAT, hadoop_lines, android_lines, quiet
+
+
+class BlockTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.lines = hadoop_lines(300)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def encode(self, lines, log_format=HADOOP_FORMAT, name='block', **kwargs):
+        """
+        :return: LogBlock having written lines to a folder of its own, which decodes them back
+        """
+        lblock = LogBlock(log_format=log_format, logName=name, outdir=os.path.join(self.temp_dir, name),
+                          isCleanOutdir=False, **kwargs)
+        os.makedirs(lblock.savePath, exist_ok=True)
+        quiet(lblock.run_lines, lines)
+        return lblock
+
+    def block_size(self, lblock):
+        return sum(os.path.getsize(os.path.join(lblock.savePath, x)) for x in os.listdir(lblock.savePath))
+
+
+class TestSelection(BlockTestCase):
+    def test_round_trip(self):
+        for output_format in OutputFormat:
+            for selection_mode in SelectionMode:
+                lblock = self.encode(self.lines, name='%s_%s' % (output_format.name, selection_mode.name),
+                                     output_format=output_format, selection_mode=selection_mode)
+                self.assertEqual(quiet(lblock.decode), self.lines)
+
+    def test_min_size(self):
+        first_match = self.encode(self.lines, name='first', output_format=OutputFormat.BINARY)
+        min_size = self.encode(self.lines, name='min', output_format=OutputFormat.BINARY,
+                               selection_mode=SelectionMode.MIN_SIZE)
+        self.assertLessEqual(self.block_size(min_size), self.block_size(first_match))
+
+    def test_empty_column(self):
+        # A column holding only its failed first row, which step4 may be tried on before other steps apply
+        for selection_mode in SelectionMode:
+            lblock = LogBlock(log_format=HADOOP_FORMAT, logName=None, outdir=self.temp_dir, isCleanOutdir=False,
+                              selection_mode=selection_mode)
+            for steps in [None, [4]]:
+                encoded, _ = lblock.convert_column([''], steps)
+                self.assertEqual(lblock.decode_column(encoded), [''])
+
+
+class TestColumnProfile(unittest.TestCase):
+    def test_count_runs(self):
+        values = ['INFO'] * 3 + ['WARN'] + ['INFO'] * 2 + ['ERROR']
+        self.assertEqual(ColumnProfile(values).count_runs(10), 4)
+        self.assertEqual(ColumnProfile(values).count_runs(2), 3)
+        profile = ColumnProfile(values)
+        self.assertEqual(profile.run_lengths, [('INFO', 3), ('WARN', 1), ('INFO', 2), ('ERROR', 1)])
+        self.assertEqual(profile.count_runs(2), 3)
+        self.assertEqual(ColumnProfile([]).count_runs(0), 0)
+
+
+class TestFrontCoding(unittest.TestCase):
+    def test_shared_lengths(self):
+        long_prefix = 'x' * (PrefixCodec.COMPARE_WIDTH + 10)
+        values = ['', 'org.apache', 'org.apache.hadoop', 'org.apache', 'com.\u00e9t\u00e9', 'com.\u00e9t\u00e9',
+                  long_prefix + 'a', long_prefix + 'b', long_prefix, 'x\0y', 'x\0z'] * 500
+        expected = [0] + [len(os.path.commonprefix(pair)) for pair in zip(values, values[1:])]
+        self.assertGreater(len(values), PrefixCodec.CHUNK_ROWS)
+        self.assertEqual(PrefixCodec.shared_lengths(values), expected)
+        self.assertEqual(PrefixCodec.front_decode(PrefixCodec.front_encode(values)), values)
+
+
+class TestLearnSchema(BlockTestCase):
+    def test_column_schema(self):
+        schema = ColumnSchema(window=2, reprobe=4)
+        schema.start_block()
+        self.assertIsNone(schema.steps('Level'))
+        schema.record('Level', 3)
+        schema.record('Content', None)
+        schema.start_block()
+        self.assertIsNone(schema.steps('Level'))
+        schema.record('Level', 3)
+        schema.record('Content', None)
+        schema.start_block()
+        self.assertEqual(schema.steps('Level'), [3])
+        self.assertEqual(schema.steps('Content'), [])
+        schema.record('Level', 4)
+        schema.start_block()
+        # The last two blocks disagree, and this one tries all steps anyway
+        self.assertTrue(schema.is_probe_block())
+        self.assertIsNone(schema.steps('Level'))
+
+    def test_round_trip(self):
+        # A format of its own, so that the schema starts empty
+        log_format = HADOOP_FORMAT.replace('<Process>', '<Thread>')
+        for i in range(8):
+            block_lines = self.lines[i * 30:(i + 1) * 30]
+            lblock = self.encode(block_lines, log_format, name='block_%d' % i, isLearnSchema=True)
+            self.assertEqual(quiet(lblock.decode), block_lines)
+        self.assertEqual(get_schema(log_format).blocks, 8)
+
+
+class TestLineSplitter(unittest.TestCase):
+    def regex_split(self, splitter, line):
+        match = splitter.regex.search(line)
+        return None if match is None else [match.group(header) for header in splitter.headers]
+
+    def test_same_as_regex(self):
+        odd_lines = ['', 'java.io.IOException: Connection reset by peer', '2015-10-18 18:01:47,978 INFO',
+                     '2015-10-18 18:01:47,978 INFO [main] Component:', '03-17 16:13:38.811 1702 2395 D X: y',
+                     '03-17 16:13:38.811  1702  2395 D WindowManager: a: b:  c ']
+        for log_format, lines in [(HADOOP_FORMAT, hadoop_lines(100)), (ANDROID_FORMAT, android_lines(100))]:
+            splitter = LineSplitter(log_format)
+            self.assertIsNotNone(splitter.fast_split)
+            for line in lines + odd_lines:
+                self.assertEqual(splitter.split(line), self.regex_split(splitter, line), line)
+
+    def test_optional_group(self):
+        # Formats with optional groups are left to the regex
+        splitter = LineSplitter(THUNDERBIRD_FORMAT)
+        self.assertIsNone(splitter.fast_split)
+        values = splitter.split('- 1131566461 2005.11.09 dn228 Nov 9 12:01:01 dn228/dn228 crond: session closed')
+        self.assertIsNone(values[splitter.headers.index('PID')])
+        self.assertEqual(values[-1], 'session closed')
+
+
+class TestLogReader(BlockTestCase):
+    def write(self, data, name='test.log'):
+        file_name = os.path.join(self.temp_dir, name)
+        with open(file_name, 'wb') as w:
+            w.write(data)
+        return file_name
+
+    def test_line_breaks(self):
+        self.assertEqual(LogReader.read_lines(self.write(b'a\r\nb\rc\nd')), ['a', 'b', 'c', 'd'])
+        self.assertEqual(LogReader.read_lines(self.write(b'a\n\nb\n')), ['a', '', 'b'])
+        self.assertEqual(LogReader.read_lines(self.write(b'')), [])
+
+    def test_fallback_per_line(self):
+        data = b'ascii\nutf-8 caf\xc3\xa9\nlatin-1 caf\xe9\nutf-8 na\xc3\xafve'
+        self.assertEqual(LogReader.read_lines(self.write(data)),
+                         ['ascii', 'utf-8 caf\u00e9', 'latin-1 caf\u00e9', 'utf-8 na\u00efve'])
+
+    def test_fallback_past_chunk(self):
+        lines = ['line %d caf\u00e9' % i for i in range(20000)]
+        data = '\n'.join(lines).encode('utf-8').split(b'\n')
+        bad = len(data) - 10
+        data[bad] = lines[bad].encode('ISO-8859-1')
+        self.assertGreater(len(b'\n'.join(data)), LogReader.CHUNK_SIZE)
+        self.assertEqual(LogReader.read_lines(self.write(b'\n'.join(data))), lines)
+
+    def test_iter_lines(self):
+        data = b'\r\n'.join(line.encode('utf-8') for line in self.lines) + b'\r\nlatin-1 caf\xe9\r'
+        file_name = self.write(data)
+        read_size = LogReader.READ_SIZE
+        LogReader.READ_SIZE = 100
+        try:
+            self.assertEqual(list(LogReader.iter_lines(file_name)), LogReader.read_lines(file_name))
+        finally:
+            LogReader.READ_SIZE = read_size
+        self.assertEqual(list(LogReader.iter_lines(self.write(b''))), [])
+
+    def test_encode_file(self):
+        file_name = self.write('\n'.join(self.lines).encode('utf-8'))
+        for isStreaming in [False, True]:
+            out_dir = os.path.join(self.temp_dir, 'streaming' if isStreaming else 'dataframe')
+            lblock = LogBlock(log_format=HADOOP_FORMAT, logName='test.log', indir=self.temp_dir, outdir=out_dir,
+                              isStreaming=isStreaming)
+            quiet(lblock.run)
+            self.assertEqual(quiet(lblock.decode), self.lines)
+
+
+class TestFailedLines(BlockTestCase):
+    def test_long_trace(self):
+        # Lines are stripped when they are loaded, so trace lines are not indented here
+        trace = ['at org.apache.hadoop.ipc.Client.call(Client.java:%d)' % i for i in range(2000)]
+        lines = trace[:3] + self.lines[:10] + ['java.io.IOException: Connection reset by peer'] + trace + self.lines[10:]
+        for option in FailLogsOption:
+            lblock = LogBlock(log_format=HADOOP_FORMAT, logName=option.name, outdir=self.temp_dir,
+                              isCleanOutdir=False)
+            lblock.failed_logs_option = option
+            quiet(lblock.run_lines, lines)
+            self.assertEqual(quiet(lblock.decode), lines, option)
+
+
+class TestSealer(BlockTestCase):
+    def decode_sealed(self, sealed):
+        lines = []
+        for out_dir, _, _, _ in sealed:
+            lblock = LogBlock(log_format=HADOOP_FORMAT, logName=os.path.basename(out_dir)[len('bucket_'):],
+                              outdir=out_dir, isCleanOutdir=False)
+            lines += quiet(lblock.decode)
+        return lines
+
+    def test_block_size(self):
+        sealer = BlockSealer(log_format=HADOOP_FORMAT, outdir=self.temp_dir, block_size=2048)
+        sealed = quiet(sealer.feed, [line.encode('utf-8') for line in self.lines])
+        self.assertGreater(len(sealed), 1)
+        for _, _, size, _ in sealed:
+            self.assertLessEqual(size, 2048)
+        self.assertEqual(sum(x[1] for x in sealed), len(self.lines))
+        self.assertEqual(self.decode_sealed(sealed), self.lines)
+
+    def test_deadline(self):
+        sealer = BlockSealer(log_format=HADOOP_FORMAT, outdir=self.temp_dir, deadline=5)
+        quiet(sealer.add, self.lines[0].encode('utf-8'))
+        quiet(sealer.check_deadline, sealer.opened + 4)
+        self.assertEqual(sealer.sealed, [])
+        quiet(sealer.check_deadline, sealer.opened + 5)
+        self.assertEqual(len(sealer.sealed), 1)
+        quiet(sealer.close)
+        self.assertEqual(self.decode_sealed(sealer.sealed), self.lines[:1])
+
+    def test_pool(self):
+        sealer = BlockSealer(log_format=HADOOP_FORMAT, outdir=self.temp_dir, block_size=2048, n_workers=2)
+        pools = []
+        for line in self.lines:
+            quiet(sealer.add, line.encode('utf-8'))
+            pools.append(sealer.lblock.pool)
+        self.assertGreater(len(sealer.sealed), 1)
+        self.assertIsNotNone(pools[-1])
+        self.assertEqual(set(map(id, filter(None, pools))), {id(pools[-1])})
+        quiet(sealer.close)
+        self.assertIsNone(sealer.lblock.pool)
+        self.assertEqual(self.decode_sealed(sealer.sealed), self.lines)
+
+    def test_split_lines(self):
+        file_name = os.path.join(self.temp_dir, 'live.log')
+        with open(file_name, 'wb') as w:
+            w.write('\n'.join(self.lines).encode('utf-8'))
+        fd = os.open(file_name, os.O_RDONLY)
+        try:
+            chunks = [x for data in read_chunks(fd) for x in (data[:100], None, data[100:])]
+        finally:
+            os.close(fd)
+        lines = [x.decode('utf-8') for x in split_lines(chunks) if x is not None]
+        self.assertEqual(lines, self.lines)
+
+
+class TestZoneMap(BlockTestCase):
+    def check_line_ranges(self, zones, line_counts):
+        first_line = 0
+        for zone, line_count in zip(zones, line_counts):
+            self.assertEqual((zone.first_line, zone.line_count), (first_line, line_count))
+            first_line += line_count
+        for index, zone in enumerate(zones):
+            self.assertEqual(prune(zones, line_range=(zone.first_line, zone.first_line)), [index])
+            last_line = zone.first_line + zone.line_count - 1
+            self.assertEqual(prune(zones, line_range=(last_line, last_line + 1)), [index, index + 1][:len(zones) - index])
+        self.assertEqual(prune(zones, line_range=(first_line, None)), [])
+
+    def test_sealer(self):
+        sealer = BlockSealer(log_format=HADOOP_FORMAT, outdir=self.temp_dir, block_size=2048, isZoneMap=True)
+        sealed = quiet(sealer.feed, [line.encode('utf-8') for line in self.lines])
+        self.assertGreater(len(sealed), 2)
+        zones = [read_zone_map(os.path.join(out_dir, 'block_%d_zonemap.json' % i))
+                 for i, (out_dir, _, _, _) in enumerate(sealed)]
+        self.check_line_ranges(zones, [x[1] for x in sealed])
+
+    def test_encode_many(self):
+        paths = []
+        for i in range(4):
+            paths.append(os.path.join(self.temp_dir, 'part%d.log' % i))
+            with open(paths[-1], 'w') as w:
+                w.write('\n'.join(self.lines[i * 75:(i + 1) * 75]))
+        for workers in [1, 2]:
+            out_dir = os.path.join(self.temp_dir, 'workers_%d' % workers)
+            result = quiet(encode_many, paths, HADOOP_FORMAT, out_dir, workers=workers, isZoneMap=True)
+            zones = [read_zone_map(os.path.join(block_dir, os.path.basename(path) + '_zonemap.json'))
+                     for path, (block_dir, _) in zip(paths, result)]
+            self.check_line_ranges(zones, [75] * 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
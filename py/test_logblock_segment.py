@@ -0,0 +1,296 @@
+"""
+Round-trip tests of LogBlock segments, on small generated logs
+
+    python -m unittest py/test_logblock_segment.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from collections import Counter
+
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from LogBlock.LogBlock import LogBlock
+from LogBlock.BlockSealer import BlockSealer
+from LogBlock.Segment import SegmentReader, SegmentWriter
+from LogBlock.BlockCache import BlockCache
+from LogBlock.Search import search_segment, search_blocks
+from LogBlock.BlockContainer import ContainerError
+from py.logblock_fixtures import HADOOP_FORMAT, ANDROID_FORMAT, THUNDERBIRD_FORMAT, START_MILLIS, hadoop_lines, \
+    android_lines, quiet
+
+
+class SegmentTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.lines = hadoop_lines()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def seal(self, lines=None, log_format=HADOOP_FORMAT, name='test.lgs', **kwargs):
+        """
+        :return: path of a segment of 4K blocks holding lines, and a LogBlock to read it
+        """
+        segment_path = os.path.join(self.temp_dir, name)
+        sealer = BlockSealer(log_format=log_format, outdir=self.temp_dir, block_size=4096, segment=segment_path,
+                             **kwargs)
+        quiet(sealer.feed, [line.encode('utf-8') for line in (self.lines if lines is None else lines)])
+        return segment_path, LogBlock(log_format=log_format, logName=None, outdir=self.temp_dir,
+                                      isCleanOutdir=False)
+
+    def decode_all(self, reader, lblock):
+        lines = []
+        for index in range(len(reader.blocks)):
+            lines += quiet(reader.decode_block, index, lblock)
+        return lines
+
+
+class TestSegment(SegmentTestCase):
+    def test_round_trip(self):
+        for compressor in [None, 'zlib', 'lzma']:
+            segment_path, lblock = self.seal(name='%s.lgs' % compressor, compressor=compressor)
+            with SegmentReader(segment_path) as reader:
+                self.assertGreater(len(reader.blocks), 1)
+                self.assertEqual(self.decode_all(reader, lblock), self.lines)
+
+    def test_footer_index(self):
+        segment_path, lblock = self.seal()
+        with SegmentReader(segment_path) as reader:
+            first_line = 0
+            for index, entry in enumerate(reader.blocks):
+                self.assertEqual(entry.first_line, first_line)
+                self.assertEqual(len(quiet(reader.decode_block, index, lblock)), entry.line_count)
+                self.assertEqual(reader.find_line(first_line), index)
+                first_line += entry.line_count
+            self.assertIsNone(reader.find_line(first_line))
+
+    def test_append(self):
+        half = len(self.lines) // 2
+        segment_path, lblock = self.seal(self.lines[:half])
+        self.seal(self.lines[half:])
+        with SegmentReader(segment_path) as reader:
+            self.assertEqual(self.decode_all(reader, lblock), self.lines)
+
+    def test_unclosed_segment(self):
+        segment_path = os.path.join(self.temp_dir, 'open.lgs')
+        writer = SegmentWriter(segment_path)
+        writer.fout.close()
+        with self.assertRaises(ContainerError):
+            SegmentReader(segment_path)
+
+
+class TestTimeRange(SegmentTestCase):
+    def block_time_range(self, log_format, lines):
+        lblock = LogBlock(log_format=log_format, logName='block', outdir=self.temp_dir, isCleanOutdir=False)
+        quiet(lblock.run_lines, lines)
+        return lblock.time_range
+
+    def test_full_timestamp(self):
+        first, last = self.block_time_range(HADOOP_FORMAT, self.lines[:40])
+        self.assertEqual(first, START_MILLIS)
+        self.assertEqual(last, START_MILLIS + 39 * 1000 + 39)
+
+    def test_yearless_timestamp(self):
+        # A default year would put the block in 2000
+        lines = ['03-17 16:13:38.811  1702  2395 D WindowManager: printFreezingDisplayLogsopening app',
+                 '03-17 16:13:38.819  1702  8671 D PowerManagerService: acquire lock=233570404, flags=0x1']
+        self.assertIsNone(self.block_time_range(ANDROID_FORMAT, lines))
+
+    def test_year_from_another_group(self):
+        # <Month> <Day> <Hour>... has more columns but no year, the time comes from the <DYear>... date
+        lines = ['- 1131566461 2005.11.09 dn228 Nov 9 12:01:01 dn228/dn228 crond(pam_unix)[2915]: session closed',
+                 '- 1131566462 2005.11.09 dn228 Nov 9 12:01:02 dn228/dn228 crond[2916]: (root) CMD (run-parts)']
+        first, last = self.block_time_range(THUNDERBIRD_FORMAT, lines)
+        self.assertLessEqual(first, 1131566461000)
+        self.assertGreaterEqual(last, 1131566462000)
+
+    def test_segment_footer(self):
+        segment_path, lblock = self.seal()
+        with SegmentReader(segment_path) as reader:
+            for entry in reader.blocks:
+                first_second = sum(1 for line in self.lines[:entry.first_line] if line.startswith('2015'))
+                self.assertLessEqual(entry.time_range[0], START_MILLIS + first_second * 1000 + 999)
+                self.assertGreaterEqual(entry.time_range[1], START_MILLIS + first_second * 1000)
+
+
+class TestCache(SegmentTestCase):
+    def test_lru(self):
+        cache = BlockCache(max_bytes=100, sizeof=len)
+        cache.put('a', 'x' * 40)
+        cache.put('b', 'y' * 40)
+        self.assertEqual(cache.get('a'), 'x' * 40)
+        cache.put('c', 'z' * 40)
+        # 'b' is the least recently used
+        self.assertNotIn('b', cache)
+        self.assertIsNone(cache.peek('b'))
+        self.assertEqual(cache.peek('a'), 'x' * 40)
+        self.assertEqual(cache.get('b', lambda: 'w' * 40), 'w' * 40)
+        stats = cache.stats()
+        self.assertEqual((stats['Hits'], stats['Misses'], stats['Evictions']), (1, 1, 2))
+        self.assertLessEqual(stats['Bytes'], 100)
+
+    def test_decode_block(self):
+        segment_path, lblock = self.seal()
+        cache = BlockCache()
+        with SegmentReader(segment_path, cache) as reader:
+            self.assertEqual(self.decode_all(reader, lblock), self.lines)
+            self.assertEqual(self.decode_all(reader, lblock), self.lines)
+            self.assertEqual(cache.stats()['Hits'], len(reader.blocks))
+            self.assertEqual(cache.stats()['Misses'], len(reader.blocks))
+
+    def test_read_columns(self):
+        segment_path, lblock = self.seal()
+        cache = BlockCache()
+        with SegmentReader(segment_path, cache) as reader:
+            block_lines = quiet(reader.decode_block, 0, lblock)
+            levels = quiet(reader.read_columns, 0, lblock, ['Level'])['Level']
+            self.assertEqual(levels, [line.split()[2] for line in block_lines if line.startswith('2015')])
+            self.assertEqual((cache.stats()['Hits'], cache.stats()['Misses']), (0, 2))
+            columns = quiet(reader.read_columns, 0, lblock, ['Level', 'Component'])
+            self.assertIs(columns['Level'], levels)
+            self.assertEqual((cache.stats()['Hits'], cache.stats()['Misses']), (1, 3))
+            quiet(reader.read_columns, 0, lblock, ['Component', 'Level'])
+            self.assertEqual((cache.stats()['Hits'], cache.stats()['Misses']), (3, 3))
+
+
+class TestAggregate(SegmentTestCase):
+    def expected_levels(self, lines):
+        # Lines failing the format are not rows of the frame
+        return Counter(line.split()[2] for line in lines if line.startswith('2015'))
+
+    def test_group_count(self):
+        segment_path, lblock = self.seal()
+        with SegmentReader(segment_path) as reader:
+            self.assertEqual(quiet(reader.group_count, lblock, 'Level'), self.expected_levels(self.lines))
+            entry = reader.blocks[1]
+            self.assertEqual(quiet(reader.group_count, lblock, 'Level', [1]),
+                             self.expected_levels(self.lines[entry.first_line:entry.first_line + entry.line_count]))
+
+    def test_cached_group_count(self):
+        segment_path, lblock = self.seal()
+        cache = BlockCache()
+        with SegmentReader(segment_path, cache) as reader:
+            quiet(reader.read_columns, 0, lblock, ['Level'])
+            stats = cache.stats()
+            self.assertEqual(quiet(reader.group_count, lblock, 'Level'), self.expected_levels(self.lines))
+            self.assertEqual(cache.stats(), stats)
+
+    def test_distinct_and_count(self):
+        segment_path, lblock = self.seal()
+        with SegmentReader(segment_path) as reader:
+            block_lines = quiet(reader.decode_block, 0, lblock)
+            with reader.open_block(0) as container:
+                lblock.container = container
+                try:
+                    self.assertEqual(quiet(lblock.distinct, 'Level'), set(self.expected_levels(block_lines)))
+                    self.assertEqual(quiet(lblock.count), sum(1 for line in block_lines if line.startswith('2015')))
+                    self.assertEqual(quiet(lblock.count, 'Level', 'WARN'),
+                                     sum(1 for line in block_lines if ' WARN ' in line))
+                finally:
+                    lblock.container = None
+
+
+class TestSearch(SegmentTestCase):
+    def scan(self, term):
+        return [(k, line) for k, line in enumerate(self.lines)
+                if any(token == term for token in line.replace('/', ' ').replace(':', ' ').split())]
+
+    def test_needle(self):
+        segment_path, lblock = self.seal(bloom_fpr=0.01)
+        with SegmentReader(segment_path) as reader:
+            matches, stats = quiet(search_segment, reader, lblock, 'blk_7003900')
+            self.assertEqual(matches, self.scan('blk_7003900'))
+            self.assertEqual(len(matches), 1)
+            self.assertGreater(stats['Skipped'], 0)
+            self.assertEqual(stats['Read'] + stats['Skipped'], stats['Blocks'])
+
+    def test_absent_term(self):
+        segment_path, lblock = self.seal(bloom_fpr=0.01)
+        with SegmentReader(segment_path) as reader:
+            matches, stats = quiet(search_segment, reader, lblock, 'blk_9999999')
+            self.assertEqual(matches, [])
+            self.assertLessEqual(stats['Read'], 2)
+            self.assertEqual(stats['Read'], stats['FalsePositives'])
+
+    def test_common_term(self):
+        segment_path, lblock = self.seal(bloom_fpr=0.01)
+        with SegmentReader(segment_path) as reader:
+            matches, stats = quiet(search_segment, reader, lblock, 'WARN')
+            self.assertEqual(matches, self.scan('WARN'))
+            # Whole tokens only
+            self.assertEqual(quiet(search_segment, reader, lblock, 'WAR')[0], [])
+
+    def test_without_bloom(self):
+        segment_path, lblock = self.seal()
+        with SegmentReader(segment_path) as reader:
+            matches, stats = quiet(search_segment, reader, lblock, 'blk_7003900')
+            self.assertEqual(matches, self.scan('blk_7003900'))
+            self.assertEqual(stats['Read'], stats['Blocks'])
+
+    def test_time_range(self):
+        segment_path, lblock = self.seal(bloom_fpr=0.01)
+        with SegmentReader(segment_path) as reader:
+            # blk_7003900 is on the line of 18:05:00
+            matches, stats = quiet(search_segment, reader, lblock, 'blk_7003900',
+                                   (START_MILLIS + 300 * 1000, START_MILLIS + 300 * 1000))
+            self.assertEqual(matches, self.scan('blk_7003900'))
+            self.assertGreater(stats['Pruned'], 0)
+            first_time = reader.blocks[reader.find_line(matches[0][0])].time_range[0]
+            matches, _ = quiet(search_segment, reader, lblock, 'blk_7003900', (None, first_time - 1))
+            self.assertEqual(matches, [])
+
+    def test_search_blocks(self):
+        lblocks = []
+        for i in range(3):
+            lblock = LogBlock(log_format=HADOOP_FORMAT, logName='block%d' % i, outdir=self.temp_dir,
+                              isCleanOutdir=False, bloom_fpr=0.01)
+            quiet(lblock.run_lines, self.lines[i * 200:(i + 1) * 200])
+            lblocks.append(lblock)
+        matches, stats = quiet(search_blocks, lblocks, 'blk_7003900')
+        line = self.scan('blk_7003900')[0]
+        self.assertEqual(matches, [('block1', line[0] - 200, line[1])])
+        self.assertEqual(stats['Skipped'], 2)
+
+
+class TestPrune(SegmentTestCase):
+    def test_time_range(self):
+        segment_path, _ = self.seal()
+        # The lines of 18:01:40 and 18:01:41
+        line = self.lines.index(next(x for x in self.lines if x.startswith('2015-10-18 18:01:40')))
+        with SegmentReader(segment_path) as reader:
+            kept = reader.prune(time_range=(START_MILLIS + 100 * 1000, START_MILLIS + 101 * 1000))
+            self.assertIn(reader.find_line(line), kept)
+            self.assertIn(reader.find_line(line + 1), kept)
+            self.assertLess(len(kept), len(reader.blocks))
+            self.assertEqual(reader.prune(time_range=(None, START_MILLIS - 1)), [])
+            self.assertEqual(reader.prune(time_range=(START_MILLIS + 3600 * 1000, None)), [])
+
+    def test_yearless_time_range(self):
+        segment_path, _ = self.seal(android_lines(), ANDROID_FORMAT)
+        with SegmentReader(segment_path) as reader:
+            self.assertTrue(all(entry.time_range is None for entry in reader.blocks))
+            self.assertEqual(reader.prune(time_range=(0, 1)), list(range(len(reader.blocks))))
+
+    def test_line_range(self):
+        segment_path, _ = self.seal()
+        with SegmentReader(segment_path) as reader:
+            self.assertEqual(reader.prune(line_range=(300, 300)), [reader.find_line(300)])
+            self.assertEqual(reader.prune(line_range=(0, None)), list(range(len(reader.blocks))))
+
+    def test_column_bounds(self):
+        lines = android_lines()
+        segment_path, lblock = self.seal(lines, ANDROID_FORMAT)
+        with SegmentReader(segment_path) as reader:
+            kept = reader.prune(columns={'Pid': (1010, 1010)})
+            self.assertLess(len(kept), len(reader.blocks))
+            for index in range(len(reader.blocks)):
+                block_lines = quiet(reader.decode_block, index, lblock)
+                if any(' 1010  ' in line for line in block_lines):
+                    self.assertIn(index, kept)
+            self.assertEqual(reader.prune(columns={'Pid': (None, 999)}), [])
+
+
+if __name__ == '__main__':
+    unittest.main()